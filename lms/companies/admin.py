@@ -5,3 +5,4 @@ from .models import Company
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
     list_display = ('name', 'wallet', 'currency', 'rate', 'discount')
+    list_select_related = ('currency',)
@@ -6,3 +6,6 @@ class FaqConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'faq'
     verbose_name = _("FAQ")
+
+    def ready(self):
+        import faq.signals
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from siteapp.response_cache import clear_response_cache
+from .models import Category, Question
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_faq_responses(sender, **kwargs):
+    """
+    Drop cached FAQ responses in all languages.
+    """
+    clear_response_cache('faq')
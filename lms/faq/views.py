@@ -1,14 +1,20 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render
 from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
 from django.views import View
+from siteapp.response_cache import CachedResponseMixin
 from .models import Question, Category
 from django.utils.translation import gettext_lazy as _
 
 
 # Create your views here.
 @method_decorator(login_required(login_url='/login/'), name='dispatch')
-class FAQView(View):
+class FAQView(CachedResponseMixin, View):
+    cache_namespace = 'faq'
+
+    def get_cache_key_parts(self, request):
+        return [request.GET.get('category', '')]
+
     def get(self, request):
 
         categories = Category.objects.all()
@@ -0,0 +1,52 @@
+"""
+PostgreSQL engine of the project: django.db.backends.postgresql with connection statistics (lms.connections).
+
+ENGINE = 'lms.backends.postgresql'
+"""
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+
+from lms.connections import record_connect, record_checkout, record_close
+
+POOL_SUPPORTED = hasattr(base.DatabaseWrapper, 'pool')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connected_at = None
+        # A connection was used since the last request_started / request_finished
+        self.checked_out = False
+
+    def get_connection_params(self):
+        if self.settings_dict['OPTIONS'].get('pool') and not POOL_SUPPORTED:
+            raise ImproperlyConfigured('DB_POOL needs Django 5.1+ with psycopg 3 and psycopg-pool, '
+                                       'use persistent connections (DB_CONN_MAX_AGE) instead.')
+        return super().get_connection_params()
+
+    def get_new_connection(self, conn_params):
+        start = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        record_connect(self.alias, time.perf_counter() - start)
+        self.connected_at = time.monotonic()
+        return connection
+
+    def ensure_connection(self):
+        if not self.checked_out:
+            self.checked_out = True
+            record_checkout(self.alias, reused=self.connection is not None)
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        # Called by Django on request_started and request_finished: the next use is a new checkout
+        super().close_if_unusable_or_obsolete()
+        self.checked_out = False
+
+    def _close(self):
+        if self.connection is not None and self.connected_at is not None:
+            record_close(self.alias, time.monotonic() - self.connected_at)
+            self.connected_at = None
+        return super()._close()
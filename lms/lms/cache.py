@@ -0,0 +1,225 @@
+"""
+Project cache layer: an in-process L1 in front of the shared Django cache (L2, settings.CACHES).
+
+Keys live in namespaces, every namespace has a version stored in L2. Signals bump the version
+when the data behind the namespace changes, so the old entries of every process are never read
+again (no deletes, no waiting for the timeout). L1 entries remember the version they were read
+with and are dropped when it changes.
+
+Other processes trust the version they have read for settings.LOCAL_CACHE_VERSION_TTL seconds,
+so their L1 may serve data up to that old after a change. The process which bumped the version
+sees the change at once.
+
+Hit and miss counters are kept per namespace in the process, see get_cache_stats().
+"""
+import threading
+import time
+from collections import OrderedDict, Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .routers import primary_reads
+
+DEFAULT_TIMEOUT = 60 * 60 * 24
+MISSING = object()
+
+# (namespace, key) -> (version, expires_at, value), least recently used first
+_local = OrderedDict()
+# namespace -> (version, checked_at)
+_local_versions = {}
+_lock = threading.Lock()
+_stats = defaultdict(Counter)
+
+
+def version_key(namespace: str) -> str:
+    return f'lms:version:{namespace}'
+
+
+def shared_key(namespace: str, key) -> str:
+    return f'lms:{namespace}:{key}'
+
+
+def initial_version() -> int:
+    """
+    Version of a namespace without a version key: a new namespace, or its key was culled or evicted
+    from L2 while entries and ETags of older versions may still be around. Versions restart from the
+    clock (microseconds) instead of 1, so they keep growing and an old version is never reused.
+    """
+    return time.time_ns() // 1000
+
+
+def get_version(namespace: str) -> int:
+    """
+    Current version of the namespace from L2. The version is re-read from L2 at most once per
+    settings.LOCAL_CACHE_VERSION_TTL seconds (0 - on every call, invalidation is seen at once,
+    but every L1 hit costs an L2 read)
+    """
+    now = time.monotonic()
+    local = _local_versions.get(namespace)
+    if local is not None and now - local[1] < getattr(settings, 'LOCAL_CACHE_VERSION_TTL', 5):
+        return local[0]
+
+    version = cache.get(version_key(namespace))
+    if version is None:
+        version = initial_version()
+        # Another process may have restarted the version first
+        cache.add(version_key(namespace), version, None)
+        version = cache.get(version_key(namespace), version)
+
+    _local_versions[namespace] = (version, now)
+    return version
+
+
+def bump_version(*namespaces):
+    """
+    Invalidate everything cached in the namespaces, in every process.
+
+    Inside a transaction the versions are bumped at once, so the transaction doesn't read its own
+    stale cache, and again after the commit: until then another process still reads the old rows
+    and could cache them under the new version.
+    """
+    namespaces = set(namespaces)
+    _bump_versions(namespaces)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump_versions(namespaces))
+
+
+def _bump_versions(namespaces):
+    for namespace in namespaces:
+        try:
+            cache.incr(version_key(namespace))
+        except ValueError:
+            # No version key, a restarted version is newer than every version used before
+            cache.set(version_key(namespace), initial_version(), None)
+
+        _local_versions.pop(namespace, None)
+        with _lock:
+            for local_key in [local_key for local_key in _local if local_key[0] == namespace]:
+                del _local[local_key]
+        _stats[namespace]['invalidations'] += 1
+
+
+def _get_local(namespace: str, key, version: int):
+    local_key = (namespace, key)
+    with _lock:
+        entry = _local.get(local_key)
+        if entry is None:
+            return MISSING
+
+        entry_version, expires_at, value = entry
+        if entry_version != version or expires_at < time.monotonic():
+            del _local[local_key]
+            return MISSING
+
+        _local.move_to_end(local_key)
+        return value
+
+
+def _set_local(namespace: str, key, version: int, value, timeout):
+    local_timeout = getattr(settings, 'LOCAL_CACHE_TIMEOUT', 60 * 5)
+    if timeout is not None:
+        local_timeout = min(local_timeout, timeout)
+
+    with _lock:
+        _local[(namespace, key)] = (version, time.monotonic() + local_timeout, value)
+        _local.move_to_end((namespace, key))
+        while len(_local) > getattr(settings, 'LOCAL_CACHE_MAX_ENTRIES', 1024):
+            _local.popitem(last=False)
+
+
+def cache_get(namespace: str, key, default=None, local: bool = True):
+    """
+    Value from L1, then from L2 (copied to L1)
+
+    Parameters
+    ----------
+        namespace - cache namespace, e.g. "currencies"
+        key - key in the namespace
+        default - returned on a miss
+        local - use L1, False for large or per-user values
+    """
+    version = get_version(namespace)
+
+    if local:
+        value = _get_local(namespace, key, version)
+        if value is not MISSING:
+            _stats[namespace]['l1_hits'] += 1
+            return value
+
+    value = cache.get(shared_key(namespace, key), MISSING, version=version)
+    if value is MISSING:
+        _stats[namespace]['misses'] += 1
+        return default
+
+    _stats[namespace]['l2_hits'] += 1
+    if local:
+        _set_local(namespace, key, version, value, DEFAULT_TIMEOUT)
+    return value
+
+
+def cache_set(namespace: str, key, value, timeout=DEFAULT_TIMEOUT, local: bool = True):
+    version = get_version(namespace)
+    cache.set(shared_key(namespace, key), value, timeout, version=version)
+    if local:
+        _set_local(namespace, key, version, value, timeout)
+    _stats[namespace]['sets'] += 1
+
+
+def get_or_set(namespace: str, key, loader, timeout=DEFAULT_TIMEOUT, local: bool = True):
+    """
+    Cached value, loader() is called and its result cached only on a miss in both tiers.
+    Cached values are shared between requests and must not be modified.
+    The loader reads from the primary, a lagging replica would be cached for everybody.
+    """
+    value = cache_get(namespace, key, MISSING, local)
+    if value is MISSING:
+        with primary_reads():
+            value = loader()
+        cache_set(namespace, key, value, timeout, local)
+    return value
+
+
+def clear_local_cache():
+    """
+    Drop L1 of this process (L2 and the versions are kept)
+    """
+    with _lock:
+        _local.clear()
+    _local_versions.clear()
+
+
+def get_cache_stats() -> dict:
+    """
+    Counters of this process since start or reset_cache_stats()
+
+    Returns
+    -------
+        dict: {namespace: {'l1_hits', 'l2_hits', 'misses', 'sets', 'invalidations', 'hit_ratio'}},
+              totals under "total"
+    """
+    total = Counter()
+    stats = {}
+    for namespace, counters in sorted(_stats.items()):
+        total.update(counters)
+        stats[namespace] = with_hit_ratio(counters)
+    stats['total'] = with_hit_ratio(total)
+    return stats
+
+
+def with_hit_ratio(counters: Counter) -> dict:
+    hits = counters['l1_hits'] + counters['l2_hits']
+    lookups = hits + counters['misses']
+    return {
+        'l1_hits': counters['l1_hits'],
+        'l2_hits': counters['l2_hits'],
+        'misses': counters['misses'],
+        'sets': counters['sets'],
+        'invalidations': counters['invalidations'],
+        'hit_ratio': round(hits / lookups, 3) if lookups else None,
+    }
+
+
+def reset_cache_stats():
+    _stats.clear()
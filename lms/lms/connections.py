@@ -0,0 +1,84 @@
+"""
+Database connection statistics of the worker process, recorded by the lms.backends.postgresql engine.
+
+    connects - new connections (taken from the pool when the pool is on)
+    wait_ms - time spent waiting for them: connecting, authentication, pool checkout
+    checkouts - units of work (requests, commands) which used a connection
+    reused - checkouts served by a connection left open by an earlier one (CONN_MAX_AGE)
+    closes / lifetime - closed connections and how long they were open
+
+Counters are per process, "open" and "age_s" describe the connection of the calling thread.
+"""
+import time
+from collections import Counter, defaultdict
+
+from django.db import connections
+
+_stats = defaultdict(Counter)
+
+
+def record_connect(alias: str, wait: float):
+    stats = _stats[alias]
+    stats['connects'] += 1
+    stats['wait_ms'] += wait * 1000
+    stats['max_wait_ms'] = max(stats['max_wait_ms'], wait * 1000)
+
+
+def record_checkout(alias: str, reused: bool):
+    _stats[alias]['checkouts'] += 1
+    if reused:
+        _stats[alias]['reused'] += 1
+
+
+def record_close(alias: str, lifetime: float):
+    stats = _stats[alias]
+    stats['closes'] += 1
+    stats['lifetime_s'] += lifetime
+    stats['max_lifetime_s'] = max(stats['max_lifetime_s'], lifetime)
+
+
+def get_connection_totals(alias: str = 'default') -> Counter:
+    """
+    Raw counters of the alias, for per-request deltas
+    """
+    return Counter(_stats[alias])
+
+
+def get_connection_stats() -> dict:
+    """
+    Connection counters of this process since start or reset_connection_stats()
+
+    Returns
+    -------
+        dict: {alias: {'connects', 'avg_wait_ms', 'max_wait_ms', 'checkouts', 'reused', 'reuse_ratio',
+                       'closes', 'avg_lifetime_s', 'max_lifetime_s', 'open', 'age_s', 'conn_max_age', 'pool'}}
+              "pool" holds psycopg_pool statistics when the connection pool is on
+    """
+    now = time.monotonic()
+    stats = {}
+    for wrapper in connections.all():
+        counters = _stats[wrapper.alias]
+        connected_at = getattr(wrapper, 'connected_at', None)
+        is_open = wrapper.connection is not None
+        pool = getattr(wrapper, 'pool', None)
+
+        stats[wrapper.alias] = {
+            'connects': counters['connects'],
+            'avg_wait_ms': round(counters['wait_ms'] / counters['connects'], 2) if counters['connects'] else None,
+            'max_wait_ms': round(counters['max_wait_ms'], 2),
+            'checkouts': counters['checkouts'],
+            'reused': counters['reused'],
+            'reuse_ratio': round(counters['reused'] / counters['checkouts'], 3) if counters['checkouts'] else None,
+            'closes': counters['closes'],
+            'avg_lifetime_s': round(counters['lifetime_s'] / counters['closes'], 2) if counters['closes'] else None,
+            'max_lifetime_s': round(counters['max_lifetime_s'], 2),
+            'open': is_open,
+            'age_s': round(now - connected_at, 2) if is_open and connected_at else None,
+            'conn_max_age': wrapper.settings_dict['CONN_MAX_AGE'],
+            'pool': pool.get_stats() if pool is not None else None,
+        }
+    return stats
+
+
+def reset_connection_stats():
+    _stats.clear()
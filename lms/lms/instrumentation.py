@@ -0,0 +1,70 @@
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+
+IN_LIST_RE = re.compile(r'\bIN \((?:%s, )*%s\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def sql_fingerprint(sql: str) -> str:
+    """
+    Normalize SQL so the same statement with other parameters gives the same fingerprint.
+    """
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def get_query_budget(view_name: str) -> int | None:
+    """
+    Query budget declared for the URL name in settings.QUERY_BUDGETS
+    """
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+class QueryCollector:
+    """
+    Database execute wrapper which counts queries, their time and repeated statements.
+
+    Usage
+    -----
+        collector = QueryCollector()
+        with connection.execute_wrapper(collector):
+            ...
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[sql_fingerprint(sql)] += 1
+
+    @property
+    def duration_ms(self) -> float:
+        return round(self.duration * 1000, 2)
+
+    @property
+    def duplicates(self) -> dict[str, int]:
+        """
+        Statements executed more than once: {fingerprint: times}
+        """
+        return {fingerprint: count for fingerprint, count in self.fingerprints.items() if count > 1}
+
+    def server_timing(self) -> str:
+        """
+        Value for the Server-Timing response header
+        """
+        duplicated = sum(count - 1 for count in self.duplicates.values())
+        return (f'db;dur={self.duration_ms};desc="{self.count} queries", '
+                f'db-dup;desc="{duplicated} duplicated"')
@@ -1,7 +1,19 @@
+import logging
+from contextlib import ExitStack
+
 from django.conf import settings
+from django.db import connection, connections
 from django.shortcuts import redirect
 from django.utils.deprecation import MiddlewareMixin
 
+from .cache import get_cache_stats
+from .connections import get_connection_totals
+from .instrumentation import QueryCollector, get_query_budget
+from .routers import get_replica_alias, track_writes, pin_to_primary
+
+logger = logging.getLogger('lms.queries')
+
+
 class AppendSlashMiddleware(MiddlewareMixin):
     def process_request(self, request):
         if not settings.APPEND_SLASH:
@@ -10,3 +22,86 @@ class AppendSlashMiddleware(MiddlewareMixin):
             return
         if not request.path_info.endswith('/'):
             return redirect(request.path_info + '/', permanent=True)
+
+
+class ReplicaPinMiddleware:
+    """
+    When the request of a user wrote to the primary, the reads of the user stay on the primary for
+    settings.REPLICA_STICKY_SECONDS, so the user does not see the replica lag behind their own changes
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if get_replica_alias() is None:
+            return self.get_response(request)
+
+        with track_writes() as written:
+            response = self.get_response(request)
+
+        if written and request.user.is_authenticated:
+            pin_to_primary(request.user.pk)
+        return response
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Opt-in (settings.QUERY_INSTRUMENTATION) per-request database instrumentation.
+
+    Adds a Server-Timing header with query count, DB time, connection wait and project cache hits, logs one
+    structured line per request and a warning when the view goes over its budget from settings.QUERY_BUDGETS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            return self.get_response(request)
+
+        collector = QueryCollector()
+        cache_before = get_cache_stats()['total']
+        connections_before = get_connection_totals(connection.alias)
+        with ExitStack() as stack:
+            # Replica reads are counted too
+            for wrapper in connections.all():
+                stack.enter_context(wrapper.execute_wrapper(collector))
+            response = self.get_response(request)
+        cache_after = get_cache_stats()['total']
+        cache_hits = {name: cache_after[name] - cache_before[name] for name in ('l1_hits', 'l2_hits', 'misses')}
+        connection_usage = get_connection_totals(connection.alias)
+        connection_usage.subtract(connections_before)
+        connect_ms = round(connection_usage['wait_ms'], 2)
+
+        view_name = request.resolver_match.view_name if request.resolver_match else None
+        budget = get_query_budget(view_name)
+        duplicates = collector.duplicates
+
+        response['Server-Timing'] = (f'{collector.server_timing()}, db-connect;dur={connect_ms};'
+                                     f'desc="new {connection_usage["connects"]} reused {connection_usage["reused"]}", '
+                                     f'cache;desc="l1 {cache_hits["l1_hits"]} '
+                                     f'l2 {cache_hits["l2_hits"]} miss {cache_hits["misses"]}"')
+
+        log_data = {
+            'view': view_name,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': collector.count,
+            'db_ms': collector.duration_ms,
+            'duplicates': len(duplicates),
+            'budget': budget,
+            'db_connects': connection_usage['connects'],
+            'db_connect_ms': connect_ms,
+            'db_reused': connection_usage['reused'],
+            'cache_l1': cache_hits['l1_hits'],
+            'cache_l2': cache_hits['l2_hits'],
+            'cache_miss': cache_hits['misses'],
+        }
+        logger.info(' '.join(f'{key}={value}' for key, value in log_data.items()), extra=log_data)
+
+        if budget is not None and collector.count > budget:
+            logger.warning('Query budget exceeded: view=%s queries=%s budget=%s duplicated=%s',
+                           view_name, collector.count, budget, duplicates, extra=log_data)
+
+        return response
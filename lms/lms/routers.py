@@ -0,0 +1,142 @@
+"""
+Read replica routing.
+
+Writes and ordinary reads go to the primary ("default"). Reporting views opt in with the replica_reads
+decorator (BaseAnalyticView.use_replica), their reads go to settings.REPLICA_DATABASE when it is configured.
+
+A replica lags behind the primary, so after a write the rest of the request reads from the primary,
+and so does the user for settings.REPLICA_STICKY_SECONDS (see ReplicaPinMiddleware).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Alias for the reads of the current view, None - the primary
+_read_database = ContextVar('lms_read_database', default=None)
+# Aliases written by the current request, None outside of a request
+_request_writes = ContextVar('lms_request_writes', default=None)
+
+
+def get_replica_alias() -> str | None:
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+def pin_key(user_id: int) -> str:
+    return f'lms:primary-pin:{user_id}'
+
+
+def pin_to_primary(user_id: int):
+    """
+    Keep the reads of the user on the primary until the replica has caught up with the user's writes
+    """
+    cache.set(pin_key(user_id), True, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+
+
+def is_pinned_to_primary(user_id: int) -> bool:
+    return cache.get(pin_key(user_id), False)
+
+
+def get_read_database(request) -> str:
+    """
+    Alias for the read-only reporting queries of the request: the replica, or the primary when
+    there is no replica or the user wrote to the primary within REPLICA_STICKY_SECONDS.
+    Use it with QuerySet.using() for querysets evaluated after the view returns (streamed responses).
+    """
+    replica = get_replica_alias()
+    if replica is None:
+        return DEFAULT_DB_ALIAS
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and is_pinned_to_primary(user.pk):
+        return DEFAULT_DB_ALIAS
+    return replica
+
+
+@contextmanager
+def reads_from(alias: str | None):
+    """
+    Route the reads in the block to the alias (None or "default" - the primary)
+    """
+    token = _read_database.set(alias)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+def primary_reads():
+    """
+    Reads in the block go to the primary, e.g. data cached for all users
+    """
+    return reads_from(None)
+
+
+def replica_reads(view_func):
+    """
+    View decorator: read-only queries of the view go to the replica (see get_read_database)
+
+    Usage
+    -----
+        @method_decorator(replica_reads, name='dispatch')
+        class TeacherStatistic(View):
+    """
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with reads_from(get_read_database(request)):
+            return view_func(request, *args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def track_writes():
+    """
+    Collect the aliases written in the block
+
+    Returns
+    -------
+        set: filled with the aliases when the block exits
+    """
+    written = set()
+    token = _request_writes.set(written)
+    try:
+        yield written
+    finally:
+        _request_writes.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of replica_reads views to the replica, everything else to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_database.get()
+        # Reads after a write of the request, or inside a transaction of the primary, must see the write
+        if alias is None or _request_writes.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        written = _request_writes.get()
+        if written is not None:
+            written.add(DEFAULT_DB_ALIAS)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica has the same rows as the primary
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, get_replica_alias()}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets the schema from the primary
+        if db == get_replica_alias():
+            return False
+        return None
@@ -58,12 +58,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'lms.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'lms.middleware.ReplicaPinMiddleware',
+    'school.middleware.SchoolProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'lms.middleware.AppendSlashMiddleware',
@@ -93,18 +96,68 @@ WSGI_APPLICATION = 'lms.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# The project engine is django.db.backends.postgresql with connection statistics (lms.connections).
+# Connections are kept open between requests for DB_CONN_MAX_AGE seconds (0 - new connection per request,
+# empty - unlimited) and checked before reuse. DB_POOL=on uses a psycopg connection pool instead
+# (Django 5.1+ with psycopg 3 and psycopg-pool).
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'lms.backends.postgresql',
         'NAME': env('DB_NAME'),
         'USER': env('DB_USER'),
         'PASSWORD': env('DB_PASSWORD'),
         'HOST': env('DB_HOST'),
         'PORT': env('DB_PORT'),
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=60) if env('DB_CONN_MAX_AGE', default='60') else None,
+        'CONN_HEALTH_CHECKS': env.bool('DB_CONN_HEALTH_CHECKS', default=True),
         'OPTIONS': {},
     }
 }
 
+if env.bool('DB_POOL', default=False):
+    # The pool keeps the connections, Django must close (return) them after every request
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+        'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+        'timeout': env.int('DB_POOL_TIMEOUT', default=10),
+    }
+
+# Read replica for the reporting views (lms.routers.replica_reads): analytics, statistics, ledger exports.
+# Settings not given default to the primary ones, so DB_REPLICA_NAME=<the same database> adds a second alias
+# to the primary for local testing. A user reads from the primary for DB_REPLICA_STICKY_SECONDS after a write.
+if env('DB_REPLICA_HOST', default='') or env('DB_REPLICA_NAME', default=''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': env('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'USER': env('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        'PASSWORD': env('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        'HOST': env('DB_REPLICA_HOST', default=DATABASES['default']['HOST']),
+        'PORT': env('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'OPTIONS': {**DATABASES['default']['OPTIONS']},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['lms.routers.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+REPLICA_STICKY_SECONDS = env.int('DB_REPLICA_STICKY_SECONDS', default=10)
+
+# Cache
+# Shared cache (L2) of the project cache layer lms.cache, e.g. CACHE_URL=redis://127.0.0.1:6379/1 in production.
+# The file cache is shared by the workers of one host.
+CACHES = {
+    'default': env.cache('CACHE_URL', default=f'filecache://{BASE_DIR / ".cache"}'),
+}
+CACHES['default'].setdefault('KEY_PREFIX', 'lms')
+
+# In-process cache (L1) in front of it: max entries, max age in seconds and how long a namespace version
+# is trusted without asking the shared cache. Other workers may serve data up to LOCAL_CACHE_VERSION_TTL
+# seconds old after a change; 0 - invalidation is seen by all workers at once, but every L1 hit reads L2.
+LOCAL_CACHE_MAX_ENTRIES = env.int('LOCAL_CACHE_MAX_ENTRIES', default=1024)
+LOCAL_CACHE_TIMEOUT = env.int('LOCAL_CACHE_TIMEOUT', default=60 * 5)
+LOCAL_CACHE_VERSION_TTL = env.float('LOCAL_CACHE_VERSION_TTL', default=5)
+# Cache
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -179,6 +232,54 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
 
 
+# Query instrumentation
+# Server-Timing header and a log line with query count / DB time per request
+QUERY_INSTRUMENTATION = env.bool('QUERY_INSTRUMENTATION', default=False)
+
+# Max queries per view (URL name)
+QUERY_BUDGETS = {
+    'school:cabinet-schedule': 15,
+    'school:cabinet-students': 10,
+    'school:cabinet-statistics': 15,
+    'school:lesson-add': 10,
+    'school:lesson-view': 12,
+    'school:lesson-edit': 12,
+    'school:lesson-move': 11,
+    'school:lesson-conducted': 20,
+    'school:lesson-missed': 20,
+    'school:lesson-planned': 20,
+    'school:lesson-delete': 12,
+    'school:profile-lessons': 12,
+    'school:profile-progress': 10,
+    'school:progress-delete': 8,
+    'school:profile-payments': 12,
+    'school:profile-settings': 10,
+    'school:analytic-teachers': 15,
+    'school:analytic-companies': 15,
+    'school:api-schedule': 8,
+    'school:api-calendar': 6,
+    'school:api-lesson-status': 24,
+    'school:api-lesson-move': 14,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'lms.queries': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+# Query instrumentation
+
 # Crispy settings
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
@@ -0,0 +1,33 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .instrumentation import get_query_budget, sql_fingerprint
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin: fail when a view runs more queries than settings.QUERY_BUDGETS allows.
+
+    Usage
+    -----
+        class ScheduleTest(QueryBudgetMixin, TestCase):
+            def test_schedule(self):
+                self.client.force_login(self.teacher.user)
+                self.assertWithinQueryBudget('school:cabinet-schedule', kwargs={'pk': self.teacher.user.pk})
+    """
+
+    def assertWithinQueryBudget(self, view_name, kwargs=None, method='get', data=None, budget=None):
+        budget = budget if budget is not None else get_query_budget(view_name)
+        if budget is None:
+            self.fail(f'No query budget declared for {view_name} in settings.QUERY_BUDGETS')
+
+        url = reverse(view_name, kwargs=kwargs)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data or {})
+
+        if len(queries) > budget:
+            statements = '\n'.join(sql_fingerprint(query['sql']) for query in queries.captured_queries)
+            self.fail(f'{view_name} ran {len(queries)} queries, budget is {budget}:\n{statements}')
+
+        return response
@@ -0,0 +1,116 @@
+import warnings
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+
+from school.models import Lesson
+from .cache import get_version, bump_version, clear_local_cache, version_key
+from .middleware import ReplicaPinMiddleware
+from .routers import ReplicaRouter, replica_reads, _read_database, _request_writes
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheVersionTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_local_cache()
+
+    def test_bump_in_transaction_bumps_again_on_commit(self):
+        version = get_version('test')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version('test')
+            bumped = get_version('test')
+            self.assertGreater(bumped, version)
+
+        self.assertGreater(get_version('test'), bumped)
+
+    def test_version_trusted_for_ttl(self):
+        version = get_version('test')
+        # Bumped by another process
+        cache.incr(version_key('test'))
+
+        with self.settings(LOCAL_CACHE_VERSION_TTL=60):
+            self.assertEqual(get_version('test'), version)
+        with self.settings(LOCAL_CACHE_VERSION_TTL=0):
+            self.assertEqual(get_version('test'), version + 1)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   REPLICA_DATABASE='replica', REPLICA_STICKY_SECONDS=10)
+class ReplicaRouterTest(SimpleTestCase):
+    """
+    Routing with a primary and a replica alias. No queries run, the router only picks the alias.
+    """
+
+    def setUp(self):
+        with warnings.catch_warnings():
+            # Only the aliases are read from DATABASES, the connections are not opened
+            warnings.simplefilter('ignore')
+            databases = override_settings(DATABASES={
+                'default': settings.DATABASES['default'],
+                'replica': {**settings.DATABASES['default'], 'TEST': {'MIRROR': 'default'}},
+            })
+            databases.enable()
+        self.addCleanup(databases.disable)
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.reads = []
+
+    def get_read_alias(self) -> str:
+        # None - no opinion, Django uses the primary
+        return self.router.db_for_read(Lesson) or 'default'
+
+    def get_request(self, user_id=None):
+        request = RequestFactory().get('/report/')
+        request.user = SimpleNamespace(pk=user_id, is_authenticated=True) if user_id else AnonymousUser()
+        return request
+
+    def get_response(self, request, write=False):
+        """
+        Run a replica_reads view behind ReplicaPinMiddleware, recording the read alias before and after its write
+        """
+
+        @replica_reads
+        def view(request):
+            self.reads.append(self.get_read_alias())
+            if write:
+                self.assertEqual(self.router.db_for_write(Lesson), 'default')
+                self.reads.append(self.get_read_alias())
+            return HttpResponse()
+
+        return ReplicaPinMiddleware(view)(request)
+
+    def test_reads_go_to_replica(self):
+        self.get_response(self.get_request(1))
+
+        self.assertEqual(self.reads, ['replica'])
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Lesson), 'default')
+        # Inside a replica_reads view too
+        self.get_response(self.get_request(1), write=True)
+
+    def test_reads_stay_on_primary_after_write(self):
+        self.get_response(self.get_request(1), write=True)
+        # The rest of the request, then the next requests of the user
+        self.get_response(self.get_request(1))
+
+        self.assertEqual(self.reads, ['replica', 'default', 'default'])
+
+    def test_state_reset_between_requests(self):
+        self.get_response(self.get_request(1), write=True)
+
+        self.assertIsNone(_read_database.get())
+        self.assertIsNone(_request_writes.get())
+        self.assertEqual(self.get_read_alias(), 'default')
+
+        # Other users are not pinned
+        self.get_response(self.get_request(2))
+        self.get_response(self.get_request())
+        self.assertEqual(self.reads, ['replica', 'default', 'replica', 'replica'])
@@ -26,8 +26,9 @@ urlpatterns = i18n_patterns(
     path('admin/', admin.site.urls, name='admin'),
     path('', include('users.urls')),
     path('', include('school.urls')),
+    path('', include('transactions.urls')),
     path('', include('faq.urls')),
-    path('', include('pages.urls')),
     path('', include('siteapp.urls')),
+    path('', include('pages.urls')),
     path('django_ckeditor_5/', include('django_ckeditor_5.urls')),
 ) + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
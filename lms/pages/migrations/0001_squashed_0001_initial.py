@@ -0,0 +1,55 @@
+# Generated by Django 5.0.3 on 2026-10-18 21:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_default_pages(apps, schema_editor):
+    Page = apps.get_model('pages', 'Page')
+    pages = [{
+        'title': 'Privacy Policy',
+        'slug': 'privacy-policy',
+        'content': 'Add your policy',
+        'status': 'published',
+    },
+    {
+        'title': 'Terms & Conditions',
+        'slug': 'terms-conditions',
+        'content': 'Add your terms',
+        'status': 'published',
+    }]
+    for page in pages:
+        Page.objects.get_or_create(slug=page['slug'], defaults=page)
+
+
+class Migration(migrations.Migration):
+    """
+    0001_initial for new databases: its default pages were looked up by a field Page doesn't have.
+    Databases which already applied 0001_initial only record this one as applied.
+    """
+
+    replaces = [('pages', '0001_initial')]
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Page',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('slug', models.CharField(max_length=255)),
+                ('content', models.TextField()),
+                ('status', models.CharField(choices=[('draft', 'Draft'), ('published', 'Published')], default='draft', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('author', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(create_default_pages),
+    ]
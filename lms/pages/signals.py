@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from siteapp.response_cache import clear_response_cache
+from .models import Page
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def invalidate_pages_responses(sender, **kwargs):
+    """
+    Drop cached pages responses in all languages.
+    """
+    clear_response_cache('pages')
@@ -1,11 +1,17 @@
 from django.shortcuts import render, get_object_or_404
 from django.views import View
 
+from siteapp.response_cache import CachedResponseMixin
 from .models import Page
 
 
 # Create your views here.
-class PageView(View):
+class PageView(CachedResponseMixin, View):
+    cache_namespace = 'pages'
+
+    def get_cache_key_parts(self, request, slug):
+        return [slug]
+
     def get(self, request, slug):
         page = get_object_or_404(Page, slug=slug)
         return render(self.request, 'pages/text-page.html',
@@ -1,11 +1,16 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
+from decimal import Decimal
 
+from django.db.models import Sum
 from django.shortcuts import render
 from django.views import View
 
-from school.services import get_year_list, get_duration_list, generate_month_list_for_filter, \
-    sort_data_for_analytics
+from lms.routers import reads_from, get_read_database
+from school.services import get_activity_years, get_duration_list, generate_month_list_for_filter, \
+    sort_data_for_analytics, get_month_range
+from settings.conversion import annotate_base_amount
+from settings.services import get_default_currency
 
 
 class BaseAnalyticView(ABC, View):
@@ -14,6 +19,15 @@ class BaseAnalyticView(ABC, View):
     template_name = None
     context_title = None
     current_page = None
+    # Read-only reports, served from the read replica when there is one
+    use_replica = True
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.use_replica:
+            return super().dispatch(request, *args, **kwargs)
+
+        with reads_from(get_read_database(request)):
+            return super().dispatch(request, *args, **kwargs)
 
     def get_current_month_and_year(self, request):
         date = datetime.now()
@@ -36,6 +50,18 @@ class BaseAnalyticView(ABC, View):
 
         return current_item
 
+    def get_month_total(self, current_month, current_year):
+        """
+        Lesson payments of all items for the month in the default currency, as one aggregate.
+        Every payment is converted with the rate of its date (the currency of the paid account).
+        """
+        queryset = self.model.objects.filter(created_at__range=get_month_range(current_year, current_month),
+                                             lesson__isnull=False)
+        total = (annotate_base_amount(queryset, currency=f'{self.current_item_field}__currency',
+                                      date_field='created_at')
+                 .aggregate(total=Sum('base_amount'))['total'])
+        return round(total or Decimal(0), 2)
+
     def get_context_data(self, request, **kwargs):
         item_list = self.get_item_list()
         current_item = self.get_current_item(request, item_list, self.current_item_field)
@@ -55,7 +81,9 @@ class BaseAnalyticView(ABC, View):
             'current_item': current_item,
             'item_list': item_list,
             'result': result,
-            'available_years': get_year_list(self.model),
+            'month_total': self.get_month_total(current_month, current_year),
+            'base_currency': get_default_currency(),
+            'available_years': get_activity_years(self.model),
             'durations': get_duration_list(),
             'month_list': generate_month_list_for_filter()
         }
@@ -1,11 +1,7 @@
-from django.shortcuts import get_object_or_404, redirect, render
-from django.utils.decorators import method_decorator
+from django.shortcuts import render
 from django.views import View
 
-from users.models import User
-
-from school.models import Student, Teacher
-from school.services import count_time_left
+from school.services import get_account_summary, get_hours_left, format_time_left, get_profile_by_user_id
 
 from django.utils.translation import gettext_lazy as _
 
@@ -16,37 +12,43 @@ class ProfileBaseView(View):
     """
 
     def dispatch(self, request, *args, **kwargs):
-        self.user = get_object_or_404(User, pk=kwargs.get('pk'))
-        self.current_user = self.get_current_user(self.user)
+        self.current_user = self.get_current_user(request, kwargs.get('pk'))
+        self.user = self.current_user.user
         self.current_user_rate = int(self.current_user.rate)
         return super().dispatch(request, *args, **kwargs)
 
-    def get_current_user(self, user):
+    def get_current_user(self, request, user_id):
         """
-        Определение текущего пользователя в зависимости от его роли.
+        Профиль (Student или Teacher) пользователя страницы, свой профиль берётся из запроса.
         """
-        if user.school_role == 'student':
-            return get_object_or_404(Student, user=user.id)
-        return get_object_or_404(Teacher, user=user.id)
-
-
-    def get_Lesson_time_left(self):
-        lessons_left = 0
+        return get_profile_by_user_id(request, user_id)
 
-        if self.user.school_role == 'student':
-            lessons_left = count_time_left(self.current_user)
+    def get_account_summary(self):
+        """
+        Баланс и оставшееся время студента из StudentAccountSummary, None для преподавателя.
+        """
+        if self.user.school_role != 'student':
+            return None
+        return get_account_summary(self.current_user)
 
-        return lessons_left
+    def get_Lesson_time_left(self, account_summary):
+        if self.user.school_role != 'student':
+            return 0
+        if account_summary is None:
+            return format_time_left(get_hours_left(self.current_user))
+        return format_time_left(account_summary.hours_left)
 
     def get_context_data(self, **kwargs):
         """
         Общий контекст для всех вкладок профиля.
         """
+        account_summary = self.get_account_summary()
         context = {
             'title': _('Profile'),
             'current_user': self.current_user,
             'current_user_rate': self.current_user_rate,
-            'lessons_left': self.get_Lesson_time_left(),
+            'account_summary': account_summary,
+            'lessons_left': self.get_Lesson_time_left(account_summary),
         }
         context.update(kwargs)
         return context
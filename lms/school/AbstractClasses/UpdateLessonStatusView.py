@@ -1,6 +1,5 @@
 from abc import ABC, abstractmethod
 
-from django.db import transaction
 from django.shortcuts import redirect
 from django.views import View
 
@@ -12,7 +11,6 @@ class UpdateLessonStatusView(ABC, View):
     def get_status(self):
         pass
 
-    @transaction.atomic
     def update_lesson_status(self, request, pk):
         teacher = get_teacher(request)
 
@@ -1,9 +1,11 @@
-from django.contrib import admin
-from .models import Teacher, Student, Lesson, StudentProgress
-from .forms import TeacherForm, StudentForm
+from django.contrib import admin, messages
+from .models import Teacher, Student, Lesson, StudentProgress, PricingRule
+from .forms import TeacherForm, StudentForm, LessonAdminForm
+from siteapp.admin_filters import AutocompleteFilter, AutocompleteFilterMixin
 from django.utils.translation import gettext_lazy as _
 
-from .services import lesson_finished
+from .services import lessons_finished, format_time_left
+from transactions.models import StudentAccountSummary, LOW_BALANCE_HOURS
 
 
 # Register your models here.
@@ -12,6 +14,7 @@ class TeacherAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'user__first_name', 'user__last_name', 'user__email']
     list_display = ['get_name', 'get_languages', 'rate', 'currency']
     list_filter = ['language', 'user__is_active']
+    ordering = ['user__first_name', 'user__last_name']
 
     add_fieldsets = (
         (_('Base info'), {
@@ -48,6 +51,9 @@ class TeacherAdmin(admin.ModelAdmin):
 
     form = TeacherForm
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'currency').prefetch_related('language')
+
     def get_name(self, obj):
         if obj.user.first_name == '' and obj.user.last_name == '':
             return f'{obj.user.username}'
@@ -58,14 +64,30 @@ class TeacherAdmin(admin.ModelAdmin):
         return ', '.join([language.name for language in obj.language.all()])
 
     get_name.short_description = _('Name')
+    get_name.admin_order_field = 'user__first_name'
     get_languages.short_description = _('Languages')
 
 
+class LowBalanceFilter(admin.SimpleListFilter):
+    title = _('balance')
+    parameter_name = 'low_balance'
+
+    def lookups(self, request, model_admin):
+        return [('1', _('Less than {hours} hour(s) left').format(hours=LOW_BALANCE_HOURS))]
+
+    def queryset(self, request, queryset):
+        if self.value() == '1':
+            return queryset.filter(account_summary__hours_left__lt=LOW_BALANCE_HOURS)
+        return queryset
+
+
 @admin.register(Student)
-class StudentAdmin(admin.ModelAdmin):
+class StudentAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     search_fields = ['user__username', 'user__first_name', 'user__last_name', 'user__email']
-    list_display = ['get_name', 'teacher', 'get_languages', 'rate', 'wallet', 'currency', 'company']
-    list_filter = ['language', 'company', 'teacher', 'user__is_active']
+    list_display = ['get_name', 'teacher', 'get_languages', 'rate', 'get_balance', 'get_time_left',
+                    'get_recent_lessons', 'get_last_payment', 'company']
+    list_filter = [LowBalanceFilter, 'language', 'company', ('teacher', AutocompleteFilter), 'user__is_active']
+    ordering = ['user__first_name', 'user__last_name']
 
     add_fieldsets = (
         ('Base info', {
@@ -102,6 +124,16 @@ class StudentAdmin(admin.ModelAdmin):
 
     form = StudentForm
 
+    def get_queryset(self, request):
+        return (super().get_queryset(request)
+                .select_related('user', 'currency', 'company', 'teacher__user', 'account_summary')
+                .prefetch_related('language'))
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Hours left depend on the rate and the wallet can be edited here
+        StudentAccountSummary.objects.refresh([obj.pk])
+
     def get_name(self, obj):
         if obj.user.first_name == '' and obj.user.last_name == '':
             return f'{obj.user.username}'
@@ -109,7 +141,20 @@ class StudentAdmin(admin.ModelAdmin):
         return f'{obj.user.first_name} {obj.user.last_name}'
 
     def get_balance(self, obj):
-        return f'{obj.wallet} {obj.currency}'
+        summary = getattr(obj, 'account_summary', None)
+        return f'{summary.balance if summary else obj.wallet} {obj.currency}'
+
+    def get_time_left(self, obj):
+        summary = getattr(obj, 'account_summary', None)
+        return format_time_left(summary.hours_left) if summary else '-'
+
+    def get_recent_lessons(self, obj):
+        summary = getattr(obj, 'account_summary', None)
+        return summary.recent_lessons if summary else 0
+
+    def get_last_payment(self, obj):
+        summary = getattr(obj, 'account_summary', None)
+        return summary.last_payment_at if summary else None
 
     def get_languages(self, obj):
         return ', '.join([language.name for language in obj.language.all()])
@@ -118,43 +163,80 @@ class StudentAdmin(admin.ModelAdmin):
         return f'{obj.company.name}'
 
     get_name.short_description = _('Name')
+    get_name.admin_order_field = 'user__first_name'
     get_languages.short_description = _('Languages')
     get_balance.short_description = _('Wallet')
+    get_balance.admin_order_field = 'account_summary__balance'
+    get_time_left.short_description = _('Time left')
+    get_time_left.admin_order_field = 'account_summary__hours_left'
+    get_recent_lessons.short_description = _('Lessons in 30 days')
+    get_recent_lessons.admin_order_field = 'account_summary__recent_lessons'
+    get_last_payment.short_description = _('Last payment')
+    get_last_payment.admin_order_field = 'account_summary__last_payment_at'
+
+
+def finish_lessons(modeladmin, request, queryset, status):
+    """
+    Settle selected lessons in one batch and report skipped ones
+    """
+    updated, failures = lessons_finished(queryset, status)
+
+    for lesson, error in failures.items():
+        modeladmin.message_user(
+            request,
+            _("Lesson '{lesson}' ({date}) was skipped: {error}").format(lesson=lesson, date=lesson.date, error=error),
+            messages.WARNING)
+
+    if updated:
+        modeladmin.message_user(request, _("{count} lesson(s) updated").format(count=updated), messages.SUCCESS)
 
 
 @admin.action(description=_("Mark lesson as 'Conducted'"))
 def make_conducted(modeladmin, request, queryset):
-    for lesson in queryset:
-        lesson_finished(lesson.teacher, lesson.id, 'conducted')
+    finish_lessons(modeladmin, request, queryset, 'conducted')
 
 
 @admin.action(description=_("Mark lesson as 'Missed'"))
 def make_missed(modeladmin, request, queryset):
-    for lesson in queryset:
-        lesson_finished(lesson.teacher, lesson.id, 'missed')
+    finish_lessons(modeladmin, request, queryset, 'missed')
 
 
 @admin.action(description=_("Mark lesson as 'Planned'"))
 def make_planned(modeladmin, request, queryset):
-    for lesson in queryset:
-        lesson_finished(lesson.teacher, lesson.id, 'planned')
+    finish_lessons(modeladmin, request, queryset, 'planned')
 
 
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
+    form = LessonAdminForm
     search_fields = ['students__user__username', 'students__user__first_name', 'students__user__last_name',
                      'students__user__email']
     list_display = ['theme', 'date', 'time', 'status', 'get_students', 'teacher', 'price', 'currency']
-    list_filter = ['status', 'students', 'teacher']
+    list_filter = ['status', ('students', AutocompleteFilter), ('teacher', AutocompleteFilter)]
     readonly_fields = ['status', 'price', 'currency']
+    autocomplete_fields = ['students', 'teacher']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('teacher__user', 'currency').with_student_names()
 
     def get_students(self, obj):
-        return ", ".join([str(student) for student in obj.students.all()])
+        return obj.student_names
+
+    get_students.short_description = _('Students')
 
     actions = [make_conducted, make_missed, make_planned]
 
 
 @admin.register(StudentProgress)
-class StudentProgressAdmin(admin.ModelAdmin):
+class StudentProgressAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ['title', 'teacher', 'student', 'date']
-    list_filter = ['teacher', 'student']
+    list_filter = [('teacher', AutocompleteFilter), ('student', AutocompleteFilter)]
+    list_select_related = ['teacher__user', 'student__user']
+
+
+@admin.register(PricingRule)
+class PricingRuleAdmin(admin.ModelAdmin):
+    list_display = ['source', 'company', 'teacher', 'duration', 'min_group_size', 'multiplier']
+    list_filter = ['source', 'duration']
+    list_select_related = ['company', 'teacher__user', 'duration']
+    ordering = ['source', 'company', 'teacher', 'duration', 'min_group_size']
@@ -0,0 +1,167 @@
+from datetime import date, datetime
+
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import NON_FIELD_ERRORS
+from django.db import transaction
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.http import condition
+
+from settings.services import get_currencies
+from .forms import LessonMoveForm
+from .models import Lesson
+from .services import user_is_teacher, user_is_lesson_teacher, get_teacher, get_lesson_calendar, \
+    lesson_finished, get_lesson_calendar_version
+
+LESSON_STATUSES = [status for status, _label in Lesson.LESSON_STATUSES]
+LESSON_FIELDS = ('id', 'date', 'time', 'status', 'theme', 'price', 'currency_id', 'duration__time', 'student_names')
+
+
+def get_lessons_data(lessons) -> list[dict]:
+    """
+    Slim lesson rows for the schedule: one query, student names aggregated in the database
+    and currency names taken from the cached currencies registry
+
+    Returns
+    -------
+        list: [{'id', 'date', 'time', 'status', 'theme', 'duration', 'price', 'currency', 'students'}]
+    """
+    currencies = get_currencies()
+    data = []
+    for row in lessons.with_student_names().values(*LESSON_FIELDS):
+        currency = currencies.get(row['currency_id'])
+        data.append({
+            'id': row['id'],
+            'date': row['date'],
+            'time': row['time'].strftime('%H:%M'),
+            'status': row['status'],
+            'theme': row['theme'],
+            'duration': row['duration__time'],
+            'price': row['price'],
+            'currency': currency.name if currency else None,
+            'students': row['student_names'],
+        })
+    return data
+
+
+def get_lesson_data(lesson_id: int) -> dict | None:
+    rows = get_lessons_data(Lesson.objects.filter(pk=lesson_id))
+    return rows[0] if rows else None
+
+
+def parse_date(value: str | None) -> date | None:
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else date.today()
+    except ValueError:
+        return None
+
+
+def schedule_etag(request, *args, **kwargs) -> str | None:
+    """
+    ETag of the teacher lessons: the lesson calendar version is bumped on every lesson change,
+    so a conditional GET is answered from the cache without touching the database
+    """
+    teacher = get_teacher(request)
+    if teacher is None:
+        return None
+    version = get_lesson_calendar_version(teacher.pk)
+    # Today is part of the tag, the default date and month move at midnight
+    return f'{teacher.pk}-{version}-{date.today():%Y%m%d}-{request.GET.urlencode()}'
+
+
+def api_error(message, status: int = 400, **kwargs) -> JsonResponse:
+    return JsonResponse({'error': str(message), **kwargs}, status=status)
+
+
+class ScheduleApiView(View):
+    """
+    Base class of the conditional GET endpoints: responses are revalidated with the ETag on every use
+    """
+
+    @method_decorator(condition(etag_func=schedule_etag))
+    def get(self, request, *args, **kwargs):
+        response = self.get_response(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_response(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+
+@method_decorator(login_required(login_url='/login/'), name='dispatch')
+@method_decorator(user_is_teacher, name='dispatch')
+class ScheduleLessonsApi(ScheduleApiView):
+    """
+    Lessons of the teacher on the day (?date=YYYY-MM-DD, today by default)
+    """
+
+    def get_response(self, request, pk):
+        current_date = parse_date(request.GET.get('date'))
+        if current_date is None:
+            return api_error('Invalid date, expected YYYY-MM-DD')
+
+        lessons = Lesson.objects.filter(teacher=get_teacher(request), date=current_date).order_by('time')
+        return JsonResponse({'date': current_date, 'lessons': get_lessons_data(lessons)})
+
+
+@method_decorator(login_required(login_url='/login/'), name='dispatch')
+@method_decorator(user_is_teacher, name='dispatch')
+class ScheduleCalendarApi(ScheduleApiView):
+    """
+    Lesson counts per day of the month (?year=&month=, current month by default)
+    """
+
+    def get_response(self, request, pk):
+        today = date.today()
+        try:
+            year = int(request.GET.get('year', today.year))
+            month = int(request.GET.get('month', today.month))
+            date(year, month, 1)
+        except ValueError:
+            return api_error('Invalid year or month')
+
+        lesson_calendar = get_lesson_calendar(get_teacher(request), year, month)
+        return JsonResponse({'year': year, 'month': month, 'days': lesson_calendar})
+
+
+@method_decorator(login_required(login_url='/login/'), name='dispatch')
+@method_decorator(user_is_lesson_teacher, name='dispatch')
+class LessonStatusApi(View):
+    """
+    Set lesson status (POST status=planned|conducted|missed), settles or pays back the lesson.
+    A lesson which already has the status is not settled again: 409 with the lesson as it is.
+    """
+
+    def post(self, request, pk):
+        status = request.POST.get('status')
+        if status not in LESSON_STATUSES:
+            return api_error('Unknown status', choices=LESSON_STATUSES)
+
+        if not lesson_finished(get_teacher(request), pk, status):
+            return api_error('Lesson already has this status', status=409, lesson=get_lesson_data(pk))
+        return JsonResponse({'lesson': get_lesson_data(pk)})
+
+
+@method_decorator(login_required(login_url='/login/'), name='dispatch')
+@method_decorator(user_is_lesson_teacher, name='dispatch')
+class LessonMoveApi(View):
+    """
+    Move lesson to another date and time (POST date=YYYY-MM-DD, time=HH:MM)
+    """
+
+    @transaction.atomic
+    def post(self, request, pk):
+        lesson = get_object_or_404(Lesson, pk=pk, teacher=get_teacher(request))
+        form = LessonMoveForm(request.POST, instance=lesson)
+        if form.has_error(NON_FIELD_ERRORS, 'lesson_conflict'):
+            return api_error(form.non_field_errors()[0], status=409, errors=form.errors)
+        if not form.is_valid():
+            return api_error('Invalid date or time', errors=form.errors)
+
+        # Signals drop the cached calendar and update the activity years
+        form.save(commit=False).save(update_fields=['date', 'time'])
+
+        return JsonResponse({'lesson': get_lesson_data(pk)})
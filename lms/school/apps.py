@@ -6,3 +6,6 @@ class SchoolConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'school'
     verbose_name = _("school")
+
+    def ready(self):
+        import school.signals
@@ -1,17 +1,15 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.contrib.auth.forms import ReadOnlyPasswordHashField
 from django.urls import reverse
 from django.utils.functional import lazy
-from .models import Teacher, Student, Lesson, StudentProgress
-from settings.models import Language
+from .models import Teacher, Student, Lesson, StudentProgress, lesson_period
+from settings.services import get_language_choices, get_duration_minutes
 from users.models import User
 from django.utils.translation import gettext_lazy as _
 
 
-def get_language_choices():
-    return Language.objects.all().values_list('id', 'name')
-
-
 SCHOOL_ROLE_CHOICES = (
     ('None', _('None')),
     ('teacher', _('Teacher')),
@@ -152,10 +150,56 @@ class StudentForm(BaseUserForm):
         return student
 
 
-class LessonForm(forms.ModelForm):
+class LessonConflictMixin:
+    """
+    Lesson ModelForm mixin: reject a lesson at the same time as another lesson of its teacher or students.
+    Fields missing from the form (LessonMoveForm) are taken from the edited lesson.
+
+    Validated inside a transaction, the teacher row is locked until the lesson is saved and committed,
+    so two lessons of one teacher submitted at the same time are checked one after the other.
+    """
+    max_reported_conflicts = 3
+
+    @staticmethod
+    def lock_teacher(teacher_id):
+        if teacher_id and transaction.get_connection().in_atomic_block:
+            list(Teacher.objects.select_for_update().filter(pk=teacher_id).values_list('pk'))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        lesson = self.instance
+
+        duration = cleaned_data.get('duration') if 'duration' in self.fields else lesson.duration_id
+        teacher = cleaned_data.get('teacher') if 'teacher' in self.fields else lesson.teacher_id
+        if 'students' in self.fields:
+            students = cleaned_data.get('students')
+        else:
+            students = lesson.students.all() if lesson.pk else None
+
+        teacher_id = getattr(teacher, 'pk', teacher)
+        period = lesson_period(cleaned_data.get('date'), cleaned_data.get('time'),
+                               get_duration_minutes(getattr(duration, 'pk', duration)))
+        self.lock_teacher(teacher_id)
+        conflicts = Lesson.objects.overlapping(period, teacher_id, students)
+        if lesson.pk:
+            conflicts = conflicts.exclude(pk=lesson.pk)
+
+        conflicts = list(conflicts.order_by('period').values_list('theme', 'date', 'time')
+                         [:self.max_reported_conflicts])
+        if conflicts:
+            raise ValidationError(
+                _('The teacher or a student already has a lesson at this time: %(lessons)s'),
+                code='lesson_conflict',
+                params={'lessons': ', '.join(f'{theme} ({day:%d.%m.%Y} {start:%H:%M})'
+                                             for theme, day, start in conflicts)},
+            )
+        return cleaned_data
+
+
+class LessonForm(LessonConflictMixin, forms.ModelForm):
     def __init__(self, teacher, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['students'].queryset = Student.objects.filter(teacher=teacher, user__is_active=True)
+        self.fields['students'].queryset = Student.objects.filter(teacher=teacher, user__is_active=True).select_related('user')
         self.fields['teacher'].initial = teacher
 
     class Meta:
@@ -178,7 +222,11 @@ class LessonForm(forms.ModelForm):
         }
 
 
-class LessonMoveForm(forms.ModelForm):
+class LessonMoveForm(LessonConflictMixin, forms.ModelForm):
+    """
+    New date and time of the lesson, checked for conflicts when the form is bound to the lesson (instance)
+    """
+
     class Meta:
         model = Lesson
         fields = ('date', 'time')
@@ -194,6 +242,12 @@ class LessonMoveForm(forms.ModelForm):
         }
 
 
+class LessonAdminForm(LessonConflictMixin, forms.ModelForm):
+    class Meta:
+        model = Lesson
+        fields = '__all__'
+
+
 class ProgressStageForm(forms.ModelForm):
     def __init__(self, student, teacher, *args, **kwargs):
         super().__init__(*args, **kwargs)
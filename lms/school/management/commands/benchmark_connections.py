@@ -0,0 +1,83 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection, close_old_connections
+from django.test import Client
+from django.utils import translation
+
+from lms.connections import get_connection_totals
+from .benchmark_school import Command as BenchmarkCommand, percentile
+
+CONNECTION_SCENARIOS = ('schedule', 'profile-lessons')
+
+
+class Command(BenchmarkCommand):
+    help = ('Compare the schedule and profile lessons latency with a new database connection per request '
+            '(CONN_MAX_AGE=0) and with a persistent connection. Connections are closed and reused '
+            'the same way as by the request handler.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with translation.override(settings.LANGUAGES[0][0]):
+            scenarios = [scenario for scenario in self.get_scenarios() if scenario[0] in CONNECTION_SCENARIOS]
+        if not scenarios:
+            raise CommandError('Database is empty, run "manage.py seed_school" first.')
+
+        # With the pool on Django always returns the connection after the request, there is nothing to compare
+        modes = [('pool', 0)] if getattr(connection, 'pool', None) else [('per-request', 0), ('persistent', None)]
+        conn_max_age = connection.settings_dict['CONN_MAX_AGE']
+
+        header = f"{'scenario':<18}{'mode':<13}{'p50 ms':>9}{'p90 ms':>9}{'mean ms':>9}{'connects':>10}{'wait ms':>9}"
+        self.stdout.write(header)
+        try:
+            for name, user, method, url in scenarios:
+                for mode, max_age in modes:
+                    result = self.run_mode(user, method, url, max_age, options['iterations'], options['warmup'])
+                    self.stdout.write(f"{name:<18}{mode:<13}{result['p50_ms']:>9}{result['p90_ms']:>9}"
+                                      f"{result['mean_ms']:>9}{result['connects']:>10}{result['wait_ms']:>9}")
+        finally:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+
+    def run_mode(self, user, method, url, max_age, iterations, warmup):
+        """
+        Run the request with the connection settings of the mode. The test client doesn't close connections,
+        so close_old_connections() is called around every request as the request_started/finished signals do.
+        """
+        # close_at of the connection is set when it is opened
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+        client = Client()
+        client.force_login(user)
+
+        timings = []
+        before = None
+        for i in range(warmup + iterations):
+            if i == warmup:
+                before = get_connection_totals(connection.alias)
+
+            start = time.perf_counter()
+            close_old_connections()
+            response = getattr(client, method)(url)
+            close_old_connections()
+            duration = time.perf_counter() - start
+
+            if response.status_code >= 400:
+                raise CommandError(f'{method.upper()} {url} returned {response.status_code}')
+            if i >= warmup:
+                timings.append(duration * 1000)
+
+        usage = get_connection_totals(connection.alias)
+        usage.subtract(before)
+        return {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p90_ms': round(percentile(timings, 90), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'connects': usage['connects'],
+            'wait_ms': round(usage['wait_ms'], 2),
+        }
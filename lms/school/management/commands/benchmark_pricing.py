@@ -0,0 +1,64 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from school.pricing import PricingTable, load_pricing_rules, DEFAULT_LESSON_DURATION
+from school.services import calculate_price
+from settings.models import Duration
+
+RATES = [Decimal(rate) for rate in (150, 200, 250, 275.5, 300, 350, 400, 500)]
+# Group discounts before pricing rules, priced the old way (Decimal built from floats) for comparison
+LEGACY_GROUP_DISCOUNT = {1: Decimal(1), 2: Decimal(0.9), 3: Decimal(0.85), 4: Decimal(0.8)}
+
+
+def legacy_price(rate: Decimal, duration: int, number_of_students: int) -> Decimal:
+    group_discount = LEGACY_GROUP_DISCOUNT[min(number_of_students, 4)]
+    return round(rate * Decimal(duration / DEFAULT_LESSON_DURATION) * group_discount, 2)
+
+
+class Command(BaseCommand):
+    help = ('Micro-benchmark of lesson pricing: compile the pricing rules and price N random lessons '
+            'in a batch, per call and with the legacy float based formula')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lessons', type=int, default=100_000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        durations = list(Duration.objects.values_list('time', flat=True)) or [30, 45, 60, 90]
+
+        started = time.perf_counter()
+        table = PricingTable(load_pricing_rules(), durations)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        lessons = [(rng.choice(RATES), rng.choice(durations), rng.choices((1, 2, 3, 4, 5), (60, 25, 10, 4, 1))[0])
+                   for _ in range(options['lessons'])]
+
+        timings = {}
+
+        started = time.perf_counter()
+        batch_prices = table.price_many(lessons)
+        timings['batch (price_many)'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        call_prices = [calculate_price(rate, duration, size, table) for rate, duration, size in lessons]
+        timings['per call (calculate_price)'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        legacy_prices = [legacy_price(rate, duration, size) for rate, duration, size in lessons]
+        timings['legacy float formula'] = time.perf_counter() - started
+
+        self.stdout.write(f'{len(lessons)} lessons, {len(table.factors)} compiled factors '
+                          f'(compiled in {compile_ms:.2f} ms)')
+        self.stdout.write(f"{'method':<30}{'total ms':>10}{'µs/lesson':>12}")
+        for name, seconds in timings.items():
+            self.stdout.write(f'{name:<30}{seconds * 1000:>10.1f}{seconds * 1e6 / len(lessons):>12.2f}')
+
+        if batch_prices != call_prices:
+            self.stdout.write(self.style.ERROR('Batch and per call prices differ'))
+
+        differences = sum(1 for new, old in zip(batch_prices, legacy_prices) if new != old)
+        self.stdout.write(f'Prices different from the legacy formula (float rounding): {differences}')
@@ -0,0 +1,156 @@
+import json
+import time
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
+
+from companies.models import Company
+from school.models import Teacher, Student, Lesson
+from users.models import User
+
+
+def percentile(values: list[float], percent: int) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = ('Drive the school views and the settlement path through the Django test client. '
+            'Records latency percentiles and query counts, results can be saved as JSON and compared.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--output', help='Save results to JSON file')
+        parser.add_argument('--compare', help='Compare results with a JSON file from an earlier run')
+        parser.add_argument('--label', default='', help='Label saved with the results, e.g. commit hash')
+
+    def handle(self, *args, **options):
+        # URLs are reversed with a language prefix from LANGUAGES (i18n_patterns)
+        with translation.override(settings.LANGUAGES[0][0]):
+            scenarios = self.get_scenarios()
+        if not scenarios:
+            raise CommandError('Database is empty, run "manage.py seed_school" first.')
+
+        results = {}
+        for name, user, method, url in scenarios:
+            results[name] = self.run_scenario(user, method, url, options['iterations'], options['warmup'])
+
+        report = {
+            'label': options['label'],
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'iterations': options['iterations'],
+            'results': results,
+        }
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)['results']
+
+        self.print_report(results, baseline)
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+    def get_scenarios(self):
+        """
+        (name, user, method, url) for the busiest teacher, student and company
+        """
+        teacher = Teacher.objects.annotate(lessons=Count('lesson')).order_by('-lessons').first()
+        student = Student.objects.annotate(lessons=Count('lesson')).order_by('-lessons').first()
+        company = Company.objects.order_by('pk').first()
+        staff = User.objects.filter(is_staff=True, is_active=True).order_by('pk').first()
+
+        if not (teacher and student):
+            return []
+
+        today = date.today()
+        lesson = Lesson.objects.filter(teacher=teacher, status='planned').order_by('-date').first()
+        busy_day = (Lesson.objects.filter(teacher=teacher, date__lte=today)
+                    .values('date').annotate(total=Count('id')).order_by('-total').first())
+
+        scenarios = [
+            ('schedule', teacher.user, 'get',
+             reverse('school:cabinet-schedule', kwargs={'pk': teacher.user.pk}) +
+             (f"?date={busy_day['date']:%Y-%m-%d}" if busy_day else '')),
+            ('profile-lessons', student.user, 'get',
+             reverse('school:profile-lessons', kwargs={'pk': student.user.pk})),
+            ('profile-payments', student.user, 'get',
+             reverse('school:profile-payments', kwargs={'pk': student.user.pk})),
+            ('teacher-students', teacher.user, 'get',
+             reverse('school:cabinet-students', kwargs={'pk': teacher.user.pk})),
+            ('teacher-statistic', teacher.user, 'get',
+             reverse('school:cabinet-statistics', kwargs={'pk': teacher.user.pk})),
+        ]
+
+        if staff:
+            scenarios.append(('analytic-teachers', staff, 'get',
+                              reverse('school:analytic-teachers') + f'?item={teacher.pk}'))
+            if company:
+                scenarios.append(('analytic-companies', staff, 'get',
+                                  reverse('school:analytic-companies') + f'?item={company.pk}'))
+
+        if lesson:
+            scenarios.append(('settlement', teacher.user, 'post',
+                              reverse('school:lesson-conducted', kwargs={'pk': lesson.pk})))
+
+        return scenarios
+
+    def run_scenario(self, user, method, url, iterations, warmup):
+        client = Client()
+        client.force_login(user)
+
+        timings = []
+        queries = []
+        for i in range(warmup + iterations):
+            # Writes (settlement) are rolled back, so every iteration sees the same data
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = getattr(client, method)(url)
+                    duration = time.perf_counter() - start
+                transaction.set_rollback(True)
+
+            if response.status_code >= 400:
+                raise CommandError(f'{method.upper()} {url} returned {response.status_code}')
+
+            if i >= warmup:
+                timings.append(duration * 1000)
+                queries.append(len(captured))
+
+        return {
+            'url': url,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p90_ms': round(percentile(timings, 90), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'queries': max(queries),
+        }
+
+    def print_report(self, results, baseline=None):
+        header = f"{'scenario':<22}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'queries':>9}"
+        if baseline:
+            header += f"{'Δ p50':>10}{'Δ queries':>11}"
+        self.stdout.write(header)
+
+        for name, result in results.items():
+            line = (f"{name:<22}{result['p50_ms']:>10}{result['p90_ms']:>10}"
+                    f"{result['p99_ms']:>10}{result['queries']:>9}")
+
+            if baseline and name in baseline:
+                delta_p50 = round(result['p50_ms'] - baseline[name]['p50_ms'], 2)
+                delta_queries = result['queries'] - baseline[name]['queries']
+                line += f'{delta_p50:>+10}{delta_queries:>+11}'
+
+            self.stdout.write(line)
@@ -0,0 +1,57 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from school.models import Lesson, Teacher, Student
+from school.services import get_month_range, get_year_range
+from companies.models import Company
+from transactions.models import StudentPayment, TeacherPayment, CompanyPayment
+
+
+class Command(BaseCommand):
+    help = ('Print EXPLAIN plans of the hot lesson and ledger queries. '
+            'Run on a seeded database before and after migrating to compare plans.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true', help='Use EXPLAIN ANALYZE (executes the queries)')
+        parser.add_argument('--year', type=int, default=date.today().year)
+        parser.add_argument('--month', type=int, default=date.today().month)
+
+    def handle(self, *args, **options):
+        teacher = Teacher.objects.order_by('pk').first()
+        student = Student.objects.order_by('pk').first()
+        company = Company.objects.order_by('pk').first()
+
+        if not (teacher and student and company):
+            self.stderr.write('Database is empty, seed it first.')
+            return
+
+        year, month = options['year'], options['month']
+        month_range = get_month_range(year, month)
+
+        queries = {
+            'Lesson(teacher, date) - schedule day':
+                Lesson.objects.filter(teacher=teacher, date=month_range[0]).order_by('time'),
+            'Lesson(teacher, date) - schedule month':
+                Lesson.objects.filter(teacher=teacher, date__range=month_range).values('date'),
+            'Lesson(-date, -id) - lessons keyset page':
+                Lesson.objects.order_by('-date', '-id')[:20],
+            'Lesson(students, -date) - profile lessons':
+                Lesson.objects.filter(students=student).order_by('-date', '-id')[:20],
+            'TeacherPayment(teacher, created_at) - month salary':
+                TeacherPayment.objects.filter(teacher=teacher, created_at__range=month_range)
+                .values('teacher').annotate(total=Sum('price')),
+            'StudentPayment(student, -created_at) - profile payments':
+                StudentPayment.objects.filter(student=student).order_by('-created_at')[:20],
+            'CompanyPayment(company, created_at) - company analytics':
+                CompanyPayment.objects.filter(company=company, created_at__range=get_year_range(year))
+                .values('company').annotate(total=Sum('price')),
+            'TeacherPayment(lesson) - pay back':
+                TeacherPayment.objects.filter(lesson__in=Lesson.objects.filter(teacher=teacher).values('pk')[:100]),
+        }
+
+        for title, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(queryset.explain(analyze=options['analyze']))
+            self.stdout.write('')
@@ -0,0 +1,210 @@
+import random
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from companies.models import Company
+from school.models import Teacher, Student, Lesson, lesson_period
+from school.pricing import get_pricing_table
+from school.services import get_settlement_queryset, get_students_company, collect_lesson_payments, \
+    sum_payments_by_account, clear_activity_years_cache
+from settings.models import Currency, Duration, Language
+from settings.conversion import get_rate_snapshot
+from transactions.models import (StudentPayment, TeacherPayment, CompanyPayment, TeacherPaymentSummary,
+                                 StudentAccountSummary)
+from transactions.services import charge_wallets, apply_wallet_deltas
+from users.models import User
+
+GROUP_SIZES = {1: 60, 2: 25, 3: 10, 4: 5}  # group size: weight
+DURATIONS = {30: 10, 45: 20, 60: 60, 90: 10}  # minutes: weight
+RATES = [Decimal(rate) for rate in (200, 250, 300, 350, 400, 500)]
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Seed the database with synthetic teachers, students, companies, lessons and payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teachers', type=int, default=10)
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--companies', type=int, default=10)
+        parser.add_argument('--lessons', type=int, default=20000)
+        parser.add_argument('--months', type=int, default=12, help='Spread lessons over the last N months')
+        parser.add_argument('--prefix', default='seed', help='Prefix for usernames and company names')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, same seed gives same data')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        prefix = options['prefix']
+
+        self.default_currency, currencies = self.create_currencies()
+        durations = self.create_durations()
+        languages = [Language.objects.get_or_create(name=name)[0] for name in ('English', 'German')]
+        password = make_password(prefix)
+
+        companies = Company.objects.bulk_create([
+            Company(name=f'{prefix} company {i}', rate=self.rng.choice(RATES), currency=self.default_currency,
+                    discount=self.rng.choice((0, 0, 10, 20, 50)))
+            for i in range(options['companies'])
+        ])
+
+        teachers = self.create_profiles(Teacher, 'teacher', options['teachers'], prefix, password, currencies)
+        students = self.create_profiles(Student, 'student', options['students'], prefix, password, currencies)
+        User.objects.get_or_create(username=f'{prefix}_admin',
+                                   defaults={'password': password, 'is_staff': True, 'is_superuser': True})
+
+        # Busy and quiet teachers: pareto weights
+        teacher_weights = [self.rng.paretovariate(1.5) for _ in teachers]
+        for student in students:
+            student.teacher = self.rng.choices(teachers, teacher_weights)[0]
+            student.company = self.rng.choice(companies) if companies and self.rng.random() < 0.3 else None
+            student.language.set([self.rng.choice(languages)])
+        Student.objects.bulk_update(students, ['teacher', 'company'], batch_size=BATCH_SIZE)
+        for teacher in teachers:
+            teacher.language.set(languages)
+
+        lessons = self.create_lessons(options['lessons'], options['months'], teachers, students, durations)
+        self.create_payments(lessons)
+        self.create_top_ups(students, options['months'])
+        TeacherPaymentSummary.objects.rebuild()
+        StudentAccountSummary.objects.refresh()
+        # Lessons and payments are dated in the past and bulk created without signals
+        clear_activity_years_cache()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(companies)} companies, {len(teachers)} teachers, {len(students)} students, "
+            f"{len(lessons)} lessons. Password for all users: '{prefix}'"))
+
+    def create_currencies(self):
+        default_currency = Currency.objects.filter(default=True).first()
+        if not default_currency:
+            default_currency = Currency.objects.create(name='UAH', symbol='₴', exchange=1, default=True)
+
+        currencies = [default_currency]
+        for name, symbol, exchange in (('USD', '$', Decimal('0.024')), ('EUR', '€', Decimal('0.022'))):
+            currency, _ = Currency.objects.get_or_create(name=name, defaults={'symbol': symbol, 'exchange': exchange})
+            currencies.append(currency)
+
+        return default_currency, currencies
+
+    def create_durations(self):
+        return {minutes: Duration.objects.get_or_create(time=minutes)[0] for minutes in DURATIONS}
+
+    def create_profiles(self, model, role, count, prefix, password, currencies):
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}_{role}_{i}', first_name=f'{role.title()}{i}', last_name=prefix,
+                 email=f'{prefix}_{role}_{i}@example.com', school_role=role, password=password)
+            for i in range(count)
+        ], batch_size=BATCH_SIZE)
+
+        # Most of the users pay in default currency
+        currency_weights = [80] + [20 // (len(currencies) - 1)] * (len(currencies) - 1)
+        profiles = [
+            model(user=user, rate=self.rng.choice(RATES), currency=self.rng.choices(currencies, currency_weights)[0])
+            for user in users
+        ]
+        return model.objects.bulk_create(profiles, batch_size=BATCH_SIZE)
+
+    def create_lessons(self, count, months, teachers, students, durations):
+        today = date.today()
+        first_day = today - timedelta(days=30 * months)
+        days = (today - first_day).days + 30  # and one month of planned lessons
+
+        students_by_teacher = {}
+        for student in students:
+            students_by_teacher.setdefault(student.teacher_id, []).append(student)
+        teachers = [teacher for teacher in teachers if teacher.pk in students_by_teacher]
+        if not teachers:
+            return []
+        teacher_weights = [len(students_by_teacher[teacher.pk]) for teacher in teachers]
+
+        lessons = []
+        groups = []
+        for i in range(count):
+            teacher = self.rng.choices(teachers, teacher_weights)[0]
+            teacher_students = students_by_teacher[teacher.pk]
+            group_size = min(self.rng.choices(list(GROUP_SIZES), list(GROUP_SIZES.values()))[0], len(teacher_students))
+            lesson_date = first_day + timedelta(days=self.rng.randrange(days))
+
+            lesson_time = time(self.rng.randrange(8, 21), self.rng.choice((0, 15, 30, 45)))
+            duration = durations[self.rng.choices(list(DURATIONS), list(DURATIONS.values()))[0]]
+
+            lessons.append(Lesson(
+                date=lesson_date,
+                time=lesson_time,
+                teacher=teacher,
+                duration=duration,
+                theme=f'Lesson {i}',
+                # bulk_create doesn't call save()
+                period=lesson_period(lesson_date, lesson_time, duration.time),
+            ))
+            groups.append(self.rng.sample(teacher_students, group_size))
+
+        lessons = Lesson.objects.bulk_create(lessons, batch_size=BATCH_SIZE)
+
+        Lesson.students.through.objects.bulk_create([
+            Lesson.students.through(lesson_id=lesson.pk, student_id=student.pk)
+            for lesson, group in zip(lessons, groups)
+            for student in group
+        ], batch_size=BATCH_SIZE)
+
+        return lessons
+
+    def create_payments(self, lessons):
+        """
+        Settle past lessons (85% conducted, 10% missed, 5% left planned), payments are dated by lesson date
+        """
+        today = date.today()
+        past_lesson_ids = [lesson.pk for lesson in lessons if lesson.date < today]
+        pricing = get_pricing_table()
+
+        for start in range(0, len(past_lesson_ids), BATCH_SIZE):
+            batch = get_settlement_queryset().filter(pk__in=past_lesson_ids[start:start + BATCH_SIZE])
+            changed_lessons, teacher_payments, company_payments, student_payments = [], [], [], []
+
+            for lesson in batch:
+                status = self.rng.choices(('conducted', 'missed', 'planned'), (85, 10, 5))[0]
+                if status == 'planned':
+                    continue
+
+                students = list(lesson.students.all())
+                company = get_students_company(students)
+                teacher_payment, company_payment, lesson_student_payments = collect_lesson_payments(
+                    lesson, status, students, company, get_rate_snapshot(lesson.date), pricing)
+
+                for payment in [teacher_payment, company_payment, *lesson_student_payments]:
+                    if payment:
+                        payment.created_at = lesson.date
+
+                changed_lessons.append(lesson)
+                teacher_payments.append(teacher_payment)
+                if company_payment:
+                    company_payments.append(company_payment)
+                student_payments.extend(lesson_student_payments)
+
+            Lesson.objects.bulk_update(changed_lessons, ['status', 'price', 'currency'])
+            TeacherPayment.objects.bulk_create(teacher_payments)
+            CompanyPayment.objects.bulk_create(company_payments)
+            StudentPayment.objects.bulk_create(student_payments)
+            charge_wallets(Company, sum_payments_by_account(company_payments, 'company_id'))
+            charge_wallets(Student, sum_payments_by_account(student_payments, 'student_id'))
+
+    def create_top_ups(self, students, months):
+        """
+        Students pay for lessons every month
+        """
+        today = date.today()
+        top_ups = [
+            StudentPayment(student=student, price=student.rate * self.rng.choice((4, 8, 12)),
+                           created_at=today - timedelta(days=30 * month + self.rng.randrange(30)),
+                           description='Top up')
+            for student in students
+            for month in range(months)
+            if self.rng.random() < 0.7
+        ]
+        StudentPayment.objects.bulk_create(top_ups, batch_size=BATCH_SIZE)
+        apply_wallet_deltas(Student, sum_payments_by_account(top_ups, 'student_id'))
@@ -0,0 +1,19 @@
+from django.utils.functional import SimpleLazyObject
+
+from .services import get_school_profile
+
+
+class SchoolProfileMiddleware:
+    """
+    Adds lazy request.school_profile - Student or Teacher profile of the request user.
+
+    The profile is loaded on first access and shared by the permission decorators, profile views
+    and get_teacher(), so it is fetched at most once per request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.school_profile = SimpleLazyObject(lambda: get_school_profile(request))
+        return self.get_response(request)
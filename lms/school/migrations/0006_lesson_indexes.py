@@ -0,0 +1,21 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0005_alter_lesson_options_alter_studentprogress_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['teacher', 'date', 'time'], name='lesson_teacher_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['-date', '-id'], name='lesson_date_desc_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.3 on 2026-10-18 13:00
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Group discounts used before pricing rules: min group size -> multiplier
+DEFAULT_GROUP_MULTIPLIERS = {
+    1: Decimal('1'),
+    2: Decimal('0.9'),
+    3: Decimal('0.85'),
+    4: Decimal('0.8'),
+}
+
+
+def create_default_rules(apps, schema_editor):
+    PricingRule = apps.get_model('school', 'PricingRule')
+    PricingRule.objects.bulk_create([
+        PricingRule(source='', min_group_size=group_size, multiplier=multiplier)
+        for group_size, multiplier in DEFAULT_GROUP_MULTIPLIERS.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_alter_company_options_alter_company_currency_and_more'),
+        ('school', '0006_lesson_indexes'),
+        ('settings', '0003_exchangerate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(blank=True, choices=[('student', 'Student rate'), ('company', 'Company rate'), ('teacher', 'Teacher rate')], help_text='Empty - any rate source', max_length=20, verbose_name='rate source')),
+                ('min_group_size', models.PositiveSmallIntegerField(default=1, verbose_name='min group size')),
+                ('multiplier', models.DecimalField(decimal_places=4, max_digits=6, verbose_name='multiplier')),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='companies.company', verbose_name='company')),
+                ('duration', models.ForeignKey(blank=True, help_text='Empty - any duration', null=True, on_delete=django.db.models.deletion.CASCADE, to='settings.duration', verbose_name='duration')),
+                ('teacher', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='school.teacher', verbose_name='teacher')),
+            ],
+            options={
+                'verbose_name': 'Pricing Rule',
+                'verbose_name_plural': 'Pricing Rules',
+            },
+        ),
+        migrations.RunPython(create_default_rules, migrations.RunPython.noop),
+    ]
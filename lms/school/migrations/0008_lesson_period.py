@@ -0,0 +1,43 @@
+# Generated by Django 5.0.3 on 2026-10-18 21:00
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations
+
+
+def fill_lesson_periods(apps, schema_editor):
+    """
+    [start, end) of the existing lessons in one UPDATE, date and time are local time of settings.TIME_ZONE
+    """
+    Lesson = apps.get_model('school', 'Lesson')
+    Duration = apps.get_model('settings', 'Duration')
+    schema_editor.execute(
+        f'UPDATE {Lesson._meta.db_table} AS lesson '
+        f'SET period = tstzrange((lesson.date + lesson.time) AT TIME ZONE %s, '
+        f"(lesson.date + lesson.time) AT TIME ZONE %s + make_interval(mins => duration.time), '[)') "
+        f'FROM {Duration._meta.db_table} AS duration '
+        f'WHERE duration.id = lesson.duration_id',
+        [settings.TIME_ZONE, settings.TIME_ZONE],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0007_pricingrule'),
+        ('settings', '0003_exchangerate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='period',
+            field=django.contrib.postgres.fields.ranges.DateTimeRangeField(blank=True, editable=False, null=True, verbose_name='period'),
+        ),
+        migrations.RunPython(fill_lesson_periods, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['period'], name='lesson_period_gist_idx'),
+        ),
+    ]
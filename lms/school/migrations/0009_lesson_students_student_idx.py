@@ -0,0 +1,32 @@
+# Generated by Django 5.0.3 on 2026-10-18 22:00
+
+from django.db import migrations
+
+INDEX_NAME = 'lesson_students_student_idx'
+
+
+def create_student_lesson_index(apps, schema_editor):
+    """
+    (student_id, lesson_id) on the auto-created students through table: the lessons of a student
+    from an index-only scan, the unique (lesson_id, student_id) index only serves the lesson side
+    """
+    through = apps.get_model('school', 'Lesson').students.through
+    schema_editor.execute(
+        f'CREATE INDEX {INDEX_NAME} ON {through._meta.db_table} '
+        f'({through._meta.get_field("student").column}, {through._meta.get_field("lesson").column})'
+    )
+
+
+def drop_student_lesson_index(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0008_lesson_period'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_student_lesson_index, drop_student_lesson_index),
+    ]
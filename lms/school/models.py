@@ -1,9 +1,18 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.fields import DateTimeRangeField
+from django.contrib.postgres.indexes import GistIndex
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Case, When, F, Q, Value, OuterRef, Subquery, Exists
+from django.db.models.functions import Concat, Coalesce
 from users.models import User
 from settings.models import Currency, Language, Duration
+from settings.services import get_duration_minutes
 from companies.models import Company
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -24,25 +33,141 @@ class CommonFields(models.Model):
         return f'{self.user.first_name} {self.user.last_name}'
 
 
+def user_display_name(prefix: str = 'user__'):
+    """
+    DB-side version of CommonFields.__str__: "first_name last_name" or username if both are empty
+    """
+    return Case(
+        When(**{f'{prefix}first_name': '', f'{prefix}last_name': ''}, then=F(f'{prefix}username')),
+        default=Concat(F(f'{prefix}first_name'), Value(' '), F(f'{prefix}last_name')),
+        output_field=models.CharField(),
+    )
+
+
+class TeacherQuerySet(models.QuerySet):
+    def for_profile(self):
+        """
+        Teacher with user and currency for the profile page
+        """
+        return self.select_related('user', 'currency')
+
+
 class Teacher(CommonFields):
     about = models.TextField(blank=True, verbose_name=_('about'))
 
+    objects = TeacherQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Teacher')
         verbose_name_plural = _('Teachers')
 
 
+class StudentQuerySet(models.QuerySet):
+    def for_list(self):
+        """
+        Students with user and company for the students table
+        """
+        return self.select_related('user', 'company')
+
+    def for_profile(self):
+        """
+        Student with user, currency, company, teacher and account summary for the profile page
+        """
+        return self.select_related('user', 'currency', 'company', 'teacher__user', 'account_summary')
+
+
 class Student(CommonFields):
     company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True, blank=True, verbose_name=_('company'))
     teacher = models.ForeignKey(Teacher, on_delete=models.SET_NULL, null=True, blank=True, related_name='teacher',
                                 verbose_name=_('teacher'))
     wallet = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name=_('wallet'))
 
+    objects = StudentQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Student')
         verbose_name_plural = _('Students')
 
 
+def lesson_period(lesson_date, lesson_time, minutes: int | None) -> DateTimeTZRange | None:
+    """
+    [start, end) of a lesson in the current time zone, None when the date, time or duration is unknown
+    """
+    if not (lesson_date and lesson_time and minutes):
+        return None
+    start = timezone.make_aware(datetime.combine(lesson_date, lesson_time))
+    return DateTimeTZRange(start, start + timedelta(minutes=minutes), '[)')
+
+
+class LessonQuerySet(models.QuerySet):
+    def with_students(self, students=None):
+        """
+        Prefetch lesson students with their users (str(student) and extract_students use the user)
+        """
+        if students is None:
+            students = Student.objects.select_related('user')
+        return self.prefetch_related(models.Prefetch('students', queryset=students))
+
+    def with_student_names(self):
+        """
+        Annotate `student_names` - comma separated student names, aggregated in the database
+        """
+        names = (Student.objects
+                 .filter(lesson=OuterRef('pk'))
+                 .order_by()
+                 .values('lesson')
+                 .annotate(names=StringAgg(user_display_name(), ', ', ordering='pk'))
+                 .values('names'))
+        return self.annotate(student_names=Coalesce(Subquery(names), Value(''), output_field=models.TextField()))
+
+    def for_schedule(self):
+        """
+        Lessons of the teacher schedule day: students in one extra query
+        """
+        return self.with_students()
+
+    def for_profile_list(self):
+        """
+        Lessons of the profile lessons tab: students in one extra query
+        """
+        return self.with_students()
+
+    def for_detail(self):
+        """
+        Single lesson page: duration and students with users
+        """
+        return self.select_related('duration').with_students()
+
+    def overlapping(self, period, teacher_id=None, students=None):
+        """
+        Lessons at the same time (overlapping period) with the same teacher or any of the students.
+        One query: the overlap is looked up in the GiST index of period, the students with EXISTS.
+
+        Parameters
+        ----------
+            period - DateTimeTZRange, see lesson_period()
+            teacher_id - teacher id
+            students - student ids or a Student queryset
+        """
+        shared = Q()
+        if teacher_id:
+            shared |= Q(teacher_id=teacher_id)
+        if students is not None:
+            shared |= Q(Exists(Lesson.students.through.objects.filter(lesson=OuterRef('pk'), student__in=students)))
+
+        if period is None or not shared:
+            return self.none()
+        return self.filter(shared, period__overlap=period)
+
+    def for_settlement(self):
+        """
+        Everything needed to settle lessons: duration, currency, teacher with currency
+        and students with user, currency and company with currency
+        """
+        return (self.select_related('duration', 'currency', 'teacher__currency')
+                .with_students(Student.objects.select_related('user', 'currency', 'company__currency')))
+
+
 class Lesson(models.Model):
     LESSON_STATUSES = [
         ('planned', _('Planned')),
@@ -61,13 +186,69 @@ class Lesson(models.Model):
     homework = models.TextField(blank=True, null=True, verbose_name=_('homework'))
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name=_('price'))
     currency = models.ForeignKey(Currency, on_delete=models.SET_NULL, null=True, blank=True, verbose_name=_('currency'))
+    # [start, end) from date, time and duration, set by save(). Double-booking checks use its GiST index.
+    period = DateTimeRangeField(null=True, blank=True, editable=False, verbose_name=_('period'))
+
+    objects = LessonQuerySet.as_manager()
 
     def __str__(self):
         return self.theme
 
+    def get_period(self):
+        return lesson_period(self.date, self.time, get_duration_minutes(self.duration_id))
+
+    def save(self, *args, **kwargs):
+        self.period = self.get_period()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'date', 'time', 'duration', 'duration_id'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'period'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = _('Lesson')
         verbose_name_plural = _('Lessons')
+        indexes = [
+            models.Index(fields=['teacher', 'date', 'time'], name='lesson_teacher_date_idx'),
+            models.Index(fields=['-date', '-id'], name='lesson_date_desc_idx'),
+            GistIndex(fields=['period'], name='lesson_period_gist_idx'),
+        ]
+
+
+class PricingRule(models.Model):
+    """
+    Price multiplier (group discount) for lessons priced from a rate.
+
+    The most specific rule wins: company/teacher override, then rate source, then any source;
+    a rule for the duration before a rule for any duration; then the largest min_group_size
+    not greater than the group size.
+    """
+    RATE_SOURCES = [
+        ('student', _('Student rate')),
+        ('company', _('Company rate')),
+        ('teacher', _('Teacher rate')),
+    ]
+
+    source = models.CharField(max_length=20, choices=RATE_SOURCES, blank=True, verbose_name=_('rate source'),
+                              help_text=_('Empty - any rate source'))
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True, verbose_name=_('company'))
+    teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE, null=True, blank=True, verbose_name=_('teacher'))
+    duration = models.ForeignKey(Duration, on_delete=models.CASCADE, null=True, blank=True,
+                                 verbose_name=_('duration'), help_text=_('Empty - any duration'))
+    min_group_size = models.PositiveSmallIntegerField(default=1, verbose_name=_('min group size'))
+    multiplier = models.DecimalField(max_digits=6, decimal_places=4, verbose_name=_('multiplier'))
+
+    def clean(self):
+        if self.company_id and self.source != 'company':
+            raise ValidationError({'company': _('Company override needs the company rate source.')})
+        if self.teacher_id and self.source != 'teacher':
+            raise ValidationError({'teacher': _('Teacher override needs the teacher rate source.')})
+
+    def __str__(self):
+        return f"{self.get_source_display() or '*'} {self.min_group_size}+: {self.multiplier}"
+
+    class Meta:
+        verbose_name = _('Pricing Rule')
+        verbose_name_plural = _('Pricing Rules')
 
 
 class StudentProgress(models.Model):
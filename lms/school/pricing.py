@@ -0,0 +1,132 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from lms.cache import get_or_set, bump_version
+from settings.services import get_durations
+from .models import PricingRule
+
+DEFAULT_LESSON_DURATION = 60  # minutes, rates are per hour
+RATE_SOURCES = [source for source, _label in PricingRule.RATE_SOURCES]
+CENT = Decimal('0.01')
+PRICE_ROUNDING = ROUND_HALF_EVEN  # same as round() used for prices before
+
+PRICING_NAMESPACE = 'pricing'
+PRICING_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class PricingTable:
+    """
+    Pricing rules compiled into price factors keyed by (rate source, owner id, duration, group size).
+
+    A factor is rule multiplier * duration / DEFAULT_LESSON_DURATION as exact Decimal,
+    so a price is one multiplication and one rounding. Owner id is the company or teacher id
+    for overrides, None for the rules of the whole rate source.
+    """
+
+    def __init__(self, rules: list[dict], durations: list[int]):
+        self.rules = rules
+        self.max_group_size = max([rule['min_group_size'] for rule in rules] + [1])
+        self.factors = {}
+
+        owners = {(rule['source'], rule['owner_id']) for rule in rules if rule['owner_id'] is not None}
+        rate_sources = [(source, None) for source in RATE_SOURCES] + sorted(owners)
+        durations = sorted(set(durations) | {rule['duration'] for rule in rules if rule['duration']})
+
+        for source, owner_id in rate_sources:
+            for duration in durations:
+                for group_size in range(1, self.max_group_size + 1):
+                    self.factors[(source, owner_id, duration, group_size)] = self.compile_factor(
+                        source, owner_id, duration, group_size)
+
+    def compile_factor(self, source: str, owner_id: int | None, duration: int, group_size: int) -> Decimal:
+        """
+        Factor of the most specific rule matching the lesson, multiplier 1 if no rule matches
+        """
+        best_rank, multiplier = None, Decimal(1)
+        for rule in self.rules:
+            if rule['source'] not in ('', source) or rule['owner_id'] not in (None, owner_id):
+                continue
+            if rule['duration'] not in (None, duration) or rule['min_group_size'] > group_size:
+                continue
+
+            rank = (rule['owner_id'] is not None, rule['source'] != '', rule['duration'] is not None,
+                    rule['min_group_size'])
+            if best_rank is None or rank > best_rank:
+                best_rank, multiplier = rank, rule['multiplier']
+
+        return multiplier * duration / DEFAULT_LESSON_DURATION
+
+    def factor(self, source: str, duration: int, group_size: int, owner_id: int = None) -> Decimal:
+        group_size = min(group_size, self.max_group_size)
+
+        factor = self.factors.get((source, owner_id, duration, group_size))
+        if factor is None and owner_id is not None:
+            factor = self.factors.get((source, None, duration, group_size))
+        if factor is None:
+            # Duration added after the table was compiled
+            factor = self.compile_factor(source, owner_id, duration, group_size)
+        return factor
+
+    def price(self, rate: Decimal, duration: int, group_size: int, source: str = 'student',
+              owner_id: int = None) -> Decimal:
+        """
+        Price for one student of the group, rounded to cents
+        """
+        return (rate * self.factor(source, duration, group_size, owner_id)).quantize(CENT, PRICE_ROUNDING)
+
+    def price_many(self, items) -> list[Decimal]:
+        """
+        Price a batch in one pass
+
+        Parameters
+        ----------
+            items - iterable of (rate, duration, group_size) or (rate, duration, group_size, source, owner_id)
+
+        Returns
+        -------
+            list: prices in the input order
+        """
+        factors = self.factors
+        max_group_size = self.max_group_size
+        prices = []
+        for rate, duration, group_size, *rate_source in items:
+            source, owner_id = rate_source if rate_source else ('student', None)
+            factor = (factors.get((source, owner_id, duration, min(group_size, max_group_size)))
+                      or self.factor(source, duration, group_size, owner_id))
+            prices.append((rate * factor).quantize(CENT, PRICE_ROUNDING))
+        return prices
+
+
+def load_pricing_rules() -> list[dict]:
+    return [
+        {
+            'source': source,
+            'owner_id': company_id or teacher_id,
+            'duration': duration,
+            'min_group_size': min_group_size,
+            'multiplier': multiplier,
+        }
+        for source, company_id, teacher_id, duration, min_group_size, multiplier in
+        PricingRule.objects.values_list('source', 'company_id', 'teacher_id', 'duration__time', 'min_group_size',
+                                        'multiplier')
+    ]
+
+
+def get_pricing_table() -> PricingTable:
+    """
+    Compiled pricing rules from the process memory or the shared cache,
+    recompiled from the database only after invalidation.
+
+    Returns
+    -------
+        PricingTable
+    """
+    return get_or_set(PRICING_NAMESPACE, 'table',
+                      lambda: PricingTable(load_pricing_rules(), [duration.time for duration in get_durations()]),
+                      PRICING_CACHE_TIMEOUT)
+
+
+def clear_pricing_cache():
+    """
+    Invalidate compiled pricing rules in every process by bumping the shared version
+    """
+    bump_version(PRICING_NAMESPACE)
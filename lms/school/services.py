@@ -1,184 +1,391 @@
 import calendar
-from datetime import datetime
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import date
 from collections import defaultdict
+from functools import lru_cache
 
+from django.contrib.postgres.aggregates import StringAgg
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from django.db.models.functions import ExtractYear
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction, NotSupportedError
+from django.db.models import F, Q, OuterRef, Subquery, Value, Count, Min, Max, TextField
+from django.http import Http404
+from django.db.models.functions import Concat, Coalesce
 from django.shortcuts import get_object_or_404
 from decimal import Decimal
 
 from .models import Student, Teacher, Lesson
+from users.models import User
 from companies.models import Company
-from settings.models import Currency, Duration
-from transactions.models import StudentPayment, TeacherPayment, CompanyPayment
+from settings.models import Currency
+from settings.services import get_default_currency, get_durations
+from lms.cache import MISSING, get_or_set, get_version, bump_version, cache_get
+from settings.conversion import RateSnapshot, get_rate_snapshot
+from .pricing import PricingTable, get_pricing_table
+from transactions.models import (StudentPayment, TeacherPayment, CompanyPayment, TeacherPaymentSummary,
+                                 StudentAccountSummary)
+from transactions.services import charge_wallets
 
 from functools import wraps
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import PermissionDenied, ValidationError
 
 from django.utils.translation import gettext_lazy as _
 
-DEFAULT_LESSON_DURATION = 60  # minutes
-GROUP_DISCOUNT = {
-    1: Decimal(1),
-    2: Decimal(0.9),
-    3: Decimal(0.85),
-    4: Decimal(0.8),
-}
-
 
-def payment_description(lesson: Lesson) -> str:
+def payment_description(lesson: Lesson, students: list[Student] = None) -> str:
     """
     Returns a description for the payment related to the given lesson.
 
     Parametrs
     -------
         lesson - the lesson object
+        students - already loaded lesson students, to avoid querying them again
 
     Returns
     -------
         string - description for the payment related to the given lesson
     """
+    if students is None:
+        students = lesson.students.all()
     students = ', '.join(
-        [f'{student.user.first_name} {student.user.last_name}' for student in lesson.students.all()])
+        [f'{student.user.first_name} {student.user.last_name}' for student in students])
     date = lesson.date.strftime("%d.%m.%Y")
     time = lesson.time.strftime("%H:%M")
     return _("For lesson {date} - {time}; Students: {students}").format(date=date, time=time, students=students)
 
 
-def lesson_finished(teacher: Teacher, lesson_id: int, status: str):
+def get_settlement_queryset():
+    """
+    Lessons with everything needed for settlement loaded up front:
+    duration, currency, teacher with currency and students with user, currency and company.
+
+    Returns
+    -------
+        QuerySet of Lesson
+    """
+    return Lesson.objects.for_settlement()
+
+
+def lesson_finished(teacher: Teacher, lesson_id: int, status: str) -> bool:
     """
     Marks the given lesson as finished and calculates the final price based on the lesson duration,
     number of students, and the availability of a company.
     Generate Transactions for Teacher, Student(s), Company(Option)
 
+    The lesson, its students and the default currency are loaded once, prices are calculated in memory
+    and the payments and wallet changes are written in bulk, so the number of queries
+    does not depend on the number of students. Everything runs in one transaction with the lesson
+    row locked and a lesson which already has the status is left as is, so a double submit can't charge
+    the wallets twice.
+
     Parameters
     ----------
         teacher - the teacher object
         lesson_id - the ID of the lesson
         status - the new status of the lesson ("conducted", "missed", "planned")
 
+    Returns
+    -------
+        bool: False if the lesson already had the status
+
     Raises
     ------
-        PermissionDenied - if the user is not the teacher of the lesson
+        Http404 - if the lesson does not exist or belongs to another teacher
+    """
+    with transaction.atomic():
+        return _lesson_finished(teacher, lesson_id, status)
 
-    if teacher != lesson.teacher:
-        raise PermissionDenied("You are not the teacher of this lesson.")
 
-    lesson_finished_service(teacher, lesson_id, status)
-    """
-    lesson = get_object_or_404(Lesson, pk=lesson_id, teacher=teacher)
-    company = get_students_company(lesson.students.all())
+def _lesson_finished(teacher: Teacher, lesson_id: int, status: str) -> bool:
+    lesson = get_object_or_404(
+        get_settlement_queryset().select_for_update(of=('self',)), pk=lesson_id, teacher=teacher)
+    # Already in this status, e.g. a double submit which waited for the lock
+    if lesson.status == status:
+        return False
+
+    students = list(lesson.students.all())
+    company = get_students_company(students)
 
     if status == 'planned':
         lesson_pay_back(lesson, status, company)
     elif (lesson.status == 'conducted' and status == 'missed') or (lesson.status == 'missed' and status == 'conducted'):
         lesson.status = status
-        lesson.save()
+        lesson.save(update_fields=['status'])
     else:
-        lesson.status = status
-        lesson.price = calculate_lesson_price(lesson.duration.time, lesson.students.all(), company)
-        lesson.currency = set_lesson_currency(lesson.students.all())
+        teacher_payment, company_payment, student_payments = collect_lesson_payments(
+            lesson, status, students, company, get_rate_snapshot())
 
-        lesson.save()
+        lesson.save(update_fields=['status', 'price', 'currency'])
 
-        # Teacher Price
-        set_teacher_transaction(teacher, lesson)
+        TeacherPayment.objects.bulk_create([teacher_payment])
+        TeacherPaymentSummary.objects.add_payments([teacher_payment])
 
-        # Company Price
-        if company:
-            set_company_transaction(company, lesson)
+        if company_payment:
+            CompanyPayment.objects.bulk_create([company_payment])
+            charge_wallets(Company, {company.pk: company_payment.price})
 
-        # Student(s) Price
-        for student in lesson.students.all():
-            set_student_transaction(student, lesson, company)
+        StudentPayment.objects.bulk_create(student_payments)
+        student_charges = sum_payments_by_account(student_payments, 'student_id')
+        charge_wallets(Student, student_charges)
+        StudentAccountSummary.objects.refresh(student_charges)
 
+    return True
 
-def lesson_pay_back(lesson: Lesson, status: str, company: Company):
+
+def lessons_finished(lessons, status: str) -> tuple[int, dict]:
     """
-    Back Money for canceled lesson, delete relation transactions
+    Batch version of lesson_finished, used by the admin actions.
+
+    All lessons are loaded with one prefetching queryset, prices are calculated in memory
+    and every lesson, payment and wallet change is written in bulk inside one transaction.
+    The lesson rows are locked while the batch is settled and their status is checked after the lock,
+    so a teacher settling one of the lessons at the same time can't charge the wallets twice.
+    Lessons which can't be settled are skipped, the rest of the batch is still saved.
+
+    Parameters
+    ----------
+        lessons - QuerySet of Lesson
+        status - the new status of the lessons ("conducted", "missed", "planned")
+
+    Returns
+    -------
+        tuple: number of updated lessons, {lesson: error message} for skipped lessons
     """
-    lesson.price = 0
-    lesson.currency = None
-    lesson.status = status
+    with transaction.atomic():
+        lessons = list(get_settlement_queryset().select_for_update(of=('self',))
+                       .filter(pk__in=lessons.values('pk')).order_by('pk'))
 
-    lesson.save()
+        if status == 'planned':
+            return pay_back_lessons(lessons, status)
 
-    teacher_transaction = get_object_or_404(TeacherPayment, lesson=lesson)
-    teacher_transaction.delete()
+        return settle_lessons(lessons, status)
 
-    if company:
-        company_transaction = get_object_or_404(CompanyPayment, lesson=lesson)
-        company = company_transaction.company
-        company.wallet += company_transaction.price
-        company.save()
-        company_transaction.delete()
 
-    student_transactions = StudentPayment.objects.filter(lesson=lesson)
-    for student_transaction in student_transactions:
-        student = student_transaction.student
-        student.wallet += student_transaction.price
-        student.save()
-        student_transaction.delete()
+def settle_lessons(lessons: list[Lesson], status: str) -> tuple[int, dict]:
+    """
+    Mark lessons as conducted or missed and create their payments in bulk.
 
+    Parameters
+    ----------
+        lessons - lessons loaded and locked with get_settlement_queryset()
+        status - "conducted" or "missed"
 
-def set_company_transaction(company: Company, lesson: Lesson):
+    Returns
+    -------
+        tuple: number of updated lessons, {lesson: error message} for skipped lessons
     """
-    Set transaction for company
+    failures = {}
+    changed_lessons = []
+    teacher_payments = []
+    company_payments = []
+    student_payments = []
+    rates = get_rate_snapshot()
+    pricing = get_pricing_table()
+
+    for lesson in lessons:
+        if lesson.status == status:
+            failures[lesson] = _('Lesson already has this status')
+            continue
+
+        if lesson.status != 'planned':
+            lesson.status = status
+            changed_lessons.append(lesson)
+            continue
+
+        if lesson.duration is None or lesson.teacher is None:
+            failures[lesson] = _('Lesson has no duration or teacher')
+            continue
+
+        students = list(lesson.students.all())
+        company = get_students_company(students)
+
+        try:
+            teacher_payment, company_payment, lesson_student_payments = collect_lesson_payments(
+                lesson, status, students, company, rates, pricing)
+        except (Http404, LookupError, ArithmeticError) as error:
+            failures[lesson] = str(error) or error.__class__.__name__
+            continue
+
+        changed_lessons.append(lesson)
+        teacher_payments.append(teacher_payment)
+        if company_payment:
+            company_payments.append(company_payment)
+        student_payments.extend(lesson_student_payments)
+
+    with transaction.atomic():
+        Lesson.objects.bulk_update(changed_lessons, ['status', 'price', 'currency'])
+        TeacherPayment.objects.bulk_create(teacher_payments)
+        TeacherPaymentSummary.objects.add_payments(teacher_payments)
+        CompanyPayment.objects.bulk_create(company_payments)
+        StudentPayment.objects.bulk_create(student_payments)
+        charge_wallets(Company, sum_payments_by_account(company_payments, 'company_id'))
+        student_charges = sum_payments_by_account(student_payments, 'student_id')
+        charge_wallets(Student, student_charges)
+        StudentAccountSummary.objects.refresh(student_charges)
+
+    clear_lesson_calendar_cache(*[lesson.teacher_id for lesson in changed_lessons])
+    return len(changed_lessons), failures
+
+
+def pay_back_lessons(lessons: list[Lesson], status: str) -> tuple[int, dict]:
+    """
+    Batch version of lesson_pay_back: return money for the lessons and delete their payments in bulk.
 
     Parameters
     ----------
-        company - the company object
-        lesson - the lesson object
+        lessons - lessons loaded and locked with get_settlement_queryset()
+        status - new lessons status
+
+    Returns
+    -------
+        tuple: number of updated lessons, {lesson: error message} for skipped lessons
     """
-    duration = lesson.duration.time
-    number_of_students = len(lesson.students.all())
-    price = calculate_company_price(company, duration, number_of_students)
-    description = payment_description(lesson)
-    CompanyPayment(lesson=lesson, price=price, description=description, company=company).save()
-    company.wallet -= price
-    company.save()
+    failures = {}
+    lesson_ids = [lesson.pk for lesson in lessons]
+    paid_lesson_ids = set(TeacherPayment.objects.filter(lesson__in=lesson_ids).values_list('lesson_id', flat=True))
+
+    changed_lessons = []
+    for lesson in lessons:
+        if lesson.status == status:
+            failures[lesson] = _('Lesson already has this status')
+            continue
+
+        if lesson.pk not in paid_lesson_ids:
+            failures[lesson] = _('Lesson has no payments to return')
+            continue
+
+        lesson.price = 0
+        lesson.currency = None
+        lesson.status = status
+        changed_lessons.append(lesson)
+
+    changed_lesson_ids = [lesson.pk for lesson in changed_lessons]
+    company_payments = CompanyPayment.objects.filter(lesson__in=changed_lesson_ids)
+    student_payments = StudentPayment.objects.filter(lesson__in=changed_lesson_ids)
+
+    with transaction.atomic():
+        company_refunds = sum_payments_by_account(company_payments.values('company_id', 'price'), 'company_id')
+        student_refunds = sum_payments_by_account(student_payments.values('student_id', 'price'), 'student_id')
+        charge_wallets(Company, {pk: -amount for pk, amount in company_refunds.items()})
+        charge_wallets(Student, {pk: -amount for pk, amount in student_refunds.items()})
+
+        TeacherPayment.objects.filter(lesson__in=changed_lesson_ids).delete()
+        company_payments.delete()
+        student_payments.delete()
+        Lesson.objects.bulk_update(changed_lessons, ['status', 'price', 'currency'])
 
+    clear_lesson_calendar_cache(*[lesson.teacher_id for lesson in changed_lessons])
+    return len(changed_lessons), failures
 
-def set_teacher_transaction(teacher: Teacher, lesson: Lesson):
+
+def sum_payments_by_account(payments, field: str) -> dict:
     """
-    Set transaction for teacher
+    Sum payment prices per account
 
     Parameters
     ----------
-        teacher - the teacher object
-        lesson - the lesson object
+        payments - payment objects or dicts from .values()
+        field - account field, e.g. "student_id"
+
+    Returns
+    -------
+        dict: {account pk: total price}
     """
-    duration = lesson.duration.time
-    number_of_students = len(lesson.students.all())
-    price = calculate_teacher_price(teacher, duration, lesson, number_of_students)
-    description = payment_description(lesson)
-    TeacherPayment(lesson=lesson, price=price, description=description, teacher=teacher).save()
+    totals = defaultdict(Decimal)
+    for payment in payments:
+        if isinstance(payment, dict):
+            totals[payment[field]] += payment['price']
+        else:
+            totals[getattr(payment, field)] += payment.price
+
+    return dict(totals)
 
 
-def set_student_transaction(student: Student, lesson: Lesson, company: Company):
+def collect_lesson_payments(lesson: Lesson, status: str, students: list[Student], company: Company | None,
+                            rates: RateSnapshot, pricing: PricingTable = None):
     """
-    Set transaction for student
+    Set lesson status, price and currency and build (not save) its payments.
 
     Parameters
     ----------
-        student - the student object
-        lesson - the lesson object
-        company - the company object
+        lesson - the lesson object, loaded with get_settlement_queryset()
+        status - the new status of the lesson
+        students - lesson students
+        company - company which pays for the students or None
+        rates - exchange rates for the settlement, rates.base is the system default currency
+        pricing - compiled pricing rules, loaded if not passed
+
+    Returns
+    -------
+        tuple: TeacherPayment, CompanyPayment or None, list of StudentPayment
     """
     duration = lesson.duration.time
-    number_of_students = len(lesson.students.all())
-    price = calculate_student_price(student.rate, duration, number_of_students, company)
-    description = payment_description(lesson)
-    StudentPayment(lesson=lesson, price=price, description=description, student=student).save()
-    student.wallet -= price
-    student.save()
+    number_of_students = len(students)
+    description = payment_description(lesson, students)
+    pricing = pricing or get_pricing_table()
+
+    lesson.status = status
+    lesson.price = calculate_lesson_price(duration, students, company, rates, pricing)
+    lesson.currency = set_lesson_currency(students, rates.base)
+
+    teacher = lesson.teacher
+    teacher_price = calculate_teacher_price(teacher, duration, lesson, number_of_students, rates, pricing)
+    teacher_payment = TeacherPayment(lesson=lesson, price=teacher_price, description=description, teacher=teacher)
+
+    company_payment = None
+    if company:
+        company_price = calculate_company_price(company, duration, number_of_students, pricing)
+        company_payment = CompanyPayment(lesson=lesson, price=company_price, description=description,
+                                         company=company)
+
+    student_payments = [
+        StudentPayment(lesson=lesson,
+                       price=calculate_student_price(student.rate, duration, number_of_students, company, pricing),
+                       description=description,
+                       student=student)
+        for student in students
+    ]
+
+    return teacher_payment, company_payment, student_payments
+
+
+def lesson_pay_back(lesson: Lesson, status: str, company: Company):
+    """
+    Back Money for canceled lesson, delete relation transactions
+    """
+    lesson.price = 0
+    lesson.currency = None
+    lesson.status = status
+
+    lesson.save(update_fields=['status', 'price', 'currency'])
+
+    teacher_transaction = get_object_or_404(TeacherPayment, lesson=lesson)
+    teacher_transaction.delete()
+
+    if company:
+        company_transaction = get_object_or_404(CompanyPayment, lesson=lesson)
+        charge_wallets(Company, {company_transaction.company_id: -company_transaction.price})
+        company_transaction.delete()
+
+    student_transactions = StudentPayment.objects.filter(lesson=lesson)
+    refunds = sum_payments_by_account(student_transactions.values('student_id', 'price'), 'student_id')
+    charge_wallets(Student, {pk: -amount for pk, amount in refunds.items()})
+    student_transactions.delete()
 
 
 def get_default_system_currency() -> Currency:
     """
-    Return Base Currency from settings
+    Return Base Currency from settings (cached currency registry)
+
+    Raises
+    ------
+        Http404 - if default currency is not set
     """
-    return get_object_or_404(Currency, default=True)
+    currency = get_default_currency()
+    if currency is None:
+        raise Http404("Default currency is not set.")
+    return currency
 
 
 def check_students_currencies(students: list[Student]) -> Currency | None:
@@ -206,63 +413,75 @@ def get_students_company(students: list[Student]) -> Company | None:
     return None
 
 
-def calculate_lesson_price(duration: int, students: list, company: Company = None) -> Decimal:
+def calculate_lesson_price(duration: int, students: list, company: Company = None,
+                           rates: RateSnapshot = None, pricing: PricingTable = None) -> Decimal:
     """
     Calculate lesson Price
     :param duration: lesson Duration
     :param students: students
     :param company: company, default = None
+    :param rates: exchange rates, today rates if not passed
+    :param pricing: compiled pricing rules, loaded if not passed
     :return: lesson price
     """
     number_of_students = len(students)
 
     if company:
-        return calculate_company_price(company, duration, number_of_students)
+        return calculate_company_price(company, duration, number_of_students, pricing)
 
+    pricing = pricing or get_pricing_table()
     lesson_price = Decimal(0)
     if check_students_currencies(students):
         for student in students:
-            lesson_price += calculate_price(student.rate, duration, number_of_students)
+            lesson_price += calculate_price(student.rate, duration, number_of_students, pricing)
     else:
+        rates = rates or get_rate_snapshot()
         for student in students:
-            lesson_price += calculate_price(student.rate, duration, number_of_students) / student.currency.exchange
+            lesson_price += rates.to_base(calculate_price(student.rate, duration, number_of_students, pricing),
+                                          student.currency_id)
 
     return lesson_price
 
 
-def set_lesson_currency(students: list) -> Currency:
+def set_lesson_currency(students: list, default_currency: Currency = None) -> Currency:
     """
     Set lesson currency, base on students currency or students company.
     If Student shave different currencies, use system default currency
     """
-    if get_students_company(students):
-        return get_students_company(students).currency
-    elif check_students_currencies(students):
-        return check_students_currencies(students)
-    else:
-        return get_default_system_currency()
+    company = get_students_company(students)
+    if company:
+        return company.currency
+
+    currency = check_students_currencies(students)
+    if currency:
+        return currency
+
+    return default_currency or get_default_system_currency()
 
 
-def calculate_price(rate: Decimal, duration: int, number_of_students: int) -> Decimal:
+def calculate_price(rate: Decimal, duration: int, number_of_students: int, pricing: PricingTable = None,
+                    source: str = 'student', owner_id: int = None) -> Decimal:
     """
-    Calculate base lesson price
+    Calculate base lesson price with the group discount from the pricing rules
 
     Parametrs
     ----------
         rate: user rate
         duration: lesson duration
         number_of_students: students on lesson
+        pricing: compiled pricing rules, loaded if not passed
+        source: rate source of the rules - 'student', 'company' or 'teacher'
+        owner_id: company or teacher id for their own rules
 
     Returns
     -------
         lesson price
     """
-    group_discount = GROUP_DISCOUNT[4] if number_of_students >= 4 else GROUP_DISCOUNT[number_of_students]
-    price = rate * Decimal(duration / DEFAULT_LESSON_DURATION) * group_discount
-    return round(price, 2)
+    return (pricing or get_pricing_table()).price(rate, duration, number_of_students, source, owner_id)
 
 
-def calculate_student_price(rate: Decimal, duration: int, number_of_students: int, company=None) -> Decimal:
+def calculate_student_price(rate: Decimal, duration: int, number_of_students: int, company=None,
+                            pricing: PricingTable = None) -> Decimal:
     """
     Calculate lesson price for each student
 
@@ -272,20 +491,21 @@ def calculate_student_price(rate: Decimal, duration: int, number_of_students: in
         duration: lesson duration
         number_of_students: students on lesson
         company: if company pay for student user Company discount
+        pricing: compiled pricing rules, loaded if not passed
 
     Returns
     -------
         lesson price
     """
     if company:
-        discount = Decimal(1 - (company.discount / 100))
-        rate *= discount
+        rate = rate * (100 - company.discount) / 100
 
-    price = calculate_price(rate, duration, number_of_students)
+    price = calculate_price(rate, duration, number_of_students, pricing)
     return price
 
 
-def calculate_company_price(company: Company, duration: int, number_of_students: int) -> Decimal:
+def calculate_company_price(company: Company, duration: int, number_of_students: int,
+                            pricing: PricingTable = None) -> Decimal:
     """
     Calculate lesson price when company pay for their workers
 
@@ -294,20 +514,22 @@ def calculate_company_price(company: Company, duration: int, number_of_students:
         company: Company object
         duration: lesson duration
         number_of_students: students on lesson
+        pricing: compiled pricing rules, loaded if not passed
 
     Returns
     -------
         lesson price
     """
-    company_discount = Decimal(company.discount / 100)  # Переводим % в дробь: 100 = 1; 50 = 0.5
-    company_rate = company.rate if company_discount == 1 else (company.rate * company_discount)
+    company_rate = company.rate * company.discount / 100  # Переводим % в дробь: 100 = 1; 50 = 0.5
 
-    company_price = calculate_price(company_rate, duration, number_of_students) * number_of_students
+    company_price = calculate_price(company_rate, duration, number_of_students, pricing,
+                                    'company', company.pk) * number_of_students
 
     return company_price
 
 
-def calculate_teacher_price(teacher: Teacher, duration: int, lesson: Lesson, number_of_students: int) -> Decimal:
+def calculate_teacher_price(teacher: Teacher, duration: int, lesson: Lesson, number_of_students: int,
+                            rates: RateSnapshot = None, pricing: PricingTable = None) -> Decimal:
     """
     Calculates the price for teacher
 
@@ -320,6 +542,8 @@ def calculate_teacher_price(teacher: Teacher, duration: int, lesson: Lesson, num
         duration: lesson duration
         lesson: Lesson object
         number_of_students: students on lesson
+        rates: exchange rates, today rates if not passed
+        pricing: compiled pricing rules, loaded if not passed
 
     Returns
     -------
@@ -328,17 +552,11 @@ def calculate_teacher_price(teacher: Teacher, duration: int, lesson: Lesson, num
     teacher_rate = teacher.rate
 
     if not teacher_rate:
-        lesson_price = lesson.price
+        rates = rates or get_rate_snapshot()
+        return round(rates.convert(lesson.price, lesson.currency_id, teacher.currency_id), 2)
 
-        if lesson.currency != teacher.currency:
-            if lesson.currency != get_default_system_currency():
-                lesson_price /= lesson.currency.exchange
-
-            lesson_price /= teacher.currency.exchange
-
-        return round(lesson_price, 2)
-
-    return calculate_price(teacher_rate, duration, number_of_students) * number_of_students
+    return calculate_price(teacher_rate, duration, number_of_students, pricing,
+                           'teacher', teacher.pk) * number_of_students
 
 
 # =================================================================
@@ -349,11 +567,9 @@ def user_is_student_or_teacher(view_func):
 
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        user = request.user
-        if user.school_role == 'student':
-            profile = get_object_or_404(Student, user=user)
-        elif user.school_role == 'teacher':
-            profile = get_object_or_404(Teacher, user=user)
+        profile = get_school_profile(request)
+        if profile is None:
+            raise Http404
 
         if request.user == profile.user or (hasattr(profile, 'teacher') and profile.teacher.user == request.user):
             return view_func(request, *args, **kwargs)
@@ -387,9 +603,10 @@ def user_is_student_teacher(view_func):
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
         student_pk = kwargs.get('pk')
-        student = get_object_or_404(Student, pk=student_pk)
+        student = get_object_or_404(Student.objects.only('teacher_id'), pk=student_pk)
+        teacher = get_teacher(request)
 
-        if request.user == student.teacher.user:
+        if teacher is not None and student.teacher_id == teacher.pk:
             return view_func(request, *args, **kwargs)
         else:
             raise PermissionDenied
@@ -401,9 +618,10 @@ def user_is_lesson_teacher(view_func):
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
         lesson_pk = kwargs.get('pk')
-        lesson = get_object_or_404(Lesson, pk=lesson_pk)
+        lesson = get_object_or_404(Lesson.objects.only('teacher_id'), pk=lesson_pk)
+        teacher = get_teacher(request)
 
-        if request.user.school_role == 'teacher' and request.user.id == lesson.teacher.user.id:
+        if teacher is not None and lesson.teacher_id == teacher.pk:
             return view_func(request, *args, **kwargs)
         else:
             raise PermissionDenied
@@ -426,19 +644,53 @@ def user_is_staff(view_func):
     return _wrapped_view
 
 
-def count_time_left(user):
+def get_account_summary(student: Student) -> StudentAccountSummary | None:
     """
-    Count time left for user to paid for lesson
+    Account summary of the student as it is stored. Payment writes keep it up to date,
+    the 30 days lesson window is moved by the daily low_balance_report run.
+
+    Returns
+    -------
+        StudentAccountSummary or None if the student has not been counted yet
+    """
+    try:
+        return student.account_summary
+    except StudentAccountSummary.DoesNotExist:
+        return None
+
+
+def get_hours_left(student: Student) -> Decimal | None:
+    """
+    Paid hours left of the student counted from the wallet and rate,
+    the same as StudentAccountSummary.hours_left for a student that has not been counted yet
+
+    Returns
+    -------
+        Decimal or None if the student has no rate
+    """
+    if student.wallet <= 0:
+        return Decimal(0)
+    if student.rate > 0:
+        return student.wallet / student.rate
+    return None
+
+
+def format_time_left(hours_left: Decimal | None):
+    """
+    Format paid time left of the student account
+
+    Parameters
+    ----------
+        hours_left - StudentAccountSummary.hours_left, None if the student has no rate
 
     Returns
     -------
         string: time left in format '10 hour(s) 30 minutes'
     """
-    if user.wallet <= 0:
+    if not hours_left or hours_left <= 0:
         return _('0 hour(s)')
-    time_left = user.wallet / user.rate
-    hours = int(time_left)
-    minutes = int((time_left - hours) * 60)
+    hours = int(hours_left)
+    minutes = int((hours_left - hours) * 60)
     return _("{hours} hour(s) {minutes} minutes").format(hours=hours, minutes=minutes)
 
 
@@ -473,6 +725,233 @@ def get_paginator(items, items_per_page, request):
     return items_page, page_range
 
 
+class KeysetPage:
+    """
+    One page of keyset (seek) pagination.
+
+    Iterates like a list of items, knows if there are pages around it and
+    gives opaque cursors for the `param_replace` tag: `?{% param_replace cursor=page.next_cursor %}`
+    """
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor, approximate_total=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approximate_total = approximate_total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode_cursor(direction: str, values: list) -> str:
+    payload = json.dumps([direction, values], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[str, list] | None:
+    try:
+        payload = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(payload)
+    except (ValueError, TypeError):
+        return None
+
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        return None
+
+    return direction, values
+
+
+def get_ordering_field(queryset, name: str):
+    """
+    Model field of an ordering lookup (`relation__field` paths are followed) or output field of an annotation
+    """
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+
+    model = queryset.model
+    *relations, name = name.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def clean_cursor_values(queryset, fields: list[str], values: list) -> list | None:
+    """
+    Cursor values converted to the python types of the ordering fields.
+    Cursors come from the query string, None if a value is missing or can't be converted.
+    """
+    if len(values) != len(fields):
+        return None
+
+    cleaned = []
+    for field, value in zip(fields, values):
+        try:
+            value = get_ordering_field(queryset, field).to_python(value)
+        except (ValidationError, ValueError, TypeError):
+            return None
+        if value is None:
+            return None
+        cleaned.append(value)
+
+    return cleaned
+
+
+def keyset_filter(ordering: list[str], values: list, backwards: bool = False) -> Q:
+    """
+    Rows after (or before, if backwards) the given key values in the given ordering:
+    (a > x) OR (a = x AND b > y) OR ...
+    """
+    condition = Q()
+    equal = Q()
+
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        descending = field.startswith('-') != backwards
+        condition |= equal & Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+        equal &= Q(**{name: value})
+
+    return condition
+
+
+def approximate_count(queryset) -> int | None:
+    """
+    Row count estimated by the PostgreSQL planner, without running COUNT(*)
+    """
+    try:
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+    except (ValueError, KeyError, IndexError, TypeError, NotSupportedError):
+        return None
+
+
+def get_keyset_paginator(items, items_per_page, request, ordering=('-date', '-id'), with_total=False):
+    """
+    Cut items per page using keyset (seek) pagination: no COUNT(*) and no OFFSET,
+    every page is an indexed range scan.
+
+    Parameters
+    ----------
+        items: QuerySet of items
+        items_per_page: number of items per page
+        request: current request object, cursor is taken from GET['cursor']
+        ordering: unique ordering, last field should be the primary key, e.g. ('-date', '-id')
+        with_total: add approximate total from the query planner
+
+    Returns
+    -------
+        KeysetPage: Paginated items
+    """
+    ordering = list(ordering)
+    fields = [field.lstrip('-') for field in ordering]
+
+    # An invalid or tampered cursor gives the first page
+    cursor = decode_cursor(request.GET.get('cursor', ''))
+    values = clean_cursor_values(items, fields, cursor[1]) if cursor else None
+    direction = cursor[0] if values else 'next'
+    backwards = direction == 'prev'
+
+    queryset = items
+    if values:
+        queryset = queryset.filter(keyset_filter(ordering, values, backwards))
+
+    if backwards:
+        queryset = queryset.order_by(*[field[1:] if field.startswith('-') else f'-{field}' for field in ordering])
+    else:
+        queryset = queryset.order_by(*ordering)
+
+    rows = list(queryset[:items_per_page + 1])
+    has_more = len(rows) > items_per_page
+    rows = rows[:items_per_page]
+
+    if backwards:
+        rows.reverse()
+        has_previous, has_next = has_more, True
+    else:
+        has_previous, has_next = values is not None, has_more
+
+    next_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor('next', [item_value(rows[-1], field) for field in fields])
+
+    previous_cursor = None
+    if rows and has_previous:
+        previous_cursor = encode_cursor('prev', [item_value(rows[0], field) for field in fields])
+
+    return KeysetPage(rows, has_next, has_previous, next_cursor, previous_cursor,
+                      approximate_count(items) if with_total else None)
+
+
+def item_value(item, field: str):
+    """
+    Value of `relation__field` lookup on an object
+    """
+    for name in field.split('__'):
+        item = getattr(item, name) if item is not None else None
+    return item
+
+
+def load_school_profile(user: User) -> Student | Teacher | None:
+    """
+    Load Student or Teacher profile of the user (by school role) with the relations used by the profile pages
+
+    Returns
+    -------
+        Student | Teacher | None: profile or None if the user has no school role or profile
+    """
+    if user.school_role == 'student':
+        queryset = Student.objects.for_profile()
+    elif user.school_role == 'teacher':
+        queryset = Teacher.objects.for_profile()
+    else:
+        return None
+    return queryset.filter(user=user).first()
+
+
+def get_school_profile(request) -> Student | Teacher | None:
+    """
+    Profile of the request user, loaded once per request.
+    Backs the lazy request.school_profile set by school.middleware.SchoolProfileMiddleware.
+
+    Returns
+    -------
+        Student | Teacher | None: profile or None for anonymous users and users without profile
+    """
+    if not hasattr(request, '_cached_school_profile'):
+        user = request.user
+        request._cached_school_profile = load_school_profile(user) if user.is_authenticated else None
+    return request._cached_school_profile
+
+
+def get_profile_by_user_id(request, user_id: int) -> Student | Teacher:
+    """
+    Profile shown on the profile pages. The own profile of the request user is reused from the request.
+
+    Raises
+    ------
+        Http404 - if the user does not exist or has no profile
+    """
+    if user_id == request.user.pk:
+        profile = get_school_profile(request)
+    else:
+        profile = load_school_profile(get_object_or_404(User, pk=user_id))
+
+    if profile is None:
+        raise Http404
+    return profile
+
+
 def get_teacher(request):
     """
     Get teacher object by request user
@@ -481,7 +960,8 @@ def get_teacher(request):
     -------
         Teacher: teacher object or None if not found
     """
-    return Teacher.objects.filter(user=request.user).first()
+    profile = get_school_profile(request)
+    return profile if isinstance(profile, Teacher) else None
 
 
 def get_duration_list():
@@ -492,7 +972,89 @@ def get_duration_list():
     -------
         list: list of Duration objects
     """
-    return Duration.objects.all()
+    return get_durations()
+
+
+LESSON_CALENDAR_CACHE_TIMEOUT = 60 * 60
+
+
+@lru_cache(maxsize=128)
+def get_month_calendar(year: int, month: int) -> tuple:
+    """
+    Weeks of the month as calendar.monthcalendar, memoized per (year, month)
+
+    Returns
+    -------
+        tuple: weeks, each is a tuple of 7 days (0 - day of another month)
+    """
+    return tuple(tuple(week) for week in calendar.monthcalendar(year, month))
+
+
+def lesson_calendar_namespace(teacher_id) -> str:
+    return f'lesson-calendar:{teacher_id}'
+
+
+def get_lesson_calendar_version(teacher_id) -> int:
+    """
+    Version of the teacher lessons, bumped on every lesson change of the teacher
+    """
+    return get_version(lesson_calendar_namespace(teacher_id))
+
+
+def get_lesson_calendar(teacher: Teacher, year: int, month: int) -> dict:
+    """
+    Teacher lessons per day of the month with status breakdown, one GROUP BY query over date.
+    Cached per (teacher, year, month) until the teacher lessons change.
+
+    Returns
+    -------
+        dict: {day: {'total': int, 'planned': int, 'conducted': int, 'missed': int}}
+    """
+    return get_or_set(lesson_calendar_namespace(teacher.pk), f'{year}:{month}',
+                      lambda: load_lesson_calendar(teacher, year, month), LESSON_CALENDAR_CACHE_TIMEOUT)
+
+
+def load_lesson_calendar(teacher: Teacher, year: int, month: int) -> dict:
+    rows = (Lesson.objects
+            .filter(teacher=teacher, date__range=get_month_range(year, month))
+            .values('date')
+            .annotate(total=Count('id'),
+                      planned=Count('id', filter=Q(status='planned')),
+                      conducted=Count('id', filter=Q(status='conducted')),
+                      missed=Count('id', filter=Q(status='missed')))
+            .order_by('date'))
+
+    return {
+        row['date'].day: {
+            'total': row['total'],
+            'planned': row['planned'],
+            'conducted': row['conducted'],
+            'missed': row['missed'],
+        }
+        for row in rows
+    }
+
+
+def clear_lesson_calendar_cache(*teacher_ids):
+    """
+    Invalidate cached lesson calendars of the teachers (all months)
+    """
+    bump_version(*[lesson_calendar_namespace(teacher_id) for teacher_id in teacher_ids if teacher_id is not None])
+
+
+def get_month_range(year: int, month: int) -> tuple[date, date]:
+    """
+    First and last day of the month, for index friendly `field__range` filters
+    instead of `field__month` / `field__year`
+    """
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def get_year_range(year: int) -> tuple[date, date]:
+    """
+    First and last day of the year
+    """
+    return date(year, 1, 1), date(year, 12, 31)
 
 
 def generate_month_list_for_filter():
@@ -507,52 +1069,104 @@ def generate_month_list_for_filter():
     return month_list
 
 
-def get_year_list(model, field='created_at', default=datetime.today().year):
+ACTIVITY_YEARS_NAMESPACE = 'activity-years'
+ACTIVITY_YEARS_CACHE_TIMEOUT = 60 * 60 * 24
 
-    years_list = (model.objects
-                       .annotate(year=ExtractYear(field))
-                       .values_list('year', flat=True).distinct().order_by('year'))
+# model: (date field, owner field) of the year filters
+ACTIVITY_YEAR_FIELDS = {
+    Lesson: ('date', 'teacher'),
+    TeacherPayment: ('created_at', 'teacher'),
+    CompanyPayment: ('created_at', 'company'),
+}
 
-    if not years_list:
-        return [default]
 
-    return years_list
+def activity_years_key(model, owner_id=None) -> str:
+    return f'{model._meta.label_lower}:{owner_id or "all"}'
 
 
-def sort_data_for_analytics(data):
+def get_activity_years(model, owner_id=None) -> list[int]:
     """
-    Sort data for analytics pages
+    Years for the year filters: from the first to the last dated row of the model, of one teacher
+    or company if owner_id is given, always including the current year.
+    First and last year are cached, they come from one MIN/MAX query over the date index.
 
     Parameters
     ----------
-        data QuerySet from DataBase
+        model - Lesson, TeacherPayment or CompanyPayment
+        owner_id - teacher id (Lesson, TeacherPayment) or company id (CompanyPayment)
 
-    Results
+    Returns
     -------
-        list: Sorted data for analytics pages
-    """
-    queryset = []
-    for lesson in data:
-        lesson_students = (Lesson
-                           .objects
-                           .filter(pk=lesson["lesson__id"])
-                           .values_list('students__user__first_name', 'students__user__last_name'))
-
-        item = {
-            'lesson_id': lesson["lesson__id"],
-            'students': ', '.join([f"{first_name} {last_name}" for first_name, last_name in lesson_students]),
-            'duration': lesson["lesson__duration__time"],
-        }
+        list: years in ascending order
+    """
+    bounds = get_or_set(ACTIVITY_YEARS_NAMESPACE, activity_years_key(model, owner_id),
+                        lambda: load_activity_years(model, owner_id), ACTIVITY_YEARS_CACHE_TIMEOUT)
+
+    current_year = date.today().year
+    if bounds is None:
+        return [current_year]
+    return list(range(min(bounds[0], current_year), max(bounds[1], current_year) + 1))
 
-        queryset.append(item)
 
-    combined_data = defaultdict(lambda: {"students": "", "duration": 0, "count": 0})
+def load_activity_years(model, owner_id=None) -> tuple[int, int] | None:
+    field, owner_field = ACTIVITY_YEAR_FIELDS[model]
+    queryset = model.objects.all()
+    if owner_id is not None:
+        queryset = queryset.filter(**{owner_field: owner_id})
 
-    for entry in queryset:
-        key = (entry["students"], entry["duration"])
-        if combined_data[key]["students"] == "":
-            combined_data[key]["students"] = entry["students"]
-            combined_data[key]["duration"] = entry["duration"]
-        combined_data[key]["count"] += 1
+    bounds = queryset.aggregate(first=Min(field), last=Max(field))
+    if bounds['first'] is None:
+        return None
+    return bounds['first'].year, bounds['last'].year
 
-    return list(combined_data.values())
+
+def record_activity_date(model, value: date, owner_id=None):
+    """
+    Keep cached years up to date with a saved or moved row: they are invalidated only when the row
+    is dated outside of them. Deleted rows don't narrow the years until the cache expires.
+    """
+    keys = {activity_years_key(model), activity_years_key(model, owner_id)}
+    for key in keys:
+        bounds = cache_get(ACTIVITY_YEARS_NAMESPACE, key, MISSING)
+        if bounds is MISSING:
+            continue
+        if bounds is None or not bounds[0] <= value.year <= bounds[1]:
+            # bump_version bumps again after the commit, so the years are not loaded again without the row
+            clear_activity_years_cache()
+            return
+
+
+def clear_activity_years_cache():
+    bump_version(ACTIVITY_YEARS_NAMESPACE)
+
+
+def sort_data_for_analytics(data):
+    """
+    Sort data for analytics pages
+
+    Student names of every lesson are joined by the database (StringAgg) and rows are grouped
+    by (students, duration) in the same query.
+
+    Parameters
+    ----------
+        data QuerySet of payments (TeacherPayment, CompanyPayment) for the period
+
+    Results
+    -------
+        list: Sorted data for analytics pages, [{'students': str, 'duration': int, 'count': int}]
+    """
+    lesson_students = (Lesson.students.through.objects
+                       .filter(lesson_id=OuterRef('lesson_id'))
+                       .values('lesson_id')
+                       .annotate(names=StringAgg(Concat('student__user__first_name', Value(' '),
+                                                        'student__user__last_name'),
+                                                 delimiter=', ', ordering='id'))
+                       .values('names'))
+
+    return list(data
+                .annotate(students=Coalesce(Subquery(lesson_students), Value(''), output_field=TextField()),
+                          duration=F('lesson__duration__time'))
+                .values('students', 'duration')
+                .annotate(count=Count('id'), first_lesson=Min('lesson_id'))
+                .values('students', 'duration', 'count')
+                .order_by('first_lesson'))
@@ -0,0 +1,48 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from settings.models import Duration
+from transactions.models import TeacherPayment, CompanyPayment
+from .models import Lesson, PricingRule
+from .pricing import clear_pricing_cache
+from .services import clear_lesson_calendar_cache, record_activity_date, ACTIVITY_YEAR_FIELDS
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson_calendar(sender, instance, **kwargs):
+    """
+    Drop cached month calendar of the lesson teacher.
+    """
+    clear_lesson_calendar_cache(instance.teacher_id)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=TeacherPayment)
+@receiver(post_save, sender=CompanyPayment)
+def update_activity_years(sender, instance, **kwargs):
+    """
+    Widen cached years of the year filters when the row is dated outside of them.
+    """
+    field, owner_field = ACTIVITY_YEAR_FIELDS[sender]
+    record_activity_date(sender, getattr(instance, field), getattr(instance, f'{owner_field}_id'))
+
+
+@receiver(m2m_changed, sender=Lesson.students.through)
+def invalidate_lesson_students(sender, instance, action, reverse, **kwargs):
+    """
+    Lesson students are saved after the lesson, bump the teacher version again
+    so the schedule API ETag covers the student list.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        clear_lesson_calendar_cache(instance.teacher_id)
+
+
+@receiver(post_save, sender=PricingRule)
+@receiver(post_delete, sender=PricingRule)
+@receiver(post_save, sender=Duration)
+@receiver(post_delete, sender=Duration)
+def invalidate_pricing(sender, **kwargs):
+    """
+    Recompile pricing rules when a rule or the list of durations changes.
+    """
+    clear_pricing_cache()
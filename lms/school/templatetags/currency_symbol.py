@@ -0,0 +1,21 @@
+from django import template
+
+from settings.services import get_currency
+
+register = template.Library()
+
+
+def currency_symbol(currency_id):
+    currency = get_currency(currency_id)
+    return currency.symbol if currency and currency.symbol else ''
+
+
+register.filter('currency_symbol', currency_symbol)
+
+
+def currency_name(currency_id):
+    currency = get_currency(currency_id)
+    return currency.name if currency else ''
+
+
+register.filter('currency_name', currency_name)
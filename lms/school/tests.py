@@ -1,3 +1,576 @@
-from django.test import TestCase
+import json
+import threading
+from base64 import urlsafe_b64encode
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from types import MappingProxyType
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import translation
+
+from lms.cache import clear_local_cache
+from lms.testing import QueryBudgetMixin
+from settings.conversion import RateSnapshot, get_rate_snapshot
+from settings.models import Currency, Duration
+from siteapp.models import SiteInfo
+from transactions.models import StudentAccountSummary, StudentPayment, TeacherPayment
+from users.models import User
+from .forms import LessonForm
+from .models import Teacher, Student, Lesson, StudentProgress
+from .pricing import PricingTable, load_pricing_rules
+from .services import calculate_teacher_price, get_keyset_paginator, lesson_finished, lessons_finished, \
+    sort_data_for_analytics
+
+
+class TeacherPriceConversionTest(SimpleTestCase):
+    """
+    A teacher without a rate gets the full lesson price converted to the teacher currency.
+    A rate is the number of currency units for one unit of the default currency.
+    """
+    DEFAULT, EUR, UAH = 1, 2, 3
+    rates = RateSnapshot(date(2026, 1, 1), None, MappingProxyType({
+        DEFAULT: Decimal(1),
+        EUR: Decimal('0.5'),
+        UAH: Decimal(40),
+    }))
+
+    def get_teacher_price(self, price: str, lesson_currency: int, teacher_currency: int) -> Decimal:
+        teacher = Teacher(rate=0, currency_id=teacher_currency)
+        lesson = Lesson(price=Decimal(price), currency_id=lesson_currency)
+        return calculate_teacher_price(teacher, 60, lesson, 1, self.rates)
+
+    def test_same_currency(self):
+        self.assertEqual(self.get_teacher_price('100', self.UAH, self.UAH), Decimal('100'))
+
+    def test_default_to_teacher_currency(self):
+        # 100 / 1 * 40
+        self.assertEqual(self.get_teacher_price('100', self.DEFAULT, self.UAH), Decimal('4000'))
+
+    def test_non_default_to_teacher_currency(self):
+        # 100 / 0.5 * 40
+        self.assertEqual(self.get_teacher_price('100', self.EUR, self.UAH), Decimal('8000'))
+
+    def test_teacher_currency_to_default(self):
+        # 4000 / 40 * 1
+        self.assertEqual(self.get_teacher_price('4000', self.UAH, self.DEFAULT), Decimal('100'))
+
+    def test_unknown_currency(self):
+        with self.assertRaises(LookupError):
+            self.get_teacher_price('100', self.DEFAULT, 99)
+
+
+def pricing_rule(multiplier: str, min_group_size: int = 1, source: str = '', owner_id: int = None,
+                 duration: int = None) -> dict:
+    return {'source': source, 'owner_id': owner_id, 'duration': duration, 'min_group_size': min_group_size,
+            'multiplier': Decimal(multiplier)}
+
+
+class PricingTableTest(SimpleTestCase):
+    DURATIONS = [30, 45, 60, 90]
+    # Hard-coded group discounts used before pricing rules, the default rules of migration 0007
+    LEGACY_GROUP_DISCOUNT = {1: Decimal('1'), 2: Decimal('0.9'), 3: Decimal('0.85'), 4: Decimal('0.8')}
+
+    def get_multiplier(self, rules: list[dict], source: str, duration: int, group_size: int,
+                       owner_id: int = None) -> Decimal:
+        table = PricingTable(rules, self.DURATIONS)
+        return table.factor(source, duration, group_size, owner_id) * 60 / duration
+
+    def test_default_rules_match_group_discount(self):
+        table = PricingTable([pricing_rule(str(multiplier), group_size)
+                              for group_size, multiplier in self.LEGACY_GROUP_DISCOUNT.items()], self.DURATIONS)
+        for rate in (Decimal('200'), Decimal('250'), Decimal('333.33')):
+            for duration in self.DURATIONS:
+                for group_size in range(1, 7):
+                    with self.subTest(rate=rate, duration=duration, group_size=group_size):
+                        discount = self.LEGACY_GROUP_DISCOUNT[min(group_size, 4)]
+                        legacy = round(rate * Decimal(duration) / 60 * discount, 2)
+                        self.assertEqual(table.price(rate, duration, group_size), legacy)
+
+    def test_most_specific_rule_wins(self):
+        rules = [
+            pricing_rule('0.9', 2),
+            pricing_rule('0.95', 2, source='student'),
+            pricing_rule('0.8', 3, source='student'),
+            pricing_rule('0.7', 2, source='student', duration=90),
+        ]
+        cases = [
+            # rate source before any source
+            (('student', 60, 2), Decimal('0.95')),
+            (('company', 60, 2), Decimal('0.9')),
+            # largest min group size of the rules for the duration
+            (('student', 60, 3), Decimal('0.8')),
+            # duration before min group size
+            (('student', 90, 3), Decimal('0.7')),
+            # no rule for one student
+            (('student', 60, 1), Decimal('1')),
+        ]
+        for args, multiplier in cases:
+            with self.subTest(args=args):
+                self.assertEqual(self.get_multiplier(rules, *args), multiplier)
+
+    def test_owner_override(self):
+        rules = [
+            pricing_rule('0.9', 2),
+            pricing_rule('1', 1, source='teacher', owner_id=7),
+            pricing_rule('0.5', 4, source='company', owner_id=7),
+        ]
+        self.assertEqual(self.get_multiplier(rules, 'teacher', 60, 2, owner_id=7), Decimal('1'))
+        self.assertEqual(self.get_multiplier(rules, 'teacher', 60, 2, owner_id=8), Decimal('0.9'))
+        # Company 7 override starts at 4 students, same id as teacher 7
+        self.assertEqual(self.get_multiplier(rules, 'company', 60, 2, owner_id=7), Decimal('0.9'))
+        self.assertEqual(self.get_multiplier(rules, 'company', 60, 4, owner_id=7), Decimal('0.5'))
+
+    def test_group_size_capped_at_largest_rule(self):
+        table = PricingTable([pricing_rule('0.9', 2), pricing_rule('0.8', 4)], self.DURATIONS)
+
+        self.assertEqual(table.max_group_size, 4)
+        self.assertEqual(table.price(Decimal(100), 60, 12), Decimal('80.00'))
+        self.assertEqual(table.price_many([(Decimal(100), 60, 12), (Decimal(100), 45, 3)]),
+                         [Decimal('80.00'), Decimal('67.50')])
+
+    def test_duration_added_after_compiling(self):
+        table = PricingTable([pricing_rule('0.9', 2)], self.DURATIONS)
+
+        self.assertEqual(table.price(Decimal(100), 120, 2), Decimal('180.00'))
+
+
+class DefaultPricingRulesTest(TestCase):
+
+    def test_default_rules_are_group_discount(self):
+        rules = load_pricing_rules()
+
+        self.assertEqual({rule['min_group_size']: rule['multiplier'] for rule in rules},
+                         PricingTableTest.LEGACY_GROUP_DISCOUNT)
+        self.assertTrue(all(rule['source'] == '' and rule['owner_id'] is None and rule['duration'] is None
+                            for rule in rules))
+
+
+class KeysetCursorTest(SimpleTestCase):
+    """
+    Cursors come from the query string, a tampered one gives the first page instead of an error
+    """
+
+    def get_page(self, cursor: list):
+        cursor = urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        request = RequestFactory().get('/', {'cursor': cursor})
+        return get_keyset_paginator(Lesson.objects.none(), 20, request, ordering=('-date', '-id'))
+
+    def test_tampered_cursor_gives_first_page(self):
+        for cursor in (['next', ['x', 1]], ['next', [None, 1]], ['prev', [[1], {}]], ['next', ['2026-01-01', 'y']],
+                       ['next', ['2026-01-01']]):
+            with self.subTest(cursor=cursor):
+                page = self.get_page(cursor)
+                self.assertFalse(page.has_previous)
+                self.assertEqual(len(page), 0)
+
+    def test_valid_cursor(self):
+        page = self.get_page(['prev', ['2026-01-01', 1]])
+        self.assertTrue(page.has_next)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SchoolViewTestCase(QueryBudgetMixin, TestCase):
+    """
+    A small seeded school, by default 3 teachers, 30 students and 300 lessons over the last 2 months.
+    Caches are cleared before every test, so the budgets hold for a cold cache.
+    """
+    seed_options = {'teachers': 3, 'students': 30, 'companies': 3, 'lessons': 300, 'months': 2}
+
+    @classmethod
+    def setUpTestData(cls):
+        SiteInfo.objects.create(title='LMS', logo_icon='static/img/logo-icon.png', logo_text='static/img/logo-text.png',
+                                logo_full='static/img/logo-full.png')
+        call_command('seed_school', **cls.seed_options, stdout=StringIO())
+        cls.teacher = (Teacher.objects.select_related('user').annotate(students_count=Count('teacher'))
+                       .order_by('-students_count', 'pk').first())
+        cls.student = Student.objects.select_related('user').filter(teacher=cls.teacher).order_by('pk').first()
+        cls.lesson = Lesson.objects.filter(teacher=cls.teacher, students=cls.student).order_by('-date').first()
+
+    def setUp(self):
+        self.clear_caches()
+        # URLs are reversed with a language prefix from LANGUAGES (i18n_patterns)
+        translation.activate(settings.LANGUAGES[0][0])
+        self.addCleanup(translation.deactivate)
+
+    def clear_caches(self):
+        cache.clear()
+        clear_local_cache()
+
+
+class SchoolViewQueryBudgetTest(SchoolViewTestCase):
+
+    def test_schedule(self):
+        self.client.force_login(self.teacher.user)
+        response = self.assertWithinQueryBudget('school:cabinet-schedule', kwargs={'pk': self.teacher.user.pk},
+                                                data={'date': self.lesson.date.isoformat()})
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_lessons(self):
+        for user in (self.teacher.user, self.student.user):
+            with self.subTest(role=user.school_role):
+                self.client.force_login(user)
+                response = self.assertWithinQueryBudget('school:profile-lessons', kwargs={'pk': user.pk})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context['lessons'])
+
+    def test_profile_payments(self):
+        for user in (self.teacher.user, self.student.user):
+            with self.subTest(role=user.school_role):
+                self.client.force_login(user)
+                response = self.assertWithinQueryBudget('school:profile-payments', kwargs={'pk': user.pk})
+                self.assertEqual(response.status_code, 200)
+
+    def test_students(self):
+        self.client.force_login(self.teacher.user)
+        response = self.assertWithinQueryBudget('school:cabinet-students', kwargs={'pk': self.teacher.user.pk})
+        self.assertEqual(response.status_code, 200)
+        students = list(response.context['students'])
+        self.assertTrue(students)
+        self.assertTrue(all(student.teacher_id == self.teacher.pk for student in students))
+
+    def test_lesson_view(self):
+        for user in (self.teacher.user, self.student.user):
+            with self.subTest(role=user.school_role):
+                self.client.force_login(user)
+                response = self.assertWithinQueryBudget('school:lesson-view', kwargs={'pk': self.lesson.pk})
+                self.assertEqual(response.status_code, 200)
+
+
+class QueryBudgetsTest(SchoolViewTestCase):
+    """
+    Every school view with a budget in settings.QUERY_BUDGETS stays within it.
+    A new budget needs a request in get_requests().
+    """
+
+    def get_requests(self) -> dict:
+        """
+        {view name: (user, url kwargs, method, data)}
+        """
+        teacher, student, lesson = self.teacher.user, self.student.user, self.lesson
+        planned = Lesson.objects.filter(teacher=self.teacher, status='planned').exclude(pk=lesson.pk).first()
+        finished = Lesson.objects.filter(teacher=self.teacher, status='conducted').exclude(pk=lesson.pk).first()
+        progress = StudentProgress.objects.create(title='Unit 1', student=self.student, teacher=self.teacher)
+        admin = User.objects.get(username='seed_admin')
+        move = {'date': lesson.date.isoformat(), 'time': '23:15'}
+
+        return {
+            'school:cabinet-schedule': (teacher, {'pk': teacher.pk}, 'get', {'date': lesson.date.isoformat()}),
+            'school:cabinet-students': (teacher, {'pk': teacher.pk}, 'get', None),
+            'school:cabinet-statistics': (teacher, {'pk': teacher.pk}, 'get', None),
+            'school:lesson-add': (teacher, {'pk': teacher.pk}, 'get', None),
+            'school:lesson-view': (student, {'pk': lesson.pk}, 'get', None),
+            'school:lesson-edit': (teacher, {'pk': lesson.pk}, 'get', None),
+            'school:lesson-move': (teacher, {'pk': planned.pk}, 'post', move),
+            'school:lesson-conducted': (teacher, {'pk': planned.pk}, 'post', None),
+            'school:lesson-missed': (teacher, {'pk': planned.pk}, 'post', None),
+            'school:lesson-planned': (teacher, {'pk': finished.pk}, 'post', None),
+            'school:lesson-delete': (teacher, {'pk': planned.pk}, 'post', None),
+            'school:profile-lessons': (student, {'pk': student.pk}, 'get', None),
+            'school:profile-progress': (student, {'pk': student.pk}, 'get', None),
+            'school:progress-delete': (teacher, {'pk': self.student.pk, 'pk2': progress.pk}, 'post', None),
+            'school:profile-payments': (student, {'pk': student.pk}, 'get', None),
+            'school:profile-settings': (student, {'pk': student.pk}, 'get', None),
+            'school:analytic-teachers': (admin, None, 'get', None),
+            'school:analytic-companies': (admin, None, 'get', None),
+            'school:api-schedule': (teacher, {'pk': teacher.pk}, 'get', {'date': lesson.date.isoformat()}),
+            'school:api-calendar': (teacher, {'pk': teacher.pk}, 'get', None),
+            'school:api-lesson-status': (teacher, {'pk': planned.pk}, 'post', {'status': 'conducted'}),
+            'school:api-lesson-move': (teacher, {'pk': planned.pk}, 'post', move),
+        }
+
+    def test_school_views_within_budget(self):
+        requests = self.get_requests()
+        view_names = [view_name for view_name in settings.QUERY_BUDGETS if view_name.startswith('school:')]
+        self.assertTrue(view_names)
+
+        for view_name in view_names:
+            with self.subTest(view_name=view_name):
+                self.assertIn(view_name, requests, f'No request for {view_name} in get_requests()')
+                user, kwargs, method, data = requests[view_name]
+                self.clear_caches()
+                self.client.force_login(user)
+                # Every view runs on the same data, changes are rolled back
+                with transaction.atomic():
+                    response = self.assertWithinQueryBudget(view_name, kwargs, method, data)
+                    transaction.set_rollback(True)
+                self.assertLess(response.status_code, 400)
+
+
+class AccountSummaryTest(SchoolViewTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.yesterday = date.today() - timedelta(days=1)
+        StudentAccountSummary.objects.filter(student=self.student).update(counted_on=self.yesterday, balance=-1)
+
+    def test_profile_reads_summary_as_stored(self):
+        self.client.force_login(self.student.user)
+
+        response = self.client.get(reverse('school:profile-lessons', kwargs={'pk': self.student.user.pk}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['account_summary'].balance, -1)
+        summary = StudentAccountSummary.objects.get(student=self.student)
+        self.assertEqual((summary.counted_on, summary.balance), (self.yesterday, -1))
+
+    def test_profile_counts_time_left_without_summary(self):
+        StudentAccountSummary.objects.filter(student=self.student).delete()
+        Student.objects.filter(pk=self.student.pk).update(wallet=500, rate=200)
+        self.client.force_login(self.student.user)
+
+        response = self.client.get(reverse('school:profile-lessons', kwargs={'pk': self.student.user.pk}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['account_summary'])
+        self.assertEqual(response.context['lessons_left'], '2 hour(s) 30 minutes')
+        self.assertFalse(StudentAccountSummary.objects.filter(student=self.student).exists())
+
+    def test_student_save_does_not_recount(self):
+        self.student.save()
+
+        self.assertEqual(StudentAccountSummary.objects.get(student=self.student).counted_on, self.yesterday)
+
+    def test_low_balance_report_recounts_stale_summaries(self):
+        StudentAccountSummary.objects.exclude(student=self.student).delete()
+
+        call_command('low_balance_report', stdout=StringIO())
+
+        summaries = StudentAccountSummary.objects.all()
+        self.assertEqual(summaries.count(), Student.objects.count())
+        self.assertFalse(summaries.filter(counted_on__lt=date.today()).exists())
+        self.assertEqual(summaries.get(student=self.student).balance, Student.objects.get(pk=self.student.pk).wallet)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ConcurrentSettlementTest(TransactionTestCase):
+    """
+    An admin batch and a teacher settling the same lesson at the same time charge the wallets once
+    """
+
+    def setUp(self):
+        cache.clear()
+        clear_local_cache()
+        call_command('seed_school', teachers=1, students=3, companies=0, lessons=5, months=1, stdout=StringIO())
+        self.lesson = Lesson.objects.filter(status='planned', students__isnull=False).order_by('pk').first()
+
+    def test_admin_batch_waits_for_teacher(self):
+        locked, release, results = threading.Event(), threading.Event(), []
+
+        def teacher_click():
+            try:
+                # The lesson row stays locked until the outer transaction commits
+                with transaction.atomic():
+                    results.append(lesson_finished(self.lesson.teacher, self.lesson.pk, 'conducted'))
+                    locked.set()
+                    release.wait(5)
+            finally:
+                locked.set()
+                connection.close()
+
+        def admin_action():
+            try:
+                results.append(lessons_finished(Lesson.objects.filter(pk=self.lesson.pk), 'conducted'))
+            finally:
+                connection.close()
+
+        teacher = threading.Thread(target=teacher_click)
+        admin = threading.Thread(target=admin_action)
+        teacher.start()
+        locked.wait(5)
+        admin.start()
+        # Give the batch time to reach the lock
+        admin.join(0.5)
+        release.set()
+        teacher.join()
+        admin.join()
+
+        self.assertEqual(len(results), 2)
+        self.assertIs(results[0], True)
+        updated, failures = results[1]
+        self.assertEqual(updated, 0)
+        self.assertEqual([lesson.pk for lesson in failures], [self.lesson.pk])
+        self.assertEqual(TeacherPayment.objects.filter(lesson=self.lesson).count(), 1)
+        self.assertEqual(StudentPayment.objects.filter(lesson=self.lesson).count(), self.lesson.students.count())
+
+
+class DoubleBookingTest(SchoolViewTestCase):
+    """
+    Lessons are [start, end) periods, a lesson can't overlap another lesson of its teacher or students
+    """
+    day = date(2030, 1, 7)
+
+    def setUp(self):
+        super().setUp()
+        self.duration = Duration.objects.get(time=60)
+        self.other_teacher = Teacher.objects.exclude(pk=self.teacher.pk).order_by('pk').first()
+        self.other_student = Student.objects.filter(teacher=self.teacher).exclude(pk=self.student.pk).first()
+        self.lesson = self.create_lesson(self.teacher, self.student, '10:00')
+
+    def create_lesson(self, teacher, student, start):
+        lesson = Lesson.objects.create(date=self.day, time=time.fromisoformat(start), duration=self.duration,
+                                       teacher=teacher, theme='Booked')
+        lesson.students.set([student])
+        return lesson
+
+    def get_form(self, student, start, instance=None):
+        return LessonForm(self.teacher, {
+            'date': self.day, 'time': start, 'duration': self.duration.pk, 'students': [student.pk],
+            'teacher': self.teacher.pk, 'theme': 'New',
+        }, instance=instance)
+
+    def assertConflict(self, form):
+        self.assertFalse(form.is_valid())
+        self.assertTrue(form.has_error('__all__', 'lesson_conflict'))
+
+    def test_teacher_overlap(self):
+        self.assertConflict(self.get_form(self.other_student, '10:30'))
+
+    def test_student_overlap(self):
+        self.lesson.delete()
+        self.create_lesson(self.other_teacher, self.student, '10:30')
+
+        self.assertConflict(self.get_form(self.student, '10:00'))
+
+    def test_edited_lesson_is_not_a_conflict(self):
+        form = self.get_form(self.student, '10:30', instance=self.lesson)
+
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_adjacent_lessons_are_not_a_conflict(self):
+        for start in ('09:00', '11:00'):
+            with self.subTest(start=start):
+                self.assertTrue(self.get_form(self.other_student, start).is_valid())
+
+    def test_teacher_locked_while_checking(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.get_form(self.other_student, '11:00').is_valid())
+
+        teacher_table = Teacher._meta.db_table
+        self.assertTrue(any(teacher_table in query['sql'] and 'FOR UPDATE' in query['sql']
+                            for query in queries.captured_queries))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AnalyticsDataTest(TestCase):
+    """
+    Payments grouped by (students, duration) for the analytics and statistics pages
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        clear_local_cache()
+        cls.teacher = Teacher.objects.create(user=User.objects.create_user('teacher', school_role='teacher'))
+        anna, bob, cara = [
+            Student.objects.create(user=User.objects.create_user(username, first_name=first_name,
+                                                                 last_name=last_name, school_role='student'))
+            for username, first_name, last_name in (('anna', 'Anna', 'Adams'), ('bob', 'Bob', 'Brown'),
+                                                    ('cara', 'Cara', 'Clark'))
+        ]
+        durations = {minutes: Duration.objects.get_or_create(time=minutes)[0] for minutes in (45, 60)}
+
+        # Students are added one by one: the names keep the order they were added in, not the id order
+        for day, minutes, students in ((1, 60, [bob, anna]), (2, 45, [cara]), (3, 60, [bob, anna]),
+                                       (4, 60, [cara]), (5, 60, [anna])):
+            lesson = Lesson.objects.create(date=date(2026, 3, day), time=time(10), duration=durations[minutes],
+                                           teacher=cls.teacher, theme='Lesson')
+            for student in students:
+                lesson.students.add(student)
+            TeacherPayment.objects.create(teacher=cls.teacher, lesson=lesson, price=Decimal(100),
+                                          created_at=lesson.date)
+
+    def test_grouped_by_students_and_duration(self):
+        result = sort_data_for_analytics(TeacherPayment.objects.filter(teacher=self.teacher))
+
+        self.assertEqual(result, [
+            {'students': 'Bob Brown, Anna Adams', 'duration': 60, 'count': 2},
+            {'students': 'Cara Clark', 'duration': 45, 'count': 1},
+            {'students': 'Cara Clark', 'duration': 60, 'count': 1},
+            {'students': 'Anna Adams', 'duration': 60, 'count': 1},
+        ])
+
+
+class StudentsViewTest(SchoolViewTestCase):
+
+    def test_teacher_without_profile_sees_no_students(self):
+        Student.objects.filter(pk=self.student.pk).update(teacher=None)
+        user = User.objects.create_user('no_profile_teacher', password='test', school_role='teacher')
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('school:cabinet-students', kwargs={'pk': user.pk}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['students']), 0)
+
+
+class AdminChangelistQueryTest(SchoolViewTestCase):
+    """
+    Changelists load their relations up front: the number of queries doesn't depend on the rows on the page
+    """
+    seed_options = {'teachers': 100, 'students': 100, 'companies': 5, 'lessons': 100, 'months': 1}
+    changelists = {
+        # session, user, 2 counts, lessons with students, teacher and currency, site info
+        'admin:school_lesson_changelist': 6,
+        # + languages and companies for the filters, the languages of the page
+        'admin:school_student_changelist': 9,
+        # + languages for the filter and of the page
+        'admin:school_teacher_changelist': 8,
+    }
+
+    def test_changelists(self):
+        self.client.force_login(User.objects.get(username='seed_admin'))
+        for view_name, queries in self.changelists.items():
+            with self.subTest(view_name=view_name):
+                self.clear_caches()
+                url = reverse(view_name)
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['cl'].result_list), 100)
+
+
+class LessonsFinishedTest(SchoolViewTestCase):
+
+    def test_unrated_currency_fails_only_its_lesson(self):
+        unrated = Currency.objects.create(name='XXX', exchange=1)
+        rates = get_rate_snapshot()
+        rates = rates._replace(rates=MappingProxyType({pk: rate for pk, rate in rates.rates.items()
+                                                      if pk != unrated.pk}))
+        planned = Lesson.objects.filter(status='planned', students__isnull=False).order_by('pk')
+        unrated_lesson = planned.filter(teacher=self.teacher).first()
+        lesson = planned.exclude(teacher=self.teacher).first()
+        Teacher.objects.filter(pk=self.teacher.pk).update(rate=0, currency=unrated)
+
+        with mock.patch('school.services.get_rate_snapshot', return_value=rates):
+            updated, failures = lessons_finished(Lesson.objects.filter(pk__in=[unrated_lesson.pk, lesson.pk]),
+                                                 'conducted')
+
+        self.assertEqual(updated, 1)
+        self.assertEqual(list(failures), [unrated_lesson])
+        self.assertIn('No exchange rate', failures[unrated_lesson])
+        self.assertEqual(Lesson.objects.get(pk=unrated_lesson.pk).status, 'planned')
+        self.assertEqual(Lesson.objects.get(pk=lesson.pk).status, 'conducted')
+        self.assertFalse(TeacherPayment.objects.filter(lesson=unrated_lesson).exists())
+        self.assertTrue(TeacherPayment.objects.filter(lesson=lesson).exists())
+
+    def test_admin_action_reports_updated_lessons(self):
+        lessons = Lesson.objects.filter(teacher=self.teacher, status='planned').order_by('pk')[:2]
+        self.client.force_login(User.objects.get(username='seed_admin'))
+
+        # Changelist filtered by the status the action changes, counting it afterwards gives 0
+        response = self.client.post(reverse('admin:school_lesson_changelist') + '?status__exact=planned', {
+            'action': 'make_conducted',
+            '_selected_action': [lesson.pk for lesson in lessons],
+        }, follow=True)
+
+        messages = [str(message) for message in response.context['messages']]
+        self.assertEqual(messages, ['2 lesson(s) updated'])
@@ -1,4 +1,5 @@
 from django.urls import path
+from .api import ScheduleLessonsApi, ScheduleCalendarApi, LessonStatusApi, LessonMoveApi
 from .views import MainView, LessonAdd, LessonEdit, LessonView, LessonMove, LessonDelete, LessonConducted, LessonMissed, \
     LessonPlanned, StudentsView, ProfileLessons, ProfileSettings, ProfilePayments, ProfileProgressView, \
     ProfileProgressDelete, ScheduleView, TeacherStatistic, AnalyticTeachers, AnalyticCompanies
@@ -29,6 +30,11 @@ urlpatterns = [
 
     path('analytics/teachers/', AnalyticTeachers.as_view(), name='analytic-teachers'),
     path('analytics/companies/', AnalyticCompanies.as_view(), name='analytic-companies'),
+
+    path('api/cabinet/<int:pk>/schedule/', ScheduleLessonsApi.as_view(), name='api-schedule'),
+    path('api/cabinet/<int:pk>/calendar/', ScheduleCalendarApi.as_view(), name='api-calendar'),
+    path('api/lesson/<int:pk>/status/', LessonStatusApi.as_view(), name='api-lesson-status'),
+    path('api/lesson/<int:pk>/move/', LessonMoveApi.as_view(), name='api-lesson-move'),
 ]
 
 
@@ -1,7 +1,6 @@
-import calendar
-
-from django.db.models import Sum
-from django.db.models.functions import TruncMonth
+from django.db import transaction
+from django.db.models import Sum, Value
+from django.db.models.functions import TruncMonth, Coalesce
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
@@ -15,10 +14,12 @@ from .AbstractClasses.UpdateLessonStatusView import UpdateLessonStatusView
 from .models import Student, Teacher, Lesson, StudentProgress
 from .forms import LessonForm, LessonMoveForm, ProgressStageForm, UserChangePassword, UserCombineCommonForm
 from companies.models import Company
-from transactions.models import StudentPayment, TeacherPayment, CompanyPayment
+from lms.routers import replica_reads
+from transactions.models import StudentPayment, TeacherPayment, CompanyPayment, TeacherPaymentSummary
 from .services import user_is_student_or_teacher, user_is_teacher, user_is_staff, \
-    get_paginator, get_teacher, get_duration_list, generate_month_list_for_filter, get_year_list, \
-    sort_data_for_analytics, user_is_lesson_teacher, user_is_student_teacher
+    get_keyset_paginator, get_teacher, get_duration_list, generate_month_list_for_filter, get_activity_years, \
+    sort_data_for_analytics, user_is_lesson_teacher, user_is_student_teacher, get_month_calendar, \
+    get_lesson_calendar, get_month_range, get_year_range
 from django.utils.translation import gettext_lazy as _
 
 
@@ -41,17 +42,14 @@ class ScheduleView(View):
         if request.GET.get('date'):
             current_date = datetime.strptime(request.GET.get('date'), '%Y-%m-%d')
 
-        lessons = Lesson.objects.filter(teacher=current_user, date=current_date).order_by('time')
+        lessons = Lesson.objects.for_schedule().filter(teacher=current_user, date=current_date).order_by('time')
 
         # Lessons Filter as Calendar
         year = int(request.GET.get('year', current_date.year))
         month = int(request.GET.get('month', current_date.month))
 
-        month_calendar = calendar.monthcalendar(year, month)
-
-        lessons_list = Lesson.objects.filter(date__year=year, date__month=month)
-
-        lesson_dates = {lesson.date.day for lesson in lessons_list}
+        month_calendar = get_month_calendar(year, month)
+        lesson_dates = get_lesson_calendar(current_user, year, month)
 
         return render(request, 'school/teacher/index.html',
                       context={
@@ -64,7 +62,7 @@ class ScheduleView(View):
                           'year': year,
                           'month': month,
                           'month_list': generate_month_list_for_filter(),
-                          'year_list': get_year_list(Lesson, 'date'),
+                          'year_list': get_activity_years(Lesson, current_user.pk),
                           'month_calendar': month_calendar,
                           'lesson_dates': lesson_dates,
                       })
@@ -84,6 +82,7 @@ class LessonAdd(View):
                           'form': LessonForm(teacher)
                       })
 
+    @transaction.atomic
     def post(self, request, pk):
         teacher = get_teacher(request)
         form = LessonForm(teacher, request.POST)
@@ -118,6 +117,7 @@ class LessonEdit(View):
                           'lesson': lesson
                       })
 
+    @transaction.atomic
     def post(self, request, pk):
         teacher = get_teacher(request)
         lesson = get_object_or_404(Lesson, pk=pk, teacher=teacher)
@@ -139,7 +139,7 @@ class LessonEdit(View):
 @method_decorator(user_is_student_or_teacher, name='dispatch')
 class LessonView(View):
     def get(self, request, pk):
-        lesson = get_object_or_404(Lesson, pk=pk)
+        lesson = get_object_or_404(Lesson.objects.for_detail(), pk=pk)
         return render(request, 'school/lesson-single.html',
                       context={'lesson': lesson, 'lesson_move_form': LessonMoveForm})
 
@@ -159,15 +159,15 @@ class LessonDelete(View):
 @method_decorator(login_required(login_url='/login/'), name='dispatch')
 @method_decorator(user_is_lesson_teacher, name='dispatch')
 class LessonMove(View):
+    @transaction.atomic
     def post(self, request, pk):
         if request.method == "POST":
-            form = LessonMoveForm(request.POST)
+            lesson = get_object_or_404(Lesson, pk=pk, teacher=get_teacher(request))
+            form = LessonMoveForm(request.POST, instance=lesson)
 
             if form.is_valid():
-                new_date = form.cleaned_data['date']
-                new_time = form.cleaned_data['time']
-                teacher = get_teacher(request)
-                Lesson.objects.filter(pk=pk, teacher=teacher).update(date=new_date, time=new_time)
+                # Signals drop the cached calendar and update the activity years
+                form.save(commit=False).save(update_fields=['date', 'time'])
 
                 return redirect(to='school:cabinet-schedule', pk=request.user.id)
 
@@ -199,25 +199,27 @@ class LessonPlanned(UpdateLessonStatusView):
 @method_decorator(user_is_teacher, name='dispatch')
 class StudentsView(View):
     def get(self, request, pk):
-        students = (Student.objects.filter(teacher__user=request.user, user__is_active=True)
-                    .order_by('company', 'user__first_name', 'user__last_name'))
+        students = (Student.objects.for_list()
+                    .filter(teacher__user=request.user, user__is_active=True)
+                    .annotate(company_name=Coalesce('company__name', Value(''))))
 
         # Start Paginator
         items_per_page = 20
-        students_page, page_range = get_paginator(students, items_per_page, request)
+        students_page = get_keyset_paginator(students, items_per_page, request,
+                                             ordering=('company_name', 'user__first_name', 'user__last_name', 'id'))
         # End Paginator
 
         return render(request, 'school/teacher/students.html',
                       context={
                           'title': _('Students'),
                           'students': students_page,
-                          'page_range': page_range,
                           'current_page': 'students'
                       })
 
 
 @method_decorator(login_required(login_url='/login/'), name='dispatch')
 @method_decorator(user_is_teacher, name='dispatch')
+@method_decorator(replica_reads, name='dispatch')
 class TeacherStatistic(View):
     def get(self, request, pk):
         current_user = get_teacher(request)
@@ -227,10 +229,10 @@ class TeacherStatistic(View):
         half_month_summaries = TeacherPayment.objects.get_half_month_summaries(current_user, current_year)
 
         # =================================================================
-        month_salary = ((TeacherPayment
-                         .objects
-                         .filter(teacher=current_user, created_at__month=current_month, created_at__year=current_year))
-                        .aggregate(total_price=Sum('price')))
+        month_salary = (TeacherPaymentSummary
+                        .objects
+                        .filter(teacher=current_user, month=current_month, year=current_year)
+                        .aggregate(total_price=Sum('total_price')))
 
         teacher_salary = month_salary.get('total_price') if month_salary.get('total_price') is not None else '0.00'
 
@@ -242,12 +244,10 @@ class TeacherStatistic(View):
         if 'year' in request.GET:
             current_year = int(request.GET['year'])
 
-        queryset_lessons = ((TeacherPayment
-                             .objects
-                             .filter(teacher=current_user, created_at__month=current_month,
-                                     created_at__year=current_year))
-                            .values('lesson__id', 'lesson__duration__time')
-                            .order_by('lesson__id'))
+        queryset_lessons = (TeacherPayment
+                            .objects
+                            .filter(teacher=current_user,
+                                    created_at__range=get_month_range(current_year, current_month)))
 
         result = sort_data_for_analytics(queryset_lessons)
 
@@ -261,8 +261,7 @@ class TeacherStatistic(View):
             'current_month': current_month,
             'current_year': current_year,
             'result': result,
-            'available_years': get_year_list(TeacherPayment),
-            'available_years': get_year_list(TeacherPayment),
+            'available_years': get_activity_years(TeacherPayment, current_user.pk),
             'durations': get_duration_list(),
             'month_list': generate_month_list_for_filter()
         })
@@ -273,18 +272,16 @@ class TeacherStatistic(View):
 class ProfileLessons(ProfileBaseView):
     def get(self, request, pk):
         if self.user.school_role == 'student':
-            lessons = Lesson.objects.filter(students=self.current_user).order_by('-date')
+            lessons = Lesson.objects.for_profile_list().filter(students=self.current_user)
         else:
-            lessons = Lesson.objects.filter(teacher=self.current_user).order_by('-date')
-
+            lessons = Lesson.objects.for_profile_list().filter(teacher=self.current_user)
 
         items_per_page = 20
-        lessons_page, page_range = get_paginator(lessons, items_per_page, request)
+        lessons_page = get_keyset_paginator(lessons, items_per_page, request, ordering=('-date', '-id'))
 
         active_page = 'lessons'
 
-        return self.render_page(request, active_page, lessons=lessons_page,
-                                page_range=page_range)
+        return self.render_page(request, active_page, lessons=lessons_page)
 
 
 @method_decorator(login_required(login_url='/login/'), name='dispatch')
@@ -324,15 +321,15 @@ class ProfileProgressDelete(DeleteView):
 class ProfilePayments(ProfileBaseView):
     def get(self, request, pk):
         if self.user.school_role == 'student':
-            payments = StudentPayment.objects.filter(student=self.current_user).order_by('-created_at')
+            payments = StudentPayment.objects.for_profile_list().filter(student=self.current_user)
         else:
-            payments = TeacherPayment.objects.filter(teacher=self.current_user).order_by('-created_at')
+            payments = TeacherPayment.objects.for_profile_list().filter(teacher=self.current_user)
 
-        payments_page, page_range = get_paginator(payments, 20, request)
+        payments_page = get_keyset_paginator(payments, 20, request, ordering=('-created_at', '-id'))
 
         active_page = 'payments'
 
-        return self.render_page(request, active_page, payments=payments_page, page_range=page_range)
+        return self.render_page(request, active_page, payments=payments_page)
 
 
 @method_decorator(login_required(login_url='/login/'), name='dispatch')
@@ -378,9 +375,7 @@ class AnalyticTeachers(BaseAnalyticView):
 
     def get_queryset(self, current_item, current_month, current_year):
         return (self.model.objects
-                .filter(teacher=current_item, created_at__month=current_month, created_at__year=current_year)
-                .values('lesson__id', 'lesson__duration__time')
-                .order_by('lesson__id'))
+                .filter(teacher=current_item, created_at__range=get_month_range(current_year, current_month)))
 
     def get_month_payment(self, current_item, current_year):
         return self.model.objects.get_half_month_summaries(current_item, current_year)
@@ -412,14 +407,12 @@ class AnalyticCompanies(BaseAnalyticView):
 
     def get_queryset(self, current_item, current_month, current_year):
         return (self.model.objects
-                .filter(company=current_item, created_at__month=current_month, created_at__year=current_year,
-                        lesson__isnull=False)
-                .values('lesson__id', 'lesson__duration__time')
-                .order_by('lesson__id'))
+                .filter(company=current_item, created_at__range=get_month_range(current_year, current_month),
+                        lesson__isnull=False))
 
     def get_month_payment(self, current_item, current_year):
         return (self.model.objects
-                .filter(company=current_item, created_at__year=current_year)
+                .filter(company=current_item, created_at__range=get_year_range(current_year))
                 .annotate(month=TruncMonth('created_at'))  # Извлекаем месяц из поля created_at
                 .values('month')  # Группируем по месяцу
                 .annotate(total_price=Sum('price'))  # Суммируем поле price для каждого месяца
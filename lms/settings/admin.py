@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Language, Duration, Currency
+from .models import Language, Duration, Currency, ExchangeRate
 
 
 # Register your models here.
@@ -14,6 +14,14 @@ class CurrencyAdmin(admin.ModelAdmin):
         return super().has_delete_permission(request, obj)
 
 
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ['currency', 'date', 'rate']
+    list_filter = ['currency']
+    list_select_related = ['currency']
+    date_hierarchy = 'date'
+
+
 admin.site.register(Language)
 admin.site.register(Duration)
 admin.site.register(Currency, CurrencyAdmin)
+admin.site.register(ExchangeRate, ExchangeRateAdmin)
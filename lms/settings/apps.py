@@ -6,3 +6,6 @@ class SettingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'settings'
     verbose_name = _('settings')
+
+    def ready(self):
+        import settings.signals
@@ -0,0 +1,174 @@
+from bisect import bisect_right
+from datetime import date
+from decimal import Decimal
+from types import MappingProxyType
+from typing import NamedTuple, Mapping, Iterable
+
+from django.db.models import F, OuterRef, Subquery, Value, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce
+
+from .models import Currency, ExchangeRate
+from lms.cache import get_or_set
+from .services import get_currencies, get_currencies_version, CURRENCIES_NAMESPACE, CURRENCIES_CACHE_TIMEOUT
+
+SNAPSHOTS_LIMIT = 512
+
+# Snapshots memoized by date for the currencies version they were built with
+_local_rates = {'version': None, 'snapshots': {}}
+
+
+class RateSnapshot(NamedTuple):
+    """
+    Exchange rates of all currencies valid on one date. Immutable, safe to share between requests.
+
+    A rate is the number of currency units for one unit of the default (base) currency,
+    so amount / rate converts to the base currency and amount * rate converts back.
+    """
+    date: date
+    base: Currency | None
+    rates: Mapping[int, Decimal]
+
+    def rate(self, currency) -> Decimal:
+        """
+        Rate of the currency (Currency or id), the base rate 1 for None.
+        Raises LookupError for a currency without a rate, converting with 1 would book a wrong amount.
+        """
+        if currency is None:
+            return Decimal(1)
+
+        currency_id = getattr(currency, 'pk', currency)
+        try:
+            return self.rates[currency_id]
+        except KeyError:
+            raise LookupError(f'No exchange rate for currency {currency_id} on {self.date}') from None
+
+    def to_base(self, amount: Decimal, currency) -> Decimal:
+        return amount / self.rate(currency)
+
+    def from_base(self, amount: Decimal, currency) -> Decimal:
+        return amount * self.rate(currency)
+
+    def convert(self, amount: Decimal, from_currency, to_currency=None) -> Decimal:
+        """
+        Convert amount between currencies (Currency or id), to the base currency if to_currency is None
+        """
+        from_rate = self.rate(from_currency)
+        to_rate = self.rate(to_currency) if to_currency is not None else Decimal(1)
+        if from_rate == to_rate:
+            return amount
+        return amount / from_rate * to_rate
+
+
+def load_rate_history() -> dict[int, tuple[list[date], list[Decimal]]]:
+    history = {}
+    for currency_id, day, rate in ExchangeRate.objects.order_by('currency', 'date').values_list(
+            'currency_id', 'date', 'rate'):
+        dates, rates = history.setdefault(currency_id, ([], []))
+        dates.append(day)
+        rates.append(rate)
+    return history
+
+
+def get_rate_history() -> dict[int, tuple[list[date], list[Decimal]]]:
+    """
+    Rate snapshots of every currency sorted by date, from the process memory or the shared cache
+
+    Returns
+    -------
+        dict: {currency_id: ([dates], [rates])}
+    """
+    return get_or_set(CURRENCIES_NAMESPACE, 'rate-history', load_rate_history, CURRENCIES_CACHE_TIMEOUT)
+
+
+def get_rate_snapshot(on_date: date = None) -> RateSnapshot:
+    """
+    Exchange rates valid on the date (today by default).
+    Currencies without a snapshot on that date use their current exchange rate.
+
+    Returns
+    -------
+        RateSnapshot
+    """
+    on_date = on_date or date.today()
+
+    version = get_currencies_version()
+    if _local_rates['version'] != version:
+        _local_rates['version'] = version
+        _local_rates['snapshots'] = {}
+
+    snapshot = _local_rates['snapshots'].get(on_date)
+    if snapshot is not None:
+        return snapshot
+
+    history = get_rate_history()
+    currencies = get_currencies()
+    rates = {}
+    for currency_id, currency in currencies.items():
+        dates, currency_rates = history.get(currency_id, ((), ()))
+        index = bisect_right(dates, on_date)
+        rates[currency_id] = currency_rates[index - 1] if index else currency.exchange
+
+    base = next((currency for currency in currencies.values() if currency.default), None)
+    snapshot = RateSnapshot(on_date, base, MappingProxyType(rates))
+
+    if len(_local_rates['snapshots']) >= SNAPSHOTS_LIMIT:
+        _local_rates['snapshots'].clear()
+    _local_rates['snapshots'][on_date] = snapshot
+    return snapshot
+
+
+def convert_amounts(amounts: Iterable, to_currency=None, on_date: date = None) -> list[Decimal]:
+    """
+    Convert many amounts in one pass, snapshots are looked up once per date
+
+    Parameters
+    ----------
+        amounts - iterable of (amount, currency) or (amount, currency, date) tuples,
+                  e.g. queryset.values_list('price', 'teacher__currency', 'created_at')
+        to_currency - target currency (Currency or id), the base currency if None
+        on_date - rates date for items without their own date, today by default
+
+    Returns
+    -------
+        list: converted amounts in the input order
+    """
+    snapshots = {}
+    converted = []
+    for amount, currency, *item_date in amounts:
+        day = item_date[0] if item_date and item_date[0] else on_date
+        snapshot = snapshots.get(day)
+        if snapshot is None:
+            snapshot = snapshots[day] = get_rate_snapshot(day)
+        converted.append(snapshot.convert(amount, currency, to_currency))
+    return converted
+
+
+def annotate_base_amount(queryset, amount: str = 'price', currency: str = 'currency', date_field: str = None,
+                         name: str = 'base_amount'):
+    """
+    Annotate queryset with the amount converted to the base currency in the database.
+
+    The rate is the latest ExchangeRate of the row currency on the row date (correlated subquery on the
+    (currency, date) unique index), falling back to the current Currency.exchange. Rows without currency
+    are taken as base currency amounts. Sum() over the annotation gives a cross-currency total in one query.
+
+    Parameters
+    ----------
+        queryset - QuerySet to annotate
+        amount - amount field
+        currency - currency ForeignKey path, e.g. 'teacher__currency'
+        date_field - date field for the rate, today if None
+        name - annotation name
+
+    Returns
+    -------
+        QuerySet
+    """
+    rates = ExchangeRate.objects.filter(currency=OuterRef(currency))
+    rates = rates.filter(date__lte=OuterRef(date_field)) if date_field else rates.filter(date__lte=date.today())
+    rate = Subquery(rates.order_by('-date').values('rate')[:1])
+
+    return queryset.annotate(**{name: ExpressionWrapper(
+        F(amount) / Coalesce(rate, F(f'{currency}__exchange'), Value(Decimal(1))),
+        output_field=DecimalField(max_digits=20, decimal_places=5),
+    )})
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:00
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Rates known at migration time are used for all earlier amounts
+INITIAL_RATES_DATE = datetime.date(1970, 1, 1)
+
+
+def create_initial_rates(apps, schema_editor):
+    Currency = apps.get_model('settings', 'Currency')
+    ExchangeRate = apps.get_model('settings', 'ExchangeRate')
+    ExchangeRate.objects.bulk_create([
+        ExchangeRate(currency_id=currency_id, date=INITIAL_RATES_DATE, rate=exchange)
+        for currency_id, exchange in Currency.objects.values_list('id', 'exchange')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settings', '0002_alter_currency_options_alter_duration_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('rate', models.DecimalField(decimal_places=5, max_digits=10, verbose_name='exchange')),
+                ('currency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rates', to='settings.currency', verbose_name='currency')),
+            ],
+            options={
+                'verbose_name': 'Exchange Rate',
+                'verbose_name_plural': 'Exchange Rates',
+                'constraints': [models.UniqueConstraint(fields=('currency', 'date'), name='unique_currency_rate_date')],
+            },
+        ),
+        migrations.RunPython(create_initial_rates, migrations.RunPython.noop),
+    ]
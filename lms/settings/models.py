@@ -37,3 +37,23 @@ class Currency(models.Model):
     class Meta:
         verbose_name = _('Currency')
         verbose_name_plural = _('Currencies')
+
+
+class ExchangeRate(models.Model):
+    """
+    Dated snapshot of a currency exchange rate (units of the currency for one unit of the default currency).
+    A rate is valid from its date until the next snapshot of the currency.
+    """
+    currency = models.ForeignKey(Currency, on_delete=models.CASCADE, related_name='rates', verbose_name=_('currency'))
+    date = models.DateField(verbose_name=_('date'))
+    rate = models.DecimalField(max_digits=10, decimal_places=5, verbose_name=_('exchange'))
+
+    def __str__(self):
+        return f"{self.currency} {self.date:%d.%m.%Y}: {self.rate}"
+
+    class Meta:
+        verbose_name = _('Exchange Rate')
+        verbose_name_plural = _('Exchange Rates')
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_currency_rate_date'),
+        ]
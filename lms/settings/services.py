@@ -0,0 +1,72 @@
+from lms.cache import get_or_set, get_version, bump_version
+from .models import Currency, Duration, Language
+
+CURRENCIES_NAMESPACE = 'currencies'
+CURRENCIES_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_currencies_version() -> int:
+    """
+    Shared version of the cached currencies and exchange rates, bumped by clear_currencies_cache()
+    """
+    return get_version(CURRENCIES_NAMESPACE)
+
+
+def get_currencies() -> dict[int, Currency]:
+    """
+    All currencies (with exchange rates) keyed by id.
+
+    Looked up in the process memory first, then in the shared cache,
+    the database is queried only after invalidation.
+
+    Returns
+    -------
+        dict: {pk: Currency}
+    """
+    return get_or_set(CURRENCIES_NAMESPACE, 'all',
+                      lambda: {currency.pk: currency for currency in Currency.objects.all()},
+                      CURRENCIES_CACHE_TIMEOUT)
+
+
+def get_currency(pk) -> Currency | None:
+    """
+    Currency by id from the cached registry
+    """
+    if pk is None:
+        return None
+    return get_currencies().get(pk)
+
+
+def get_default_currency() -> Currency | None:
+    """
+    System default currency from the cached registry
+    """
+    return next((currency for currency in get_currencies().values() if currency.default), None)
+
+
+def clear_currencies_cache():
+    """
+    Invalidate cached currencies in every process by bumping the shared version
+    """
+    bump_version(CURRENCIES_NAMESPACE)
+
+
+def get_durations() -> list[Duration]:
+    """
+    Lesson durations ordered by time, from the cache
+    """
+    return get_or_set('durations', 'all', lambda: list(Duration.objects.order_by('time')))
+
+
+def get_duration_minutes(duration_id) -> int | None:
+    """
+    Length of the duration in minutes, from the cached durations
+    """
+    return next((duration.time for duration in get_durations() if duration.pk == duration_id), None)
+
+
+def get_language_choices() -> list[tuple[int, str]]:
+    """
+    (id, name) of all languages, from the cache
+    """
+    return get_or_set('languages', 'choices', lambda: list(Language.objects.values_list('id', 'name')))
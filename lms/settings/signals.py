@@ -0,0 +1,47 @@
+from datetime import date
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from lms.cache import bump_version
+from .models import Currency, ExchangeRate, Duration, Language
+from .services import clear_currencies_cache
+
+
+@receiver(post_save, sender=Currency)
+def record_exchange_rate(sender, instance, **kwargs):
+    """
+    Keep a dated snapshot of the rate, so amounts of earlier dates are still converted with the old rate.
+    """
+    latest = instance.rates.order_by('-date').values_list('rate', flat=True).first()
+    if latest != instance.exchange:
+        ExchangeRate.objects.update_or_create(currency=instance, date=date.today(),
+                                              defaults={'rate': instance.exchange})
+
+
+@receiver(post_save, sender=Currency)
+@receiver(post_delete, sender=Currency)
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def invalidate_currencies(sender, **kwargs):
+    """
+    Drop cached currencies and exchange rates when a currency or its exchange rate changes.
+    """
+    clear_currencies_cache()
+
+
+@receiver(post_save, sender=Duration)
+@receiver(post_delete, sender=Duration)
+def invalidate_durations(sender, **kwargs):
+    """
+    Drop cached lesson durations.
+    """
+    bump_version('durations')
+
+
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+def invalidate_languages(sender, **kwargs):
+    """
+    Drop cached language choices.
+    """
+    bump_version('languages')
@@ -0,0 +1,59 @@
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.utils import get_model_from_relation
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    Relation list filter with an autocomplete select instead of the list of all related objects.
+
+    Options are loaded by the admin autocomplete view, so the admin of the related model must define
+    search_fields. Only the selected object is loaded when the changelist is rendered.
+    Model admins using it need AutocompleteFilterMixin for the widget media.
+
+    Usage: list_filter = [('students', AutocompleteFilter)]
+    """
+    template = 'siteapp/admin/autocomplete-filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+        other_model = get_model_from_relation(field)
+        self.title = getattr(field, 'verbose_name', other_model._meta.verbose_name)
+        self.lookup_val = (self.used_parameters.get(self.lookup_kwarg) or [None])[-1]
+        self.form_field = forms.ModelChoiceField(
+            queryset=other_model._default_manager.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site, attrs={'data-width': '100%'}),
+            required=False,
+        )
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': _('All'),
+        }
+
+    @cached_property
+    def rendered_widget(self):
+        return self.form_field.widget.render(self.lookup_kwarg, self.lookup_val,
+                                             attrs={'id': f'id_filter_{self.lookup_kwarg}'})
+
+
+class AutocompleteFilterMixin:
+    """
+    Adds select2 and the filter script to the model admin media for AutocompleteFilter
+    """
+
+    @property
+    def media(self):
+        return (super().media
+                + AutocompleteSelect(None, self.admin_site).media
+                + forms.Media(js=['admin/js/jquery.init.js', 'js/admin-autocomplete-filter.js']))
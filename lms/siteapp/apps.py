@@ -6,3 +6,6 @@ class SiteappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'siteapp'
     verbose_name = _('site')
+
+    def ready(self):
+        import siteapp.signals
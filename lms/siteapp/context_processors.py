@@ -1,13 +1,10 @@
-from django.core.cache import cache
+from lms.cache import get_or_set
 from .models import SiteInfo
 
 
 def site_info(request):
 
-    settings = cache.get('site_settings')
-    if not settings:
-        settings = SiteInfo.objects.first()
-        cache.set('site_settings', settings, 60 * 60)
+    settings = get_or_set('site', 'info', SiteInfo.objects.first)
 
     return {
         'site_title': settings.title,
@@ -0,0 +1,97 @@
+import re
+from hashlib import sha1
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag, parse_etags
+from django.utils.translation import get_language
+
+from lms.cache import get_version, bump_version, cache_get, cache_set
+
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+# Value of the {% csrf_token %} inputs. The token belongs to the visitor, it is cached as a placeholder
+# and filled with the token of the current request on every hit
+CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = b'__csrf_token__'
+
+
+def clear_response_cache(*namespaces):
+    """
+    Invalidate cached responses of the namespaces (all keys and languages) by bumping their version
+    """
+    bump_version(*namespaces)
+
+
+def get_user_variant(request) -> str:
+    """
+    Part of the key for the user specific parts of the base template (header, sidebar):
+    the session and the user fields shown in the header, so a new login or a renamed user gets a new response
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return 'anonymous'
+
+    session_key = request.session.session_key or ''
+    header = f'{session_key}:{user.pk}:{user.first_name}:{user.last_name}:{user.school_role}:' \
+             f'{user.is_staff}:{user.is_superuser}'
+    return sha1(header.encode()).hexdigest()[:16]
+
+
+class CachedResponseMixin:
+    """
+    Full response cache of a rarely changing view, per language and user variant.
+
+    The cache version of `cache_namespace` is bumped by post_save/post_delete signals of the models
+    the view shows, so a repeat request is served from the cache and a request with a matching
+    If-None-Match gets 304, both without queries or template rendering.
+    """
+    cache_namespace = None
+    cache_timeout = RESPONSE_CACHE_TIMEOUT
+
+    def get_cache_key_parts(self, request, *args, **kwargs) -> list:
+        """
+        Values the response depends on besides the language and the user, e.g. slug or category
+        """
+        return [*args, *kwargs.values(), request.GET.urlencode()]
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        version = get_version(self.cache_namespace)
+        parts = [get_language(), *self.get_cache_key_parts(request, *args, **kwargs), get_user_variant(request)]
+        key = sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+        cache_key = f'response:{key}'
+        etag = quote_etag(f'{self.cache_namespace}-{version}-{key[:20]}')
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return self.patch_response(HttpResponseNotModified(), etag)
+
+        # Bodies are per user, they are kept in the shared tier only
+        cached = cache_get(self.cache_namespace, cache_key, local=False)
+        if cached is not None:
+            content, content_type = cached
+            if CSRF_PLACEHOLDER in content:
+                # get_token() also makes CsrfViewMiddleware set the CSRF cookie of this visitor
+                content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+            return self.patch_response(HttpResponse(content, content_type=content_type), etag)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200 or response.streaming:
+            return response
+
+        if hasattr(response, 'render'):
+            response.render()
+        # Only the body is cached, without the CSRF token: anonymous visitors share one variant
+        content = CSRF_INPUT_RE.sub(rb'\g<1>' + CSRF_PLACEHOLDER + rb'\g<2>', response.content)
+        cache_set(self.cache_namespace, cache_key, (content, response['Content-Type']), self.cache_timeout,
+                  local=False)
+        return self.patch_response(response, etag)
+
+    def patch_response(self, response, etag):
+        response.headers['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie', 'Accept-Language'))
+        return response
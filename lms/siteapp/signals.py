@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from lms.cache import bump_version
+from .models import SiteInfo
+
+
+@receiver(post_save, sender=SiteInfo)
+@receiver(post_delete, sender=SiteInfo)
+def invalidate_site_info(sender, **kwargs):
+    """
+    Drop cached site info and the cached pages which show it in the header and footer.
+    """
+    bump_version('site', 'pages', 'faq')
@@ -1,3 +1,93 @@
-from django.test import TestCase
+import re
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import CsrfViewMiddleware, _unmask_cipher_token
+from django.template import engines
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import translation
+from django.views import View
+
+from lms.cache import clear_local_cache, get_cache_stats, reset_cache_stats
+from pages.models import Page
+from users.models import User
+from .models import SiteInfo
+from .response_cache import CachedResponseMixin, CSRF_PLACEHOLDER
+
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]*)"')
+
+
+class CsrfFormView(CachedResponseMixin, View):
+    cache_namespace = 'test-forms'
+
+    def get(self, request):
+        template = engines['django'].from_string('<form method="post">{% csrf_token %}</form>')
+        return HttpResponse(template.render(request=request))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ResponseCacheTest(TestCase):
+    """
+    CachedResponseMixin: ETag revalidation, invalidation on save and per visitor CSRF tokens
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        SiteInfo.objects.create(title='LMS', logo_icon='static/img/logo-icon.png', logo_text='static/img/logo-text.png',
+                                logo_full='static/img/logo-full.png')
+        cls.page = Page.objects.create(title='Cached page', slug='cached-page', content='Text', status='published')
+        cls.user = User.objects.create_user('reader', password='test')
+
+    def setUp(self):
+        cache.clear()
+        clear_local_cache()
+        translation.activate(settings.LANGUAGES[0][0])
+        self.addCleanup(translation.deactivate)
+        self.url = reverse('pages:page', kwargs={'slug': self.page.slug})
+        self.client.force_login(self.user)
+
+    def test_matching_etag_gets_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertFalse(response.content)
+
+    def test_save_invalidates_cached_response(self):
+        etag = self.client.get(self.url).headers['ETag']
+
+        self.page.title = 'Renamed page'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.page.save()
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertContains(response, 'Renamed page')
+
+    def test_csrf_token_per_visitor(self):
+        view = CsrfViewMiddleware(CsrfFormView.as_view())
+        secrets = []
+        reset_cache_stats()
+
+        # Anonymous visitors share one cached body, the second one is served from the cache
+        for _ in range(2):
+            request = RequestFactory().get('/form/')
+            request.user = AnonymousUser()
+            response = view(request)
+
+            content = response.content.decode()
+            self.assertNotIn(CSRF_PLACEHOLDER.decode(), content)
+            secret = response.cookies[settings.CSRF_COOKIE_NAME].value
+            self.assertEqual([_unmask_cipher_token(token) for token in CSRF_INPUT_RE.findall(content)], [secret])
+            secrets.append(secret)
+
+        self.assertEqual(get_cache_stats()['test-forms']['l2_hits'], 1)
+        self.assertNotEqual(secrets[0], secrets[1])
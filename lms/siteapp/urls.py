@@ -1,3 +1,7 @@
+from django.urls import path
+
+from .views import cache_stats_view, connection_stats_view
+
 app_name = 'siteapp'
 
 
@@ -6,5 +10,6 @@ handler403 = 'siteapp.views.custom_page_access_denied_view'
 handler500 = 'siteapp.views.custom_server_error_view'
 
 urlpatterns = [
-
+    path('cache-stats/', cache_stats_view, name='cache-stats'),
+    path('db-stats/', connection_stats_view, name='db-stats'),
 ]
@@ -1,5 +1,12 @@
+import os
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from lms.cache import get_cache_stats
+from lms.connections import get_connection_stats
+
 
 # Create your views here.
 def custom_page_not_found_view(request, exception):
@@ -28,3 +35,19 @@ def custom_page_access_denied_view(request, exception):
         'error': str(exception),
     }
     return render(request, 'siteapp/error-pages/403.html', context, status=403)
+
+
+@staff_member_required
+def cache_stats_view(request):
+    """
+    Project cache hit/miss counters of the worker process which serves the request
+    """
+    return JsonResponse({'pid': os.getpid(), 'namespaces': get_cache_stats()})
+
+
+@staff_member_required
+def connection_stats_view(request):
+    """
+    Database connection counters (connects, waits, checkouts, lifetime) of the worker process
+    """
+    return JsonResponse({'pid': os.getpid(), 'databases': get_connection_stats()})
@@ -0,0 +1,14 @@
+'use strict';
+{
+    const $ = django.jQuery;
+
+    // Reload the changelist with the value selected in an AutocompleteFilter
+    $(document).on('change', '.admin-autocomplete-filter select', function() {
+        const container = this.closest('.admin-autocomplete-filter');
+        const params = new URLSearchParams(container.dataset.queryString);
+        if (this.value) {
+            params.set(container.dataset.param, this.value);
+        }
+        window.location.search = params.toString();
+    });
+}
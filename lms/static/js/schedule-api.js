@@ -0,0 +1,143 @@
+/**
+ * Teacher schedule: lesson status and move actions through the JSON API,
+ * the lesson row and the month calendar are updated in place instead of reloading the page.
+ */
+'use strict';
+
+function initScheduleApi(options) {
+    const STATUS_BADGES = {
+        'planned': 'bg-label-info',
+        'conducted': 'bg-label-success',
+        'missed': 'bg-label-danger',
+    };
+    const STATUS_ACTIONS = ['conducted', 'missed', 'planned'];
+
+    function apiUrl(url, lessonId) {
+        return url.replace('0', lessonId);
+    }
+
+    function post(url, form, extra) {
+        const data = new FormData(form);
+        Object.entries(extra || {}).forEach(([key, value]) => data.append(key, value));
+
+        return fetch(url, {
+            method: 'POST',
+            body: data,
+            credentials: 'same-origin',
+            headers: {'X-Requested-With': 'XMLHttpRequest'},
+        }).then(response => response.json().then(body => {
+            if (!response.ok) {
+                const error = new Error(body.error || response.statusText);
+                error.status = response.status;
+                error.lesson = body.lesson;
+                throw error;
+            }
+            return body;
+        }));
+    }
+
+    function updateRow(lesson) {
+        const row = document.querySelector(`tr[data-lesson-id="${lesson.id}"]`);
+        if (!row) {
+            return;
+        }
+        if (lesson.date !== options.date) {
+            row.remove();
+            return;
+        }
+
+        row.dataset.status = lesson.status;
+        row.querySelector('.lesson-time').textContent = lesson.time;
+
+        const badge = document.createElement('span');
+        badge.className = `badge ${STATUS_BADGES[lesson.status] || ''}`;
+        badge.textContent = lesson.status;
+        row.querySelector('.lesson-status').replaceChildren(badge);
+
+        const planned = lesson.status === 'planned';
+        row.querySelectorAll('.lesson-action--planned').forEach(item => item.classList.toggle('d-none', !planned));
+        row.querySelectorAll('.lesson-action--finished').forEach(item => item.classList.toggle('d-none', planned));
+    }
+
+    function updateCalendar() {
+        const table = document.querySelector('table.calendar');
+        if (!table) {
+            return;
+        }
+        const year = table.dataset.year;
+        const month = table.dataset.month;
+
+        fetch(`${options.calendarUrl}?year=${year}&month=${month}`, {credentials: 'same-origin'})
+            .then(response => response.json())
+            .then(body => {
+                table.querySelectorAll('td[data-day]').forEach(cell => {
+                    const day = cell.dataset.day;
+                    if (day === '0') {
+                        return;
+                    }
+                    if (body.days[day]) {
+                        const link = document.createElement('a');
+                        link.href = `?date=${year}-${month}-${day}`;
+                        link.className = 'highlight';
+                        link.textContent = day;
+                        cell.replaceChildren(link);
+                    } else {
+                        cell.replaceChildren(document.createTextNode(day));
+                    }
+                });
+            });
+    }
+
+    function submitAction(action, form, lessonId) {
+        const request = action === 'move'
+            ? post(apiUrl(options.moveUrl, lessonId), form)
+            : post(apiUrl(options.statusUrl, lessonId), form, {status: action});
+
+        return request.then(body => {
+            updateRow(body.lesson);
+            updateCalendar();
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('.dropdown-item[data-id]').forEach(function (item) {
+            item.addEventListener('click', function () {
+                const form = document.querySelector(`#${this.dataset.action} form`);
+                if (form) {
+                    form.dataset.lessonId = this.dataset.id;
+                }
+            });
+        });
+
+        STATUS_ACTIONS.concat(['move']).forEach(function (action) {
+            const modal = document.getElementById(action);
+            const form = modal && modal.querySelector('form');
+            if (!form) {
+                return;
+            }
+
+            form.addEventListener('submit', function (event) {
+                if (!form.dataset.lessonId) {
+                    return;
+                }
+                event.preventDefault();
+
+                submitAction(action, form, form.dataset.lessonId)
+                    .then(() => bootstrap.Modal.getOrCreateInstance(modal).hide())
+                    .catch(error => {
+                        // Double booking or the lesson already has the status: show the lesson as it is
+                        // and keep the modal open with the message
+                        if (error.status === 409) {
+                            if (error.lesson) {
+                                updateRow(error.lesson);
+                            }
+                            alert(error.message);
+                            return;
+                        }
+                        // Fall back to the regular form post if the API call fails
+                        form.submit();
+                    });
+            });
+        });
+    });
+}
@@ -1,13 +1,34 @@
 from django.contrib import admin
+from django.utils.translation import gettext_lazy as _
+
+from lms.routers import get_read_database
+from .export import LEDGERS, ledger_csv_response, ledger_filename
 from .models import StudentPayment, TeacherPayment, CompanyPayment
 
+
+@admin.action(description=_('Export selected payments to CSV'))
+def export_csv(modeladmin, request, queryset):
+    """
+    Stream the selected payments ("select all" exports every matching row)
+    """
+    ledger = next(name for name, (model, _account) in LEDGERS.items() if model is queryset.model)
+    queryset = queryset.using(get_read_database(request)).order_by('created_at', 'id')
+    return ledger_csv_response(queryset, ledger, ledger_filename(ledger))
+
+
 # Register your models here.
 @admin.register(TeacherPayment)
 class TeacherPaymentAdmin(admin.ModelAdmin):
     list_display = ['teacher', 'created_at', 'lesson', 'price', 'description']
+    list_select_related = ['teacher__user', 'lesson']
+    actions = [export_csv]
 @admin.register(StudentPayment)
 class StudentPaymentAdmin(admin.ModelAdmin):
     list_display = ['student', 'created_at', 'lesson', 'price', 'description']
+    list_select_related = ['student__user', 'lesson']
+    actions = [export_csv]
 @admin.register(CompanyPayment)
 class CompanyPaymentAdmin(admin.ModelAdmin):
     list_display = ['company', 'created_at', 'lesson', 'price', 'description']
+    list_select_related = ['company', 'lesson']
+    actions = [export_csv]
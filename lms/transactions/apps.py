@@ -6,3 +6,6 @@ class TransactionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'transactions'
     verbose_name = _('transactions')
+
+    def ready(self):
+        import transactions.signals
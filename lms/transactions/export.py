@@ -0,0 +1,110 @@
+import csv
+from datetime import date
+
+from django.db.models import Exists, OuterRef, F
+from django.http import StreamingHttpResponse
+
+from school.models import Student, user_display_name
+from .models import TeacherPayment, StudentPayment, CompanyPayment
+
+EXPORT_CHUNK_SIZE = 2000
+
+# ledger name: (payment model, account field). Payment prices are in the currency of the account.
+LEDGERS = {
+    'teacher': (TeacherPayment, 'teacher'),
+    'student': (StudentPayment, 'student'),
+    'company': (CompanyPayment, 'company'),
+}
+
+LEDGER_HEADER = ['id', 'created_at', 'account_id', 'account', 'lesson_id', 'lesson_date', 'price', 'currency',
+                 'description']
+
+
+class Echo:
+    """
+    File-like object which returns the written value, lets csv.writer produce lines for streaming
+    """
+
+    def write(self, value):
+        return value
+
+
+def get_ledger_queryset(ledger: str, date_from: date = None, date_to: date = None, teacher=None, company=None,
+                        currency=None):
+    """
+    Payments of the ledger filtered for export, oldest first
+
+    Parameters
+    ----------
+        ledger - 'teacher', 'student' or 'company'
+        date_from, date_to - payment date range, inclusive
+        teacher - teacher of the payments (lesson teacher for student and company ledgers)
+        company - company of the payments (company of the lesson students for teacher ledger)
+        currency - currency of the paid account
+
+    Returns
+    -------
+        QuerySet of payments
+    """
+    model, account = LEDGERS[ledger]
+    queryset = model.objects.all()
+
+    if date_from:
+        queryset = queryset.filter(created_at__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(created_at__lte=date_to)
+
+    if teacher:
+        queryset = queryset.filter(teacher=teacher) if ledger == 'teacher' else queryset.filter(lesson__teacher=teacher)
+
+    if company:
+        if ledger == 'company':
+            queryset = queryset.filter(company=company)
+        elif ledger == 'student':
+            queryset = queryset.filter(student__company=company)
+        else:
+            queryset = queryset.filter(Exists(Student.objects.filter(lesson=OuterRef('lesson_id'), company=company)))
+
+    if currency:
+        queryset = queryset.filter(**{f'{account}__currency': currency})
+
+    return queryset.order_by('created_at', 'id')
+
+
+def iter_ledger_rows(queryset, ledger: str, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Ledger rows as tuples in LEDGER_HEADER order.
+    Read with a server-side cursor in chunks, so memory does not grow with the number of rows.
+    """
+    _, account = LEDGERS[ledger]
+    account_name = F('company__name') if ledger == 'company' else user_display_name(f'{account}__user__')
+
+    return (queryset
+            .annotate(account_name=account_name)
+            .values_list('id', 'created_at', f'{account}_id', 'account_name', 'lesson_id', 'lesson__date', 'price',
+                         f'{account}__currency__name', 'description')
+            .iterator(chunk_size=chunk_size))
+
+
+def iter_ledger_csv(queryset, ledger: str, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Ledger as CSV lines, starting with the header
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(LEDGER_HEADER)
+    for row in iter_ledger_rows(queryset, ledger, chunk_size):
+        yield writer.writerow(row)
+
+
+def ledger_csv_response(queryset, ledger: str, filename: str) -> StreamingHttpResponse:
+    """
+    Streaming CSV download of the ledger
+    """
+    response = StreamingHttpResponse(iter_ledger_csv(queryset, ledger), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def ledger_filename(ledger: str, date_from: date = None, date_to: date = None) -> str:
+    period = '_'.join(f'{day:%Y-%m-%d}' for day in (date_from, date_to) if day)
+    return f'{ledger}-payments{"-" + period if period else ""}.csv'
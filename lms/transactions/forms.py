@@ -0,0 +1,24 @@
+from django import forms
+from django.utils.translation import gettext_lazy as _
+
+from companies.models import Company
+from school.models import Teacher
+from settings.models import Currency
+
+
+class LedgerExportForm(forms.Form):
+    date_from = forms.DateField(required=False, label=_('date from'))
+    date_to = forms.DateField(required=False, label=_('date to'))
+    teacher = forms.ModelChoiceField(queryset=Teacher.objects.all(), required=False, label=_('teacher'))
+    company = forms.ModelChoiceField(queryset=Company.objects.all(), required=False, label=_('company'))
+    currency = forms.ModelChoiceField(queryset=Currency.objects.all(), required=False, label=_('currency'))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get('date_from')
+        date_to = cleaned_data.get('date_to')
+
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError(_('Start date must be before end date.'))
+
+        return cleaned_data
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.export import LEDGERS, get_ledger_queryset, iter_ledger_csv
+from transactions.forms import LedgerExportForm
+
+
+class Command(BaseCommand):
+    help = 'Export a payment ledger (teacher, student or company payments) to CSV, streamed row by row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ledger', choices=sorted(LEDGERS))
+        parser.add_argument('--from', dest='date_from', help='First payment date, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', help='Last payment date, YYYY-MM-DD')
+        parser.add_argument('--teacher', help='Teacher id')
+        parser.add_argument('--company', help='Company id')
+        parser.add_argument('--currency', help='Currency id')
+        parser.add_argument('--output', '-o', help='File to write, stdout by default')
+
+    def handle(self, *args, **options):
+        form = LedgerExportForm({name: options[name] for name in LedgerExportForm.base_fields if options[name]})
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+
+        queryset = get_ledger_queryset(options['ledger'], **form.cleaned_data)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+                rows = self.write(file, queryset, options['ledger'])
+            self.stderr.write(self.style.SUCCESS(f"Exported {rows} payment(s) to {options['output']}"))
+        else:
+            self.write(self.stdout, queryset, options['ledger'])
+
+    def write(self, file, queryset, ledger):
+        rows = -1  # header
+        for line in iter_ledger_csv(queryset, ledger):
+            file.write(line)
+            rows += 1
+        return rows
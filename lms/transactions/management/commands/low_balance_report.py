@@ -0,0 +1,33 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from school.services import format_time_left
+from transactions.models import StudentAccountSummary, LOW_BALANCE_HOURS
+
+
+class Command(BaseCommand):
+    help = ('List students with paid time for less than the given number of hours, from the account summaries. '
+            'Summaries counted before today are recalculated first, run it daily.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=Decimal, default=LOW_BALANCE_HOURS)
+        parser.add_argument('--refresh', action='store_true',
+                            help='Recalculate all account summaries first, not only the ones counted before today')
+
+    def handle(self, *args, **options):
+        if options['refresh']:
+            StudentAccountSummary.objects.refresh()
+        else:
+            StudentAccountSummary.objects.refresh_stale()
+
+        summaries = list(StudentAccountSummary.objects.low_balance(options['hours']))
+        for summary in summaries:
+            self.stdout.write(f'{summary.student} (#{summary.student_id}): {summary.balance} '
+                              f'{summary.student.currency or ""}, {format_time_left(summary.hours_left)}, '
+                              f'last payment {summary.last_payment_at or "-"}')
+
+        if summaries:
+            self.stdout.write(self.style.WARNING(f'{len(summaries)} student(s) with low balance'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No students with low balance'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from transactions.models import TeacherPaymentSummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild teacher payroll rollup (TeacherPaymentSummary) from the TeacherPayment ledger'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = TeacherPaymentSummary.objects.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} payroll summary rows'))
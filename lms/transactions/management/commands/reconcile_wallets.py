@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from companies.models import Company
+from school.models import Student
+from transactions.models import StudentAccountSummary
+from transactions.services import get_wallet_drift, apply_wallet_deltas
+
+
+class Command(BaseCommand):
+    help = ('Recalculate student and company wallets from the payment ledger '
+            '(top ups minus lesson payments) and report accounts that drifted')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Set drifted wallets to the ledger balance')
+
+    def handle(self, *args, **options):
+        drifted = 0
+
+        for accounts, payment_relation in ((Student.objects.select_related('user'), 'studentpayment'),
+                                           (Company.objects.all(), 'companypayment')):
+            model = accounts.model
+            accounts = list(get_wallet_drift(accounts, payment_relation))
+
+            for account in accounts:
+                self.stdout.write(f'{model._meta.verbose_name} #{account.pk} {account}: '
+                                  f'wallet {account.wallet}, ledger {account.expected_wallet}, '
+                                  f'drift {account.wallet - account.expected_wallet}')
+
+            if options['fix']:
+                # Apply the difference as a delta, so payments made since the check are kept
+                apply_wallet_deltas(model, {account.pk: account.expected_wallet - account.wallet
+                                            for account in accounts})
+                if model is Student:
+                    StudentAccountSummary.objects.refresh([account.pk for account in accounts])
+
+            drifted += len(accounts)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All wallets match the ledger'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {drifted} wallet(s)'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{drifted} wallet(s) drifted, run with --fix to correct them'))
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Count, IntegerField, Sum, Value, When
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def build_summaries(apps, schema_editor):
+    TeacherPayment = apps.get_model('transactions', 'TeacherPayment')
+    TeacherPaymentSummary = apps.get_model('transactions', 'TeacherPaymentSummary')
+
+    rows = (TeacherPayment.objects
+            .annotate(year=ExtractYear('created_at'),
+                      month=ExtractMonth('created_at'),
+                      half_month=Case(
+                          When(created_at__day__lte=15, then=Value(1)),
+                          default=Value(2),
+                          output_field=IntegerField(),
+                      ))
+            .values('teacher_id', 'year', 'month', 'half_month')
+            .annotate(total_price=Sum('price'), lesson_count=Count('lesson'))
+            .order_by())
+
+    TeacherPaymentSummary.objects.bulk_create([TeacherPaymentSummary(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0005_alter_lesson_options_alter_studentprogress_options_and_more'),
+        ('transactions', '0003_alter_companypayment_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeacherPaymentSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='year')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='month')),
+                ('half_month', models.PositiveSmallIntegerField(verbose_name='part of month')),
+                ('total_price', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='total price')),
+                ('lesson_count', models.IntegerField(default=0, verbose_name='lesson count')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='school.teacher', verbose_name='teacher')),
+            ],
+            options={
+                'verbose_name': 'Teacher Payment Summary',
+                'verbose_name_plural': 'Teachers Payment Summary',
+                'constraints': [models.UniqueConstraint(fields=('teacher', 'year', 'month', 'half_month'), name='unique_teacher_payment_summary')],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_alter_company_options_alter_company_currency_and_more'),
+        ('school', '0006_lesson_indexes'),
+        ('transactions', '0004_teacherpaymentsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentpayment',
+            index=models.Index(fields=['student', '-created_at'], name='studentpay_student_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teacherpayment',
+            index=models.Index(fields=['teacher', 'created_at'], include=('price',), name='teacherpay_teacher_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='companypayment',
+            index=models.Index(fields=['company', 'created_at'], include=('price',), name='companypay_company_created_idx'),
+        ),
+    ]
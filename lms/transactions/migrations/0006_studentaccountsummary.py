@@ -0,0 +1,69 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:00
+
+import datetime
+import django.db.models.deletion
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, Max, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+
+def build_summaries(apps, schema_editor):
+    Student = apps.get_model('school', 'Student')
+    StudentPayment = apps.get_model('transactions', 'StudentPayment')
+    StudentAccountSummary = apps.get_model('transactions', 'StudentAccountSummary')
+
+    today = datetime.date.today()
+    payments = StudentPayment.objects.filter(student=OuterRef('pk')).order_by().values('student')
+    students = Student.objects.annotate(
+        hours_left=Case(
+            When(wallet__lte=0, then=Value(Decimal(0))),
+            When(rate__gt=0, then=F('wallet') / F('rate')),
+            default=None,
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+        recent_lessons=Coalesce(Subquery(
+            payments
+            .filter(lesson__isnull=False, created_at__gt=today - timedelta(days=30))
+            .annotate(count=Count('pk'))
+            .values('count')
+        ), 0),
+        last_payment_at=Subquery(payments.filter(lesson__isnull=True).annotate(last=Max('created_at'))
+                                 .values('last')),
+    ).values_list('pk', 'wallet', 'hours_left', 'recent_lessons', 'last_payment_at')
+
+    StudentAccountSummary.objects.bulk_create([
+        StudentAccountSummary(student_id=pk, balance=wallet, hours_left=hours_left, recent_lessons=recent_lessons,
+                              last_payment_at=last_payment_at, counted_on=today)
+        for pk, wallet, hours_left, recent_lessons, last_payment_at in students
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0007_pricingrule'),
+        ('transactions', '0005_payment_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentAccountSummary',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='account_summary', serialize=False, to='school.student', verbose_name='student')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='balance')),
+                ('hours_left', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='hours left')),
+                ('recent_lessons', models.PositiveIntegerField(default=0, verbose_name='lessons in 30 days')),
+                ('last_payment_at', models.DateField(blank=True, null=True, verbose_name='last payment')),
+                ('counted_on', models.DateField(default=datetime.date.today, verbose_name='counted on')),
+            ],
+            options={
+                'verbose_name': 'Student Account Summary',
+                'verbose_name_plural': 'Students Account Summary',
+                'indexes': [models.Index(fields=['hours_left'], include=('balance',), name='studentsummary_hours_left_idx')],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
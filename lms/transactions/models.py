@@ -1,10 +1,13 @@
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from decimal import Decimal
 
-from django.db import models
-from django.db.models import Sum, Case, When, IntegerField, Value
-from django.db.models.functions import TruncMonth
+from django.db import models, transaction
+from django.db.models import Sum, Count, Max, Case, When, IntegerField, Value, F, OuterRef, Subquery
+from django.db.models.functions import ExtractYear, ExtractMonth, Coalesce
 from school.models import Lesson, Teacher, Student
 from companies.models import Company
+from .services import credit_wallet
 from django.utils.translation import gettext_lazy as _
 
 
@@ -20,14 +23,61 @@ class TransactionBase(models.Model):
         abstract = True
 
 
+def get_previous_top_up(payment) -> Decimal:
+    """
+    Already credited amount of an edited top up payment (payment without lesson)
+    """
+    if payment._state.adding:
+        return Decimal(0)
+
+    previous = type(payment).objects.filter(pk=payment.pk, lesson__isnull=True).values_list('price', flat=True)
+    return previous.first() or Decimal(0)
+
+
+class PaymentQuerySet(models.QuerySet):
+    def for_profile_list(self):
+        """
+        Payments of the profile payments tab with their lesson
+        """
+        return self.select_related('lesson')
+
+
+class StudentPaymentQuerySet(PaymentQuerySet):
+    def delete(self):
+        """
+        Delete payments and refresh account summaries of their students
+        """
+        with transaction.atomic(savepoint=False):
+            student_ids = set(self.order_by().values_list('student_id', flat=True))
+            deleted = super().delete()
+            StudentAccountSummary.objects.refresh(student_ids)
+            return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class StudentPayment(TransactionBase):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, verbose_name=_('student'))
+
+    objects = StudentPaymentQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
+        with transaction.atomic(savepoint=False):
+            previous_price = get_previous_top_up(self)
+            super().save(*args, **kwargs)
+
+            # Top up balance only if lesson not set, lesson payments are charged by settlement
+            if not self.lesson_id:
+                credit_wallet(Student, self.student_id, self.price - previous_price)
 
-        if not self.lesson:
-            self.student.wallet += self.price
-            self.student.save()
+            StudentAccountSummary.objects.refresh([self.student_id])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            deleted = super().delete(*args, **kwargs)
+            StudentAccountSummary.objects.refresh([self.student_id])
+            return deleted
 
     def __str__(self):
         return f"{self.student.user.first_name} {self.student.user.last_name}"
@@ -35,26 +85,51 @@ class StudentPayment(TransactionBase):
     class Meta:
         verbose_name = _('Student Payment')
         verbose_name_plural = _('Students Payment')
+        indexes = [
+            models.Index(fields=['student', '-created_at'], name='studentpay_student_created_idx'),
+        ]
 
 
-class TeacherPaymentManager(models.Manager):
-    def get_half_month_summaries(self, teacher, year):
-        # Фильтруем данные за указанный год
-        qs = self.filter(teacher=teacher, created_at__year=year)
+def get_half_month(day: int) -> int:
+    """
+    Part of month for a day: 1 - days 1-15, 2 - days 16-31
+    """
+    return 1 if day <= 15 else 2
+
 
-        # Разбиваем на первую и вторую половину месяца
-        half_month_aggregates = qs.annotate(
-            half_month=Case(
-                When(created_at__day__lte=15, then=Value(1)),
-                When(created_at__day__gte=16, then=Value(2)),
-                output_field=IntegerField(),
-            ),
-            month=TruncMonth('created_at')
-        ).values('month', 'half_month').annotate(
-            total_price=Sum('price')
-        ).order_by('month', 'half_month')
+class TeacherPaymentQuerySet(PaymentQuerySet):
+    def delete(self):
+        """
+        Remove deleted payments from the payroll rollup in bulk, then delete them.
+        """
+        with transaction.atomic(savepoint=False):
+            TeacherPaymentSummary.objects.remove_payments(
+                self.order_by().only('teacher_id', 'lesson_id', 'created_at', 'price'))
+            return super().delete()
 
-        return half_month_aggregates
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class TeacherPaymentManager(models.Manager.from_queryset(TeacherPaymentQuerySet)):
+    def get_half_month_summaries(self, teacher, year):
+        """
+        Teacher payments for the year grouped by month and half of month.
+        Reads precomputed TeacherPaymentSummary rows instead of scanning the ledger.
+        """
+        summaries = (TeacherPaymentSummary.objects
+                     .filter(teacher=teacher, year=year)
+                     .exclude(total_price=0, lesson_count=0)
+                     .order_by('month', 'half_month'))
+
+        return [
+            {
+                'month': date(summary.year, summary.month, 1),
+                'half_month': summary.half_month,
+                'total_price': summary.total_price,
+            }
+            for summary in summaries
+        ]
 
 
 class TeacherPayment(TransactionBase):
@@ -62,25 +137,214 @@ class TeacherPayment(TransactionBase):
 
     objects = TeacherPaymentManager()
 
+    def save(self, *args, **kwargs):
+        previous = None
+        if not self._state.adding:
+            previous = TeacherPayment.objects.filter(pk=self.pk).first()
+
+        super().save(*args, **kwargs)
+
+        if previous:
+            TeacherPaymentSummary.objects.remove_payments([previous])
+        TeacherPaymentSummary.objects.add_payments([self])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            TeacherPaymentSummary.objects.remove_payments([self])
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"{self.teacher.user.first_name} {self.teacher.user.last_name}"
 
     class Meta:
         verbose_name = _('Teacher Payment')
         verbose_name_plural = _('Teachers Payment')
+        indexes = [
+            models.Index(fields=['teacher', 'created_at'], include=['price'], name='teacherpay_teacher_created_idx'),
+        ]
+
+
+class TeacherPaymentSummaryManager(models.Manager):
+    def add_payments(self, payments, sign=1):
+        """
+        Incrementally add teacher payments to their (teacher, year, month, half_month) rows.
+        One UPDATE per affected row, missing rows are created first.
+        """
+        deltas = defaultdict(lambda: [Decimal(0), 0])
+        for payment in payments:
+            key = (payment.teacher_id, payment.created_at.year, payment.created_at.month,
+                   get_half_month(payment.created_at.day))
+            deltas[key][0] += payment.price * sign
+            deltas[key][1] += sign if payment.lesson_id else 0
+
+        if not deltas:
+            return
+
+        self.bulk_create([
+            self.model(teacher_id=teacher_id, year=year, month=month, half_month=half_month)
+            for teacher_id, year, month, half_month in deltas
+        ], ignore_conflicts=True)
+
+        for (teacher_id, year, month, half_month), (total_price, lesson_count) in deltas.items():
+            (self.filter(teacher_id=teacher_id, year=year, month=month, half_month=half_month)
+             .update(total_price=F('total_price') + total_price, lesson_count=F('lesson_count') + lesson_count))
+
+    def remove_payments(self, payments):
+        self.add_payments(payments, sign=-1)
+
+    def rebuild(self):
+        """
+        Recalculate all rows from the TeacherPayment ledger in one GROUP BY query.
+
+        Returns
+        -------
+            int: number of created rows
+        """
+        rows = (TeacherPayment.objects
+                .annotate(year=ExtractYear('created_at'),
+                          month=ExtractMonth('created_at'),
+                          half_month=Case(
+                              When(created_at__day__lte=15, then=Value(1)),
+                              default=Value(2),
+                              output_field=IntegerField(),
+                          ))
+                .values('teacher_id', 'year', 'month', 'half_month')
+                .annotate(total_price=Sum('price'), lesson_count=Count('lesson'))
+                .order_by())
+
+        self.all().delete()
+        summaries = self.bulk_create([self.model(**row) for row in rows], batch_size=1000)
+        return len(summaries)
+
+
+class TeacherPaymentSummary(models.Model):
+    """
+    Payroll rollup: teacher payments summed by month and half of month
+    """
+    teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE, verbose_name=_('teacher'))
+    year = models.PositiveSmallIntegerField(verbose_name=_('year'))
+    month = models.PositiveSmallIntegerField(verbose_name=_('month'))
+    half_month = models.PositiveSmallIntegerField(verbose_name=_('part of month'))
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name=_('total price'))
+    lesson_count = models.IntegerField(default=0, verbose_name=_('lesson count'))
+
+    objects = TeacherPaymentSummaryManager()
+
+    def __str__(self):
+        return f"{self.teacher} {self.month:02}.{self.year} ({self.half_month})"
+
+    class Meta:
+        verbose_name = _('Teacher Payment Summary')
+        verbose_name_plural = _('Teachers Payment Summary')
+        constraints = [
+            models.UniqueConstraint(fields=['teacher', 'year', 'month', 'half_month'],
+                                    name='unique_teacher_payment_summary'),
+        ]
+
+
+LOW_BALANCE_HOURS = Decimal(2)
+RECENT_LESSONS_DAYS = 30
+
+
+class StudentAccountSummaryManager(models.Manager):
+    def refresh(self, student_ids=None):
+        """
+        Bring account summaries of the students (all students if None) up to date.
+        Missing rows are created first, then one UPDATE recalculates the rows from the student
+        wallet and rate and the payments of the (student, -created_at) index, so only the
+        students touched by a payment write are recalculated.
+        """
+        if student_ids is None:
+            summaries = self.all()
+            student_ids = Student.objects.filter(account_summary__isnull=True).values_list('pk', flat=True)
+        else:
+            student_ids = [pk for pk in set(student_ids) if pk is not None]
+            if not student_ids:
+                return
+            summaries = self.filter(student_id__in=student_ids)
+
+        self.bulk_create([self.model(student_id=pk) for pk in student_ids], ignore_conflicts=True)
+
+        today = date.today()
+        student = Student.objects.filter(pk=OuterRef('student_id'))
+        payments = StudentPayment.objects.filter(student=OuterRef('student_id')).order_by().values('student')
+        hours_left = Case(
+            When(wallet__lte=0, then=Value(Decimal(0))),
+            When(rate__gt=0, then=F('wallet') / F('rate')),
+            default=None,
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+
+        summaries.update(
+            balance=Subquery(student.values('wallet')[:1]),
+            hours_left=Subquery(student.annotate(hours_left=hours_left).values('hours_left')[:1]),
+            recent_lessons=Coalesce(Subquery(
+                payments
+                .filter(lesson__isnull=False, created_at__gt=today - timedelta(days=RECENT_LESSONS_DAYS))
+                .annotate(count=Count('pk'))
+                .values('count')
+            ), 0),
+            last_payment_at=Subquery(payments.filter(lesson__isnull=True).annotate(last=Max('created_at'))
+                                     .values('last')),
+            counted_on=today,
+        )
+
+    def refresh_stale(self):
+        """
+        Recalculate the summaries counted before today (the 30 days lesson window moved)
+        and create the missing ones
+        """
+        stale = self.filter(counted_on__lt=date.today()).values_list('student_id', flat=True)
+        missing = Student.objects.filter(account_summary__isnull=True).values_list('pk', flat=True)
+        self.refresh([*stale, *missing])
+
+    def low_balance(self, hours=LOW_BALANCE_HOURS):
+        """
+        Students with money for less than `hours` of lessons, read from the hours_left index
+        """
+        return self.filter(hours_left__lt=hours).select_related('student__user', 'student__currency') \
+            .order_by('hours_left')
+
+
+class StudentAccountSummary(models.Model):
+    """
+    Student account: balance, paid hours left, lessons in the last 30 days and the last top up date
+    """
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='account_summary', verbose_name=_('student'))
+    balance = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name=_('balance'))
+    hours_left = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                     verbose_name=_('hours left'))
+    recent_lessons = models.PositiveIntegerField(default=0, verbose_name=_('lessons in 30 days'))
+    last_payment_at = models.DateField(null=True, blank=True, verbose_name=_('last payment'))
+    counted_on = models.DateField(default=date.today, verbose_name=_('counted on'))
+
+    objects = StudentAccountSummaryManager()
+
+    def __str__(self):
+        return f"{self.student}: {self.balance}"
+
+    class Meta:
+        verbose_name = _('Student Account Summary')
+        verbose_name_plural = _('Students Account Summary')
+        indexes = [
+            models.Index(fields=['hours_left'], include=['balance'], name='studentsummary_hours_left_idx'),
+        ]
 
 
 class CompanyPayment(TransactionBase):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, verbose_name=_('company'))
 
+    objects = PaymentQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
-        # Сначала вызываем метод save родительского класса
-        super().save(*args, **kwargs)
+        with transaction.atomic(savepoint=False):
+            previous_price = get_previous_top_up(self)
+            super().save(*args, **kwargs)
 
-        # Обновляем баланс ученика только если урок не указан
-        if not self.lesson:
-            self.company.wallet += self.price
-            self.company.save()
+            # Обновляем баланс компании только если урок не указан
+            if not self.lesson_id:
+                credit_wallet(Company, self.company_id, self.price - previous_price)
 
     def __str__(self):
         return self.company.name
@@ -88,3 +352,6 @@ class CompanyPayment(TransactionBase):
     class Meta:
         verbose_name = _('Company Payment')
         verbose_name_plural = _('Companies Payment')
+        indexes = [
+            models.Index(fields=['company', 'created_at'], include=['price'], name='companypay_company_created_idx'),
+        ]
@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+from django.db.models import F, Sum, Case, When, DecimalField, Value
+from django.db.models.functions import Coalesce
+
+
+def apply_wallet_deltas(model, deltas: dict):
+    """
+    Add amounts to wallets in one UPDATE statement (wallet = wallet + delta, CASE by pk),
+    so concurrent settlements and top-ups never overwrite each other.
+
+    Parameters
+    ----------
+        model - Student or Company
+        deltas - {pk: amount}, negative amount takes money
+    """
+    deltas = {pk: amount for pk, amount in deltas.items() if pk is not None and amount}
+    if not deltas:
+        return
+
+    if len(deltas) == 1:
+        (pk, amount), = deltas.items()
+        model.objects.filter(pk=pk).update(wallet=F('wallet') + amount)
+        return
+
+    accounts = []
+    for pk, amount in deltas.items():
+        account = model(pk=pk)
+        account.wallet = F('wallet') + amount
+        accounts.append(account)
+
+    model.objects.bulk_update(accounts, ['wallet'])
+
+
+def charge_wallets(model, charges: dict):
+    """
+    Subtract amounts from wallets, see apply_wallet_deltas
+
+    Parameters
+    ----------
+        model - Student or Company
+        charges - {pk: amount}, negative amount returns money
+    """
+    apply_wallet_deltas(model, {pk: -amount for pk, amount in charges.items()})
+
+
+def credit_wallet(model, pk, amount: Decimal):
+    """
+    Add money to one wallet
+    """
+    apply_wallet_deltas(model, {pk: amount})
+
+
+def ledger_balance(payment_relation: str):
+    """
+    Wallet balance expected from the payment ledger:
+    payments without lesson are top-ups, payments for lessons are charges.
+
+    Parameters
+    ----------
+        payment_relation - reverse relation name of the payments, e.g. "studentpayment"
+    """
+    price = F(f'{payment_relation}__price')
+    return Coalesce(
+        Sum(Case(
+            When(**{f'{payment_relation}__lesson__isnull': True}, then=price),
+            default=-price,
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )),
+        Value(Decimal(0)),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def get_wallet_drift(accounts, payment_relation: str):
+    """
+    Accounts whose wallet differs from the ledger, calculated in one aggregate query
+
+    Parameters
+    ----------
+        accounts - QuerySet of Student or Company
+        payment_relation - reverse relation name of the payments, e.g. "studentpayment"
+
+    Returns
+    -------
+        QuerySet with `expected_wallet` annotation
+    """
+    return (accounts
+            .annotate(expected_wallet=ledger_balance(payment_relation))
+            .exclude(wallet=F('expected_wallet'))
+            .order_by('pk'))
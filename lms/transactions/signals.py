@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from school.models import Lesson
+from .models import TeacherPayment, TeacherPaymentSummary, StudentPayment, StudentAccountSummary
+
+
+@receiver(pre_delete, sender=Lesson)
+def remove_lesson_payments_from_summary(sender, instance, **kwargs):
+    """
+    Keep payroll rollup in sync when teacher payments are deleted by lesson cascade.
+    Direct deletes are handled by TeacherPayment.delete() and TeacherPaymentQuerySet.delete().
+    """
+    TeacherPaymentSummary.objects.remove_payments(
+        TeacherPayment.objects.filter(lesson=instance).only('teacher_id', 'lesson_id', 'created_at', 'price'))
+
+
+@receiver(pre_delete, sender=Lesson)
+def refresh_lesson_students_summaries(sender, instance, **kwargs):
+    """
+    Student payments deleted by lesson cascade skip StudentPaymentQuerySet.delete(),
+    refresh the summaries of their students once the lesson is gone.
+    """
+    student_ids = list(StudentPayment.objects.filter(lesson=instance).values_list('student_id', flat=True))
+    if student_ids:
+        transaction.on_commit(lambda: StudentAccountSummary.objects.refresh(student_ids))
@@ -1,3 +1,148 @@
-from django.test import TestCase
+import csv
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from lms.cache import clear_local_cache
+from companies.models import Company
+from school.models import Teacher, Student, Lesson
+from .export import LEDGERS, LEDGER_HEADER, get_ledger_queryset
+from .models import TeacherPayment, StudentPayment, CompanyPayment, TeacherPaymentSummary
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TeacherPaymentSummaryTest(TestCase):
+    """
+    The payroll rollup kept up to date by payment writes is the same as a full rebuild from the ledger
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        clear_local_cache()
+        call_command('seed_school', teachers=3, students=10, companies=1, lessons=60, months=2, stdout=StringIO())
+        cls.teacher, cls.other_teacher = Teacher.objects.order_by('pk')[:2]
+
+    def get_rollup(self) -> set:
+        return set(TeacherPaymentSummary.objects.exclude(total_price=0, lesson_count=0)
+                   .values_list('teacher_id', 'year', 'month', 'half_month', 'total_price', 'lesson_count'))
+
+    def assertRollupMatchesRebuild(self):
+        rollup = self.get_rollup()
+        TeacherPaymentSummary.objects.rebuild()
+        self.assertEqual(rollup, self.get_rollup())
+
+    def test_seeded_rollup(self):
+        self.assertTrue(self.get_rollup())
+        self.assertRollupMatchesRebuild()
+
+    def test_create(self):
+        lesson = Lesson.objects.filter(teacher=self.teacher).first()
+        TeacherPayment.objects.create(teacher=self.teacher, lesson=lesson, price=Decimal('100'),
+                                      created_at=date(2026, 3, 10))
+        TeacherPayment.objects.create(teacher=self.teacher, price=Decimal('-40'), created_at=date(2026, 3, 20))
+
+        self.assertRollupMatchesRebuild()
+
+    def test_update(self):
+        payment = TeacherPayment.objects.filter(teacher=self.teacher, lesson__isnull=False).first()
+        payment.price += 50
+        payment.save()
+
+        # Moved to another half of month and another teacher
+        payment.created_at = date(2026, 2, 28)
+        payment.teacher = self.other_teacher
+        payment.save()
+
+        self.assertRollupMatchesRebuild()
+
+    def test_delete(self):
+        TeacherPayment.objects.filter(teacher=self.teacher).first().delete()
+        self.assertRollupMatchesRebuild()
+
+        TeacherPayment.objects.filter(pk__in=TeacherPayment.objects.filter(teacher=self.other_teacher)
+                                      .values('pk')[:5]).delete()
+        self.assertRollupMatchesRebuild()
+
+    def test_lesson_cascade(self):
+        lessons = Lesson.objects.filter(teacherpayment__isnull=False).order_by('pk')
+        lessons.first().delete()
+        self.assertRollupMatchesRebuild()
+
+        Lesson.objects.filter(pk__in=lessons.filter(teacher=self.other_teacher).values('pk')[:3]).delete()
+        self.assertRollupMatchesRebuild()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LedgerExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        clear_local_cache()
+        call_command('seed_school', teachers=3, students=20, companies=2, lessons=80, months=2, stdout=StringIO())
+        cls.teacher = Teacher.objects.order_by('pk').first()
+        cls.company = Company.objects.filter(student__isnull=False).order_by('pk').first()
+        cls.date_from = date.today() - timedelta(days=30)
+        cls.date_to = date.today() - timedelta(days=10)
+
+    def get_ids(self, queryset) -> list:
+        return list(queryset.values_list('pk', flat=True))
+
+    def test_date_range(self):
+        for ledger, (model, _) in LEDGERS.items():
+            with self.subTest(ledger=ledger):
+                expected = model.objects.filter(created_at__range=(self.date_from, self.date_to)).order_by(
+                    'created_at', 'id')
+                self.assertTrue(expected.exists())
+                self.assertEqual(self.get_ids(get_ledger_queryset(ledger, self.date_from, self.date_to)),
+                                 self.get_ids(expected))
+
+    def test_teacher(self):
+        lessons = Lesson.objects.filter(teacher=self.teacher)
+        expected = {
+            'teacher': TeacherPayment.objects.filter(teacher=self.teacher),
+            'student': StudentPayment.objects.filter(lesson__in=lessons),
+            'company': CompanyPayment.objects.filter(lesson__in=lessons),
+        }
+        for ledger, payments in expected.items():
+            with self.subTest(ledger=ledger):
+                self.assertEqual(set(self.get_ids(get_ledger_queryset(ledger, teacher=self.teacher))),
+                                 set(self.get_ids(payments)))
+        self.assertTrue(expected['teacher'].exists())
+
+    def test_company(self):
+        students = Student.objects.filter(company=self.company)
+        expected = {
+            'teacher': TeacherPayment.objects.filter(lesson__students__in=students).distinct(),
+            'student': StudentPayment.objects.filter(student__in=students),
+            'company': CompanyPayment.objects.filter(company=self.company),
+        }
+        for ledger, payments in expected.items():
+            with self.subTest(ledger=ledger):
+                self.assertTrue(payments.exists())
+                self.assertEqual(set(self.get_ids(get_ledger_queryset(ledger, company=self.company))),
+                                 set(self.get_ids(payments)))
+
+    def test_csv(self):
+        stdout = StringIO()
+
+        call_command('export_ledger', 'teacher', '--teacher', str(self.teacher.pk), '--from',
+                     self.date_from.isoformat(), stdout=stdout)
+
+        header, *rows = list(csv.reader(StringIO(stdout.getvalue())))
+        payments = get_ledger_queryset('teacher', date_from=self.date_from, teacher=self.teacher)
+        self.assertEqual(header, LEDGER_HEADER)
+        self.assertTrue(rows)
+        self.assertEqual([int(row[0]) for row in rows], self.get_ids(payments))
+
+        payment = payments.select_related('teacher__user', 'teacher__currency').first()
+        self.assertEqual(rows[0], [
+            str(payment.pk), payment.created_at.isoformat(), str(self.teacher.pk), str(self.teacher),
+            str(payment.lesson_id or ''), payment.lesson.date.isoformat() if payment.lesson_id else '',
+            str(payment.price), payment.teacher.currency.name, payment.description or '',
+        ])
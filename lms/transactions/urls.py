@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import LedgerExport
+
+app_name = 'transactions'
+
+urlpatterns = [
+    path('ledger/<str:ledger>/export/', LedgerExport.as_view(), name='ledger-export'),
+]
@@ -1,3 +1,32 @@
-from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseBadRequest
+from django.utils.decorators import method_decorator
+from django.views import View
 
-# Create your views here.
+from lms.routers import replica_reads, get_read_database
+from school.services import user_is_staff
+from .export import LEDGERS, get_ledger_queryset, ledger_csv_response, ledger_filename
+from .forms import LedgerExportForm
+
+
+@method_decorator(login_required(login_url='/login/'), name='dispatch')
+@method_decorator(user_is_staff, name='dispatch')
+@method_decorator(replica_reads, name='dispatch')
+class LedgerExport(View):
+    """
+    Stream payments of one ledger as CSV.
+    GET filters: date_from, date_to (YYYY-MM-DD), teacher, company, currency (ids)
+    """
+
+    def get(self, request, ledger):
+        if ledger not in LEDGERS:
+            raise Http404
+
+        form = LedgerExportForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+
+        # The rows are read while the response is streamed, after the view has returned
+        queryset = get_ledger_queryset(ledger, **form.cleaned_data).using(get_read_database(request))
+        filename = ledger_filename(ledger, form.cleaned_data['date_from'], form.cleaned_data['date_to'])
+        return ledger_csv_response(queryset, ledger, filename)